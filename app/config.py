@@ -16,6 +16,9 @@ class Settings:
     
     # Chave da API do Gemini
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
+    # Endereço e modelo da API do Gemini (o endereço pode apontar para fake_gemini_server.py em testes de carga)
+    GEMINI_BASE_URL: str = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com").rstrip("/")
+    GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-1.5-flash-latest")
 
     # --- INÍCIO DA ALTERAÇÃO ---
     # Chave da API do SendGrid e e-mail remetente
@@ -33,6 +36,68 @@ class Settings:
     COLLABORATOR_ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 # 1 hora
     # FIM DA ALTERAÇÃO
 
+    # Orçamento de memória (bytes) do cache de respostas do dashboard, por processo.
+    RESPONSE_CACHE_MAX_BYTES: int = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+    # Tempo (segundos) e número máximo de associações usuário/grupo mantidas em cache, por processo.
+    MEMBERSHIP_CACHE_TTL_SECONDS: int = int(os.getenv("MEMBERSHIP_CACHE_TTL_SECONDS", 30))
+    MEMBERSHIP_CACHE_MAX_ENTRIES: int = int(os.getenv("MEMBERSHIP_CACHE_MAX_ENTRIES", 10000))
+
+    # Tempo (segundos) e número máximo de usuários/colaboradores autenticados mantidos em cache, por processo.
+    PRINCIPAL_CACHE_TTL_SECONDS: int = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", 10000))
+
+    # Processos dedicados ao bcrypt (0 = corre na própria thread) e quantos pedidos podem esperar por eles.
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_QUEUE_DEPTH: int = int(os.getenv("PASSWORD_HASH_QUEUE_DEPTH", 16))
+
+    # Linhas de extrato (OFX/CSV) gravadas por INSERT durante a importação.
+    STATEMENT_IMPORT_CHUNK_SIZE: int = int(os.getenv("STATEMENT_IMPORT_CHUNK_SIZE", 500))
+
+    # Grupos processados (e gravados com um commit) por vez na verificação mensal de conquistas.
+    ACHIEVEMENTS_CHUNK_SIZE: int = int(os.getenv("ACHIEVEMENTS_CHUNK_SIZE", 1000))
+    # Segundos sem progresso após os quais uma execução de tarefa 'executando' é dada como parada e pode ser retomada.
+    TASK_RUN_STALE_SECONDS: int = int(os.getenv("TASK_RUN_STALE_SECONDS", 600))
+
+    # Agendador interno de tarefas periódicas (ver services/scheduler_service.py): ativo ou não,
+    # intervalo (segundos) entre verificações e expressões cron (UTC) de cada tarefa. A verificação
+    # de conquistas é diária, mas só trabalha uma vez por mês (as seguintes só confirmam que o mês
+    # anterior está concluído ou retomam uma execução que falhou).
+    SCHEDULER_ENABLED: bool = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+    SCHEDULER_TICK_SECONDS: int = int(os.getenv("SCHEDULER_TICK_SECONDS", 30))
+    SCHEDULE_MONTHLY_ACHIEVEMENTS: str = os.getenv("SCHEDULE_MONTHLY_ACHIEVEMENTS", "0 3 * * *")
+    SCHEDULE_OVERDUE_PAYMENTS: str = os.getenv("SCHEDULE_OVERDUE_PAYMENTS", "5 0 * * *")
+    SCHEDULE_AI_USAGE_COMPACTION: str = os.getenv("SCHEDULE_AI_USAGE_COMPACTION", "30 3 * * *")
+    SCHEDULE_ACHIEVEMENT_EVENTS: str = os.getenv("SCHEDULE_ACHIEVEMENT_EVENTS", "* * * * *")
+
+    # Eventos de domínio lidos (e avaliados pelas regras de conquistas) por lote.
+    ACHIEVEMENT_EVENTS_BATCH_SIZE: int = int(os.getenv("ACHIEVEMENT_EVENTS_BATCH_SIZE", 500))
+
+    # Segundos durante os quais o total da listagem de usuários (por filtros) é reutilizado.
+    ADMIN_USERS_COUNT_TTL_SECONDS: int = int(os.getenv("ADMIN_USERS_COUNT_TTL_SECONDS", 60))
+
+    # Pool de conexões do cliente HTTP partilhado da API do Gemini e os seus tempos limite (segundos).
+    GEMINI_MAX_CONNECTIONS: int = int(os.getenv("GEMINI_MAX_CONNECTIONS", 20))
+    GEMINI_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("GEMINI_MAX_KEEPALIVE_CONNECTIONS", 10))
+    GEMINI_KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY_SECONDS", 60))
+    GEMINI_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("GEMINI_CONNECT_TIMEOUT_SECONDS", 5))
+    GEMINI_READ_TIMEOUT_SECONDS: float = float(os.getenv("GEMINI_READ_TIMEOUT_SECONDS", 20))
+    GEMINI_POOL_TIMEOUT_SECONDS: float = float(os.getenv("GEMINI_POOL_TIMEOUT_SECONDS", 5))
+
+    # Cache das análises de texto da IA, por texto normalizado: orçamento de memória (bytes) e tempo de vida (segundos).
+    AI_PARSE_CACHE_MAX_BYTES: int = int(os.getenv("AI_PARSE_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+    AI_PARSE_CACHE_TTL_SECONDS: int = int(os.getenv("AI_PARSE_CACHE_TTL_SECONDS", 24 * 60 * 60))
+
+    # Usos da IA por janela de 24h no plano gratuito e dias de 'ai_usage' mantidos antes da compactação.
+    AI_FREE_PLAN_DAILY_LIMIT: int = int(os.getenv("AI_FREE_PLAN_DAILY_LIMIT", 2))
+    AI_USAGE_RETENTION_DAYS: int = int(os.getenv("AI_USAGE_RETENTION_DAYS", 30))
+
+    # Agrupamento das análises de IA concorrentes numa só chamada ao Gemini: ativo ou não,
+    # quanto tempo (ms) um pedido espera por outros e quantos textos cabem num lote.
+    AI_BATCH_ENABLED: bool = os.getenv("AI_BATCH_ENABLED", "false").lower() == "true"
+    AI_BATCH_WINDOW_MS: int = int(os.getenv("AI_BATCH_WINDOW_MS", 50))
+    AI_BATCH_MAX_SIZE: int = int(os.getenv("AI_BATCH_MAX_SIZE", 8))
+
 # Instancia as configurações para que possam ser importadas em outros arquivos.
 settings = Settings()
 
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -18,6 +20,22 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Drivers assíncronos equivalentes aos da URL síncrona
+_ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def _async_url(url: str):
+    """Converte a URL síncrona na do driver assíncrono (asyncpg usa 'ssl' em vez de 'sslmode')."""
+    url = make_url(url)
+    url = url.set(drivername=_ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+    if url.get_backend_name() == "postgresql" and "sslmode" in url.query:
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": url.query["sslmode"]})
+    return url
+
+# Engine e sessões assíncronas, para as rotas 'async def': as consultas não bloqueiam o event loop.
+async_engine = create_async_engine(_async_url(SQLALCHEMY_DATABASE_URL))
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -30,3 +48,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Versão assíncrona de get_db, para rotas 'async def'. Serviços escritos para a sessão
+    síncrona podem ser chamados com 'await db.run_sync(funcao, ...)'.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.responses import FileResponse, JSONResponse
@@ -6,15 +7,37 @@ from starlette.exceptions import HTTPException
 from pathlib import Path
 
 from . import models
-from .database import engine
+from .database import engine, async_engine
 from .routers import auth, users, support, groups, transactions, tasks, ai, collaborators, admin_users, pagamentos
+from .services.password_service import password_hasher, PasswordServiceBusy
+from .services.gemini_service import gemini_client
+from .services.scheduler_service import scheduler
+from .services import achievements_service, payments_service, ai_quota_service
+from .config import settings
 
 models.Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicializa e encerra os recursos partilhados pela aplicação."""
+    gemini_client.start()
+    if settings.SCHEDULER_ENABLED:
+        scheduler.register(achievements_service.TAREFA, settings.SCHEDULE_MONTHLY_ACHIEVEMENTS, achievements_service.run_scheduled)
+        scheduler.register("pagamentos_atrasados", settings.SCHEDULE_OVERDUE_PAYMENTS, payments_service.mark_overdue_payments)
+        scheduler.register("compactacao_uso_ia", settings.SCHEDULE_AI_USAGE_COMPACTION, ai_quota_service.compact_usage_log_job)
+        scheduler.register("eventos_conquistas", settings.SCHEDULE_ACHIEVEMENT_EVENTS, achievements_service.process_events)
+        scheduler.start()
+    yield
+    await scheduler.aclose()
+    await gemini_client.aclose()
+    await async_engine.dispose()
+    password_hasher.shutdown()
+
 app = FastAPI(
     title="Clarify API",
     description="API para o organizador financeiro Clarify.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # --- Define caminhos absolutos para os diretórios estáticos ---
@@ -59,6 +82,15 @@ app.mount("/collaborators", StaticFiles(directory=STATIC_DIR_COLLABORATORS, html
 app.mount("/", StaticFiles(directory=STATIC_DIR_FRONTEND, html=True), name="static")
 
 
+@app.exception_handler(PasswordServiceBusy)
+async def password_service_busy_handler(request: Request, exc: PasswordServiceBusy):
+    # A fila de hashing está cheia: o cliente deve tentar novamente em instantes
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Serviço temporariamente sobrecarregado. Tente novamente em alguns segundos."},
+        headers={"Retry-After": "2"}
+    )
+
 # --- INÍCIO DA ALTERAÇÃO: Manipulador de erro 404 inteligente ---
 # Este manipulador agora verifica se o arquivo solicitado existe.
 # Se existir (como accept_invite.html), ele o serve.
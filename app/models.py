@@ -2,7 +2,7 @@ import uuid
 import enum
 from sqlalchemy import (
     Column, String, Text, DateTime, ForeignKey,
-    DECIMAL, Date, Enum as SQLAlchemyEnum, Integer
+    DECIMAL, Date, Enum as SQLAlchemyEnum, Integer, Index, JSON, UniqueConstraint, Float, BigInteger
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship, declarative_base
@@ -48,6 +48,11 @@ class Usuario(Base):
     associacoes_grupo = relationship("GrupoMembro", back_populates="usuario", cascade="all, delete-orphan")
     movimentacoes = relationship("Movimentacao", back_populates="responsavel")
 
+    # Paginação da listagem de usuários dos colaboradores (ver routers/admin_users.py)
+    __table_args__ = (
+        Index('ix_usuarios_criado_em_id', 'criado_em', 'id'),
+    )
+
 class Grupo(Base):
     __tablename__ = 'grupos'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -55,6 +60,8 @@ class Grupo(Base):
     plano = Column(String(20), nullable=False, default='gratuito')
     criado_em = Column(DateTime(timezone=True), server_default=func.now())
     meses_positivos_consecutivos = Column(Integer, nullable=False, default=0)
+    # Incrementada a cada escrita que altera dados lidos pelo dashboard (ver services/cache_service.py)
+    versao = Column(Integer, nullable=False, default=0, server_default='0')
     associacoes_membros = relationship("GrupoMembro", back_populates="grupo", cascade="all, delete-orphan")
     movimentacoes = relationship("Movimentacao", back_populates="grupo", cascade="all, delete-orphan")
     metas = relationship("Meta", back_populates="grupo", cascade="all, delete-orphan")
@@ -62,6 +69,7 @@ class Grupo(Base):
     conquistas = relationship("Conquista", back_populates="grupo", cascade="all, delete-orphan", order_by="desc(Conquista.data_conquista)")
     ai_usages = relationship("AIUsage", back_populates="grupo", cascade="all, delete-orphan")
     assinatura = relationship("Assinatura", back_populates="grupo", uselist=False, cascade="all, delete-orphan")
+    saldo = relationship("SaldoGrupo", back_populates="grupo", uselist=False, cascade="all, delete-orphan")
 
     @property
     def member_list(self):
@@ -83,6 +91,37 @@ class Assinatura(Base):
     atualizado_em = Column(DateTime(timezone=True), onupdate=func.now())
     grupo = relationship("Grupo", back_populates="assinatura")
 
+class SaldoGrupo(Base):
+    """
+    Saldo materializado do grupo, atualizado na mesma transação de cada escrita em
+    'movimentacoes' (ver services/ledger_service.py).
+    """
+    __tablename__ = 'grupo_saldos'
+    grupo_id = Column(UUID(as_uuid=True), ForeignKey('grupos.id', ondelete="CASCADE"), primary_key=True)
+    total_ganhos = Column(DECIMAL(14, 2), nullable=False, default=0)
+    total_gastos = Column(DECIMAL(14, 2), nullable=False, default=0)
+    total_investimentos = Column(DECIMAL(14, 2), nullable=False, default=0)
+    atualizado_em = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    grupo = relationship("Grupo", back_populates="saldo")
+
+    @property
+    def saldo(self):
+        return self.total_ganhos - self.total_gastos
+
+class ResumoMensal(Base):
+    """
+    Totais mensais por grupo, membro responsável e tipo de movimentação, mantidos
+    incrementalmente a cada escrita em 'movimentacoes' (ver services/rollup_service.py).
+    A chave começa por (grupo_id, ano_mes) para servir as consultas por mês e por intervalo.
+    """
+    __tablename__ = 'resumos_mensais'
+    grupo_id = Column(UUID(as_uuid=True), ForeignKey('grupos.id', ondelete="CASCADE"), primary_key=True)
+    ano_mes = Column(Date, primary_key=True) # Primeiro dia do mês
+    responsavel_id = Column(UUID(as_uuid=True), ForeignKey('usuarios.id'), primary_key=True)
+    tipo = Column(String(20), primary_key=True)
+    total = Column(DECIMAL(14, 2), nullable=False, default=0)
+    quantidade = Column(Integer, nullable=False, default=0)
+
 class Movimentacao(Base):
     __tablename__ = 'movimentacoes'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -92,9 +131,20 @@ class Movimentacao(Base):
     descricao = Column(Text)
     valor = Column(DECIMAL(10, 2), nullable=False)
     data_transacao = Column(DateTime(timezone=True), server_default=func.now())
+    hash_importacao = Column(String(64)) # Só nas importadas de extratos; deteta linhas repetidas
     grupo = relationship("Grupo", back_populates="movimentacoes")
     responsavel = relationship("Usuario", back_populates="movimentacoes")
 
+    # Índices usados pelas agregações do dashboard (filtro por grupo e período) e pela
+    # paginação do histórico, com ou sem filtro por tipo. O índice único do hash impede
+    # importar duas vezes a mesma linha de extrato no grupo. Os índices de pesquisa na
+    # descrição (GIN, só Postgres) são criados por migrate_database.py.
+    __table_args__ = (
+        Index('ix_movimentacoes_grupo_data', 'grupo_id', 'data_transacao'),
+        Index('ix_movimentacoes_grupo_tipo_data', 'grupo_id', 'tipo', 'data_transacao', 'id'),
+        Index('ux_movimentacoes_grupo_hash_importacao', 'grupo_id', 'hash_importacao', unique=True),
+    )
+
 class Meta(Base):
     __tablename__ = 'metas'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -125,13 +175,96 @@ class Conquista(Base):
     data_conquista = Column(DateTime(timezone=True), server_default=func.now())
     grupo = relationship("Grupo", back_populates="conquistas")
 
+    # Verificação do período de espera entre medalhas do mesmo tipo (ver services/achievements_service.py)
+    __table_args__ = (
+        Index('ix_conquistas_grupo_tipo_data', 'grupo_id', 'tipo_medalha', 'data_conquista'),
+    )
+
 class AIUsage(Base):
+    """
+    Registo de cada uso da IA (auditoria). O limite diário não é calculado a partir
+    daqui, mas de 'ai_quotas'; as linhas antigas são compactadas em 'ai_usage_diario'
+    (ver services/ai_quota_service.py).
+    """
     __tablename__ = 'ai_usage'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     grupo_id = Column(UUID(as_uuid=True), ForeignKey('grupos.id', ondelete="CASCADE"), nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     grupo = relationship("Grupo", back_populates="ai_usages")
 
+    # Usado pela compactação, que lê as linhas mais antigas que o período de retenção
+    __table_args__ = (
+        Index('ix_ai_usage_timestamp', 'timestamp'),
+    )
+
+class AIQuota(Base):
+    """
+    Contador de usos da IA do grupo na janela atual de 24h, que começa no primeiro uso.
+    Verificado e incrementado num único UPSERT (ver services/ai_quota_service.py).
+    """
+    __tablename__ = 'ai_quotas'
+    grupo_id = Column(UUID(as_uuid=True), ForeignKey('grupos.id', ondelete="CASCADE"), primary_key=True)
+    janela_inicio = Column(DateTime(timezone=True), nullable=False)
+    usos = Column(Integer, nullable=False, default=0)
+
+class AIUsageDiario(Base):
+    """Usos da IA por grupo e dia, gerados pela compactação de 'ai_usage'."""
+    __tablename__ = 'ai_usage_diario'
+    grupo_id = Column(UUID(as_uuid=True), ForeignKey('grupos.id', ondelete="CASCADE"), primary_key=True)
+    dia = Column(Date, primary_key=True)
+    usos = Column(Integer, nullable=False, default=0)
+
+class TarefaExecucao(Base):
+    """
+    Execução de uma tarefa agendada para um período (ex.: conquistas de '2026-09').
+    Única por (tarefa, periodo): pedir de novo a mesma tarefa retoma esta execução a
+    partir de 'ultimo_grupo_id' em vez de recomeçar (ver services/task_run_service.py).
+    """
+    __tablename__ = 'tarefa_execucoes'
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    tarefa = Column(String(50), nullable=False)
+    periodo = Column(String(20), nullable=False)
+    # pendente -> executando -> concluida | falhou
+    status = Column(String(20), nullable=False, default='pendente')
+    # Último grupo já processado e gravado; a retoma continua no grupo seguinte
+    ultimo_grupo_id = Column(UUID(as_uuid=True), nullable=True)
+    resultado = Column(JSON, nullable=False, default=dict)
+    erro = Column(Text)
+    criada_em = Column(DateTime(timezone=True), server_default=func.now())
+    # Atualizada a cada bloco gravado; uma execução 'executando' parada há muito pode ser retomada
+    atualizada_em = Column(DateTime(timezone=True), server_default=func.now())
+    concluida_em = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        UniqueConstraint('tarefa', 'periodo', name='ux_tarefa_execucoes_tarefa_periodo'),
+    )
+
+class EventoDominio(Base):
+    """
+    Fila (outbox) de eventos de domínio, gravados na mesma transação da escrita que os
+    origina e consumidos em segundo plano pelas regras de conquistas, que apagam os
+    eventos processados (ver services/event_service.py e services/achievements_service.py).
+    """
+    __tablename__ = 'eventos_dominio'
+    # Sequencial: os eventos são consumidos por ordem de criação
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    tipo = Column(String(50), nullable=False)
+    grupo_id = Column(UUID(as_uuid=True), ForeignKey('grupos.id', ondelete="CASCADE"), nullable=False)
+    dados = Column(JSON, nullable=False, default=dict)
+    criado_em = Column(DateTime(timezone=True), server_default=func.now())
+
+class TarefaAgendada(Base):
+    """
+    Estado partilhado de cada tarefa periódica do agendador interno: a próxima execução
+    devida e os dados da última, em qualquer worker (ver services/scheduler_service.py).
+    """
+    __tablename__ = 'tarefas_agendadas'
+    nome = Column(String(50), primary_key=True)
+    proxima_execucao = Column(DateTime(timezone=True), nullable=False)
+    ultima_execucao = Column(DateTime(timezone=True))
+    ultima_duracao_s = Column(Float)
+    ultimo_erro = Column(Text)
+
 class StatusPagamentoEnum(str, enum.Enum):
     pendente = "pendente"
     pago = "pago"
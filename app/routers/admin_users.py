@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
-from typing import List
-from datetime import datetime, timezone
+from sqlalchemy import select, func, exists, or_, tuple_, text
+from typing import List, Optional
+from datetime import datetime, timezone, timedelta, date, time
+import uuid
 from dateutil.relativedelta import relativedelta
 import logging # INÍCIO DA ALTERAÇÃO: Importa o módulo logging
 
 from .. import database, schemas, models, security
+from ..config import settings
+from ..services import cache_service, search_service
+from ..utils import encode_cursor, decode_cursor, cursor_datetime_key, cursor_datetime_value
 
 # INÍCIO DA ALTERAÇÃO: Configura o logger
 # Obtém um logger para este módulo
@@ -28,7 +34,7 @@ router = APIRouter(
 )
 
 # Helper para verificar se o colaborador é um administrador
-def require_admin(current_user: models.Colaborador = Depends(security.get_current_collaborator)):
+def require_admin(current_user: security.CollaboratorPrincipal = Depends(security.get_current_collaborator)):
     """
     Verifica se o usuário autenticado é um administrador.
     Esta função é usada como uma dependência para rotas que exigem acesso administrativo.
@@ -37,54 +43,122 @@ def require_admin(current_user: models.Colaborador = Depends(security.get_curren
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito a administradores.")
     return current_user
 
-@router.get("/", response_model=List[schemas.AdminUserList])
-def list_all_users(db: Session = Depends(database.get_db), admin: models.Colaborador = Depends(require_admin)):
+# Totais da listagem por filtros, recalculados no máximo a cada ADMIN_USERS_COUNT_TTL_SECONDS
+_total_cache = cache_service.TTLCache(256, settings.ADMIN_USERS_COUNT_TTL_SECONDS)
+
+def _premium_expr(now: datetime):
+    """Se algum grupo do usuário tem assinatura em vigor (EXISTS sobre grupo_membros e assinaturas)."""
+    return exists().where(
+        models.GrupoMembro.usuario_id == models.Usuario.id,
+        models.Assinatura.grupo_id == models.GrupoMembro.grupo_id,
+        models.Assinatura.data_fim > now
+    )
+
+def _total_estimado(db: Session, filtros: list, chave: tuple) -> int:
+    """
+    Total de usuários para os filtros. Sem filtros, no Postgres, usa a estimativa do
+    planeador (pg_class.reltuples, atualizada pelo autovacuum); nos outros casos faz
+    COUNT(*), guardado em cache por alguns segundos.
+    """
+    total = _total_cache.get(chave)
+    if total is not None:
+        return total
+    total = None
+    if not filtros and db.get_bind().dialect.name == 'postgresql':
+        estimativa = db.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'usuarios'::regclass")).scalar()
+        # -1 enquanto a tabela nunca foi analisada
+        if estimativa is not None and estimativa >= 0:
+            total = int(estimativa)
+    if total is None:
+        total = db.execute(select(func.count()).select_from(models.Usuario).where(*filtros)).scalar()
+    _total_cache.set(chave, total)
+    return total
+
+@router.get("/", response_model=schemas.AdminUserPage)
+def list_all_users(
+    plano: Optional[str] = Query(None, pattern="^(gratuito|premium)$"),
+    criado_desde: Optional[date] = None,
+    criado_ate: Optional[date] = None,
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: Session = Depends(database.get_db),
+    admin: security.CollaboratorPrincipal = Depends(require_admin)
+):
     """
-    Lista todos os usuários cadastrados no sistema, incluindo informações sobre o plano.
+    Lista os usuários cadastrados no sistema, incluindo o plano, dos mais recentes para os
+    mais antigos, paginada por cursor sobre (criado_em DESC, id DESC). Envie o
+    'next_cursor' recebido para obter a página seguinte.
+
+    Filtros: 'plano', intervalo de datas de cadastro e 'q', o início do nome ou do e-mail.
     Apenas administradores podem acessar esta rota.
     """
-    users = db.query(models.Usuario).options(
-        joinedload(models.Usuario.associacoes_grupo).joinedload(models.GrupoMembro.grupo).joinedload(models.Grupo.assinatura)
-    ).order_by(models.Usuario.criado_em.desc()).all()
-
-    result = []
-    for user in users:
-        plano = "gratuito"
-        # Verifica se o usuário tem um grupo e se a assinatura do grupo está ativa
-        if user.associacoes_grupo:
-            grupo = user.associacoes_grupo[0].grupo
-            # O @property is_premium no modelo Grupo já faz essa verificação de data
-            if grupo.is_premium:
-                plano = "premium"
-        
-        result.append({
-            "id": user.id,
-            "nome": user.nome,
-            "email": user.email,
-            "criado_em": user.criado_em,
-            "plano": plano
-        })
-    return result
+    now = datetime.now(timezone.utc)
+    premium = _premium_expr(now)
+
+    filtros = []
+    if plano:
+        filtros.append(premium if plano == 'premium' else ~premium)
+    if criado_desde:
+        filtros.append(models.Usuario.criado_em >= datetime.combine(criado_desde, time.min, tzinfo=timezone.utc))
+    if criado_ate:
+        filtros.append(models.Usuario.criado_em < datetime.combine(criado_ate + timedelta(days=1), time.min, tzinfo=timezone.utc))
+    q = q.strip().lower() if q else None
+    if q:
+        prefixo = f"{search_service.escape_like(q)}%"
+        # Servidos pelos índices de prefixo em lower(email) e lower(nome) (ver migrate_database.py)
+        filtros.append(or_(
+            func.lower(models.Usuario.email).like(prefixo, escape="\\"),
+            func.lower(models.Usuario.nome).like(prefixo, escape="\\")
+        ))
+
+    dialect = db.get_bind().dialect.name
+    chave = [cursor_datetime_key(models.Usuario.criado_em, dialect).label("chave_criado_em"), models.Usuario.id]
+    query = select(
+        models.Usuario.id, models.Usuario.nome, models.Usuario.email, models.Usuario.criado_em, premium.label("premium"), chave[0]
+    ).where(*filtros)
+
+    if cursor:
+        valores = decode_cursor(cursor, len(chave))
+        try:
+            ultima = [cursor_datetime_value(valores[0], dialect), uuid.UUID(valores[1])]
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido.")
+        query = query.where(tuple_(*chave) < tuple_(*ultima))
+
+    # Uma linha a mais indica se existe página seguinte
+    rows = db.execute(query.order_by(*[coluna.desc() for coluna in chave]).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].chave_criado_em, rows[-1].id)
+
+    return {
+        "items": [
+            {
+                "id": row.id, "nome": row.nome, "email": row.email, "criado_em": row.criado_em,
+                "plano": "premium" if row.premium else "gratuito"
+            } for row in rows
+        ],
+        "next_cursor": next_cursor,
+        "total_estimado": _total_estimado(db, filtros, (plano, criado_desde, criado_ate, q)),
+    }
 
 @router.get("/{user_id}", response_model=schemas.AdminUserDetails)
-def get_user_details(user_id: str, db: Session = Depends(database.get_db), admin: models.Colaborador = Depends(require_admin)):
+def get_user_details(user_id: str, db: Session = Depends(database.get_db), admin: security.CollaboratorPrincipal = Depends(require_admin)):
     """
     Retorna os detalhes de um usuário específico, incluindo suas movimentações financeiras.
     Apenas administradores podem acessar esta rota.
     """
-    user = db.query(models.Usuario).options(
-        joinedload(models.Usuario.movimentacoes).joinedload(models.Movimentacao.responsavel),
-        joinedload(models.Usuario.associacoes_grupo).joinedload(models.GrupoMembro.grupo).joinedload(models.Grupo.assinatura)
+    # O plano é calculado como na listagem, para as duas vistas mostrarem o mesmo
+    row = db.query(models.Usuario, _premium_expr(datetime.now(timezone.utc)).label("premium")).options(
+        joinedload(models.Usuario.movimentacoes).joinedload(models.Movimentacao.responsavel)
     ).filter(models.Usuario.id == user_id).first()
 
-    if not user:
+    if not row:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado.")
-
-    plano = "gratuito"
-    if user.associacoes_grupo:
-        grupo = user.associacoes_grupo[0].grupo
-        if grupo.is_premium: # Reutiliza o @property is_premium
-            plano = "premium"
+    user = row.Usuario
+    plano = "premium" if row.premium else "gratuito"
 
     # Formata as movimentações para inclusão na resposta
     movimentacoes_formatadas = [
@@ -105,7 +179,7 @@ def get_user_details(user_id: str, db: Session = Depends(database.get_db), admin
     }
 
 @router.put("/{user_id}/details", response_model=schemas.User)
-def update_user_details(user_id: str, user_update: schemas.AdminUserUpdate, db: Session = Depends(database.get_db), admin: models.Colaborador = Depends(require_admin)):
+def update_user_details(user_id: str, user_update: schemas.AdminUserUpdate, db: Session = Depends(database.get_db), admin: security.CollaboratorPrincipal = Depends(require_admin)):
     """
     Atualiza os detalhes (nome e/ou e-mail) de um usuário.
     Apenas administradores podem acessar esta rota.
@@ -113,6 +187,7 @@ def update_user_details(user_id: str, user_update: schemas.AdminUserUpdate, db:
     user = db.query(models.Usuario).filter(models.Usuario.id == user_id).first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado.")
+    email_anterior = user.email
 
     # Verifica se o novo e-mail já está em uso por outro usuário
     if user_update.email and user_update.email != user.email:
@@ -130,33 +205,38 @@ def update_user_details(user_id: str, user_update: schemas.AdminUserUpdate, db:
         logger.info(f"AUDIT_LOG: Colaborador '{admin.id}' ({admin.email}) atualizou o nome do usuário '{user.id}' de '{user.nome}' para '{user_update.nome}'.")
         # FIM DA ALTERAÇÃO
         user.nome = user_update.nome
+        cache_service.bump_user_groups_versions(db, user.id)
     
     db.commit()
+    security.invalidate_principal(email_anterior)
     db.refresh(user)
     return user
 
 @router.put("/{user_id}/password")
-def update_user_password(user_id: str, password_update: schemas.AdminPasswordUpdate, db: Session = Depends(database.get_db), admin: models.Colaborador = Depends(require_admin)):
+async def update_user_password(user_id: str, password_update: schemas.AdminPasswordUpdate, db: Session = Depends(database.get_db), admin: security.CollaboratorPrincipal = Depends(require_admin)):
     """
     Redefine a senha de um usuário.
     Apenas administradores podem acessar esta rota.
+    O bcrypt corre no pool de hashing e a base de dados no threadpool.
     """
-    user = db.query(models.Usuario).filter(models.Usuario.id == user_id).first()
+    user = await run_in_threadpool(lambda: db.query(models.Usuario).filter(models.Usuario.id == user_id).first())
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado.")
+    user_uuid, email = user.id, user.email # Lidos antes do commit, que expira o objeto
     
     # Hash da nova senha antes de salvar
-    user.senha = security.get_password_hash(password_update.nova_senha)
-    db.commit()
+    user.senha = await security.get_password_hash_async(password_update.nova_senha)
+    await run_in_threadpool(db.commit)
+    security.invalidate_principal(email)
 
     # INÍCIO DA ALTERAÇÃO: Log de auditoria para redefinição de senha usando logger
-    logger.info(f"AUDIT_LOG: Colaborador '{admin.id}' ({admin.email}) redefiniu a senha do usuário '{user.id}' ({user.email}).")
+    logger.info(f"AUDIT_LOG: Colaborador '{admin.id}' ({admin.email}) redefiniu a senha do usuário '{user_uuid}' ({email}).")
     # FIM DA ALTERAÇÃO
 
     return {"message": "Senha do usuário atualizada com sucesso."}
 
 @router.post("/{user_id}/grant-premium")
-def grant_premium_access(user_id: str, grant_data: schemas.AdminGrantPremium, db: Session = Depends(database.get_db), admin: models.Colaborador = Depends(require_admin)):
+def grant_premium_access(user_id: str, grant_data: schemas.AdminGrantPremium, db: Session = Depends(database.get_db), admin: security.CollaboratorPrincipal = Depends(require_admin)):
     """
     Concede ou estende o acesso Premium para o grupo de um usuário.
     Apenas administradores podem acessar esta rota.
@@ -202,6 +282,7 @@ def grant_premium_access(user_id: str, grant_data: schemas.AdminGrantPremium, db
             # FIM DA ALTERAÇÃO
 
     grupo.plano = 'premium' # Atualiza o campo 'plano' no modelo Grupo para consistência
+    cache_service.bump_group_version(db, grupo.id)
     db.commit()
     
     return {"message": f"{grant_data.meses} meses de acesso Premium concedidos ao grupo de {user.nome}. Nova data de expiração: {nova_data_fim.strftime('%d/%m/%Y')}"}
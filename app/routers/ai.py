@@ -1,14 +1,17 @@
+import asyncio
 import httpx
 import json
-from datetime import datetime, timedelta, timezone
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Response
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import settings
 from .. import schemas, database, models
-from ..security import get_current_user_from_token
-from ..models import Usuario, Grupo # Importa Grupo para usar no joinedload
+from ..security import UserPrincipal, get_current_user_from_token
+from ..services import cache_service, ai_service, transaction_parser_service, ai_quota_service
+from ..services.gemini_service import gemini_client
 
 router = APIRouter(
     prefix="/ai",
@@ -19,18 +22,51 @@ router = APIRouter(
 class ParseTransactionRequest(BaseModel):
     text: str = Field(..., min_length=3, max_length=280)
 
-async def call_gemini_api(user_text: str) -> dict:
-    """
-    Chama a API do Gemini para extrair uma ou mais transações de um texto.
-    """
+async def _gerar_json(prompt: str) -> dict:
+    """Envia o prompt ao Gemini e retorna o JSON da resposta."""
     if not settings.GEMINI_API_KEY or settings.GEMINI_API_KEY == "SUA_CHAVE_AQUI":
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="A chave da API do Gemini não está configurada no servidor."
         )
 
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent?key={settings.GEMINI_API_KEY}"
-    
+    api_url = f"{settings.GEMINI_BASE_URL}/v1beta/models/{settings.GEMINI_MODEL}:generateContent?key={settings.GEMINI_API_KEY}"
+
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {
+            "response_mime_type": "application/json",
+        }
+    }
+
+    try:
+        # Cliente partilhado: reaproveita as conexões abertas (ver services/gemini_service.py)
+        response = await gemini_client.post(api_url, json=payload)
+        response.raise_for_status()
+
+        json_text = response.json()["candidates"][0]["content"]["parts"][0]["text"]
+        return json.loads(json_text)
+
+    except httpx.RequestError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Erro ao comunicar com o serviço de IA: {e}"
+        )
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"O serviço de IA respondeu com erro ({e.response.status_code}). Tente novamente."
+        )
+    except (KeyError, IndexError, json.JSONDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="A resposta do serviço de IA foi inválida ou não pôde ser processada."
+        )
+
+async def call_gemini_api(user_text: str) -> dict:
+    """
+    Chama a API do Gemini para extrair uma ou mais transações de um texto.
+    """
     prompt = f"""
     Analise o seguinte texto de um usuário brasileiro e extraia TODAS as transações financeiras mencionadas.
     O texto é: "{user_text}"
@@ -61,83 +97,146 @@ async def call_gemini_api(user_text: str) -> dict:
     }}
     """
 
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "response_mime_type": "application/json",
-        }
-    }
+    return await _gerar_json(prompt)
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(api_url, json=payload, timeout=20.0)
-            response.raise_for_status()
-            
-            json_text = response.json()["candidates"][0]["content"]["parts"][0]["text"]
-            return json.loads(json_text)
+async def call_gemini_api_batch(textos: List[str]) -> List[Optional[dict]]:
+    """
+    Analisa vários textos numa única chamada ao Gemini, identificados pela sua posição.
+    Retorna, para cada texto, o resultado no formato de call_gemini_api, ou None se a
+    resposta não o trouxer (o chamador deve então analisá-lo sozinho).
+    """
+    itens = json.dumps([{"id": i, "texto": texto} for i, texto in enumerate(textos)], ensure_ascii=False)
+    prompt = f"""
+    Abaixo está uma lista JSON de textos de usuários brasileiros, cada um com um "id".
+    Para CADA texto, extraia TODAS as transações financeiras mencionadas nele.
 
-    except httpx.RequestError as e:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Erro ao comunicar com o serviço de IA: {e}"
-        )
-    except (KeyError, IndexError, json.JSONDecodeError):
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="A resposta do serviço de IA foi inválida ou não pôde ser processada."
-        )
+    Textos: {itens}
+
+    Para cada transação encontrada, extraia as seguintes informações:
+    1. "tipo": Deve ser "ganho", "gasto" ou "investimento". Se não estiver claro, use "gasto".
+    2. "valor": O valor numérico da transação.
+    3. "descricao": Uma breve descrição da transação.
+
+    Responda APENAS com um objeto JSON com uma única chave "results": uma lista com um
+    objeto por texto, na forma {{"id": <id do texto>, "transactions": [...]}}, onde
+    "transactions" é a lista de transações desse texto (vazia se não houver nenhuma).
+    Não misture transações de textos diferentes.
+    """
+    resposta = await _gerar_json(prompt)
+
+    por_id = {}
+    for resultado in resposta.get("results", []) if isinstance(resposta, dict) else []:
+        if isinstance(resultado, dict) and isinstance(resultado.get("transactions"), list):
+            por_id[resultado.get("id")] = {"transactions": resultado["transactions"]}
+    return [por_id.get(i) for i in range(len(textos))]
+
+async def _analisar_lote(textos: List[str]) -> list:
+    """
+    Processa um lote do ai_batcher: uma chamada para todos os textos e, para os que a
+    resposta combinada não trouxer (ou se ela for inválida), chamadas individuais.
+    """
+    if len(textos) == 1:
+        return [await call_gemini_api(textos[0])]
+    try:
+        resultados = await call_gemini_api_batch(textos)
+    except HTTPException as e:
+        if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+            raise # O Gemini está inacessível: as chamadas individuais também falhariam
+        resultados = [None] * len(textos)
+
+    faltando = [i for i, resultado in enumerate(resultados) if resultado is None]
+    if faltando:
+        ai_batcher.fallbacks += len(faltando)
+        individuais = await asyncio.gather(*(call_gemini_api(textos[i]) for i in faltando), return_exceptions=True)
+        for i, resultado in zip(faltando, individuais):
+            resultados[i] = resultado
+    return resultados
+
+# Agrupa as análises que chegam quase ao mesmo tempo (ver AI_BATCH_* em config.py)
+ai_batcher = ai_service.MicroBatcher(
+    _analisar_lote, max_size=settings.AI_BATCH_MAX_SIZE, janela=settings.AI_BATCH_WINDOW_MS / 1000
+)
 
 @router.post("/parse-transaction", response_model=schemas.ParsedTransactionResponse)
 async def parse_transaction_from_text(
     request: ParseTransactionRequest,
-    db: Session = Depends(database.get_db),
-    current_user: Usuario = Depends(get_current_user_from_token)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: UserPrincipal = Depends(get_current_user_from_token)
 ):
     """
     Recebe um texto do frontend, envia para a API do Gemini e retorna os dados extraídos.
-    Limita o uso a 2 vezes por dia para grupos do plano gratuito.
+    Limita o uso a AI_FREE_PLAN_DAILY_LIMIT vezes (2 por padrão) a cada 24h para grupos do plano gratuito.
+
+    Textos equivalentes a um já analisado (ver ai_service.normalize_text) são respondidos
+    a partir do cache, e frases simples ("gastei 30 de uber") pelo analisador local; em
+    ambos os casos sem chamar o Gemini e sem contar para o limite diário.
+
+    Usa a sessão assíncrona: enquanto espera pelo banco ou pelo Gemini, o worker continua
+    a servir outros pedidos.
     """
+    cached = ai_service.get_cached_parse(request.text)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json", headers={"X-Cache": "HIT"})
+
+    local = transaction_parser_service.parse(request.text)
+    if local is not None:
+        return local
+
     # INÍCIO DA ALTERAÇÃO: Usar o grupo ativo do usuário para verificar o plano e o limite de IA
     if not current_user.grupo_ativo_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuário não tem um grupo ativo.")
 
-    group = db.query(models.Grupo).options(
-        joinedload(models.Grupo.ai_usages) # Carrega os usos de IA para o grupo
-    ).filter(models.Grupo.id == current_user.grupo_ativo_id).first()
+    group = (await db.execute(
+        select(models.Grupo.id, models.Grupo.plano).where(models.Grupo.id == current_user.grupo_ativo_id)
+    )).first()
 
     if not group:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Grupo ativo não encontrado.")
     # FIM DA ALTERAÇÃO
-    
-    print(f"--- Verificando Limite de IA para o Grupo: {group.id}, Plano: {group.plano} ---")
-
-    if group.plano == 'gratuito':
-        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(days=1)
-        
-        # (ALTERADO) Conta o número de usos nas últimas 24h para o grupo ATIVO
-        usage_count = db.query(models.AIUsage).filter(
-            models.AIUsage.grupo_id == group.id,
-            models.AIUsage.timestamp >= twenty_four_hours_ago
-        ).count()
-
-        # (ALTERADO) Verifica se o limite de 2 usos foi atingido
-        if usage_count >= 2:
-            print(f"!!! Limite de IA atingido para o grupo {group.id}. Usos hoje: {usage_count}")
+
+    limite = settings.AI_FREE_PLAN_DAILY_LIMIT
+    gratuito = group.plano == 'gratuito'
+    if gratuito:
+        # Verifica e reserva um uso da quota num único UPSERT (ver services/ai_quota_service.py)
+        quota = await db.run_sync(ai_quota_service.try_consume, group.id, limite)
+        if quota is None:
+            await db.rollback()
+            print(f"!!! Limite de IA atingido para o grupo {group.id}.")
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Você já usou a IA 2 vezes hoje. O limite para o plano gratuito é de 2 usos por dia. Faça upgrade para uso ilimitado."
+                detail=f"Você já usou a IA {limite} vezes hoje. O limite para o plano gratuito é de {limite} usos por dia. Faça upgrade para uso ilimitado."
             )
-        print(f"--- Limite de IA OK. Usos hoje: {usage_count}/2. Prosseguindo com a análise. ---")
+        # O contador de uso de IA aparece no dashboard
+        await db.run_sync(cache_service.bump_group_version, group.id)
+        await db.commit()
+        print(f"--- Limite de IA OK. Usos hoje: {quota.usos}/{limite}. Prosseguindo com a análise. ---")
 
-    parsed_data = await call_gemini_api(request.text)
-    
-    if group.plano == 'gratuito':
-        print(f"--- Registrando uso de IA para o grupo gratuito {group.id} ---")
-        new_usage = models.AIUsage(grupo_id=group.id)
-        db.add(new_usage)
-        db.commit()
+    try:
+        if settings.AI_BATCH_ENABLED:
+            parsed_data = await ai_batcher.submit(request.text)
+        else:
+            parsed_data = await call_gemini_api(request.text)
+    except HTTPException:
+        if gratuito:
+            # A análise falhou: o uso reservado é devolvido
+            await db.run_sync(ai_quota_service.refund, group.id)
+            await db.run_sync(cache_service.bump_group_version, group.id)
+            await db.commit()
+        raise
+
+    if gratuito:
+        db.add(models.AIUsage(grupo_id=group.id))
+        await db.commit()
 
     if "transactions" not in parsed_data:
         parsed_data = {"transactions": []}
-        
-    return parsed_data
+
+    try:
+        resultado = schemas.ParsedTransactionResponse.model_validate(parsed_data)
+    except ValidationError:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="A resposta do serviço de IA foi inválida ou não pôde ser processada."
+        )
+    ai_service.cache_parse(request.text, resultado)
+    return resultado
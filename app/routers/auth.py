@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
@@ -95,17 +96,15 @@ def generate_recovery_code():
     """Gera um código numérico seguro de 6 dígitos."""
     return str(secrets.randbelow(1_000_000)).zfill(6)
 
-@router.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
-    """
-    Registra um novo usuário no sistema.
-    """
-    db_user_check = db.query(models.Usuario).filter(models.Usuario.email == user.email).first()
+def _check_email_available(db: Session, email: str):
+    """Recusa o registo com um e-mail já usado (corre no threadpool)."""
+    db_user_check = db.query(models.Usuario).filter(models.Usuario.email == email).first()
     if db_user_check:
-        logger.warning(f"REGISTER_FAILED: Tentativa de registro com e-mail já existente: {user.email}")
+        logger.warning(f"REGISTER_FAILED: Tentativa de registro com e-mail já existente: {email}")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="E-mail já registado.")
-    
-    hashed_password = security.get_password_hash(user.senha)
+
+def _create_user_with_group(db: Session, user: schemas.UserCreate, hashed_password: str) -> models.Usuario:
+    """Grava o usuário e o seu grupo (corre no threadpool)."""
     db_user = models.Usuario(email=user.email, nome=user.nome, senha=hashed_password,
                              failed_login_attempts=0, locked_until=None)
     
@@ -126,51 +125,73 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)
     logger.info(f"REGISTER_SUCCESS: Novo usuário registrado: '{db_user.id}' ({db_user.email})")
     return db_user
 
+@router.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
+async def create_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
+    """
+    Registra um novo usuário no sistema.
+    O bcrypt corre no pool de hashing e a base de dados no threadpool, como no login.
+    """
+    await run_in_threadpool(_check_email_available, db, user.email)
+    hashed_password = await security.get_password_hash_async(user.senha)
+    return await run_in_threadpool(_create_user_with_group, db, user, hashed_password)
+
+def _get_user_for_login(db: Session, email: str) -> models.Usuario:
+    """Busca o usuário do login e recusa contas inexistentes ou bloqueadas (corre no threadpool)."""
+    user = db.query(models.Usuario).filter(models.Usuario.email == email).first()
+    if not user:
+        # Usuário não encontrado: logar e retornar erro genérico para evitar enumeração de usuários
+        logger.warning(f"LOGIN_FAILED_UNKNOWN_USER: Tentativa de login para e-mail não existente: {email}")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="E-mail ou senha incorretos", headers={"WWW-Authenticate": "Bearer"})
+
+    now = datetime.now(timezone.utc)
+    if user.locked_until and user.locked_until > now:
+        remaining_time = user.locked_until - now
+        minutes = int(remaining_time.total_seconds() / 60)
+        seconds = int(remaining_time.total_seconds() % 60)
+        logger.warning(f"LOGIN_FAILED_LOCKED: Tentativa de login para conta bloqueada: '{user.id}' ({user.email}). Tempo restante: {minutes}m {seconds}s.")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Sua conta está bloqueada devido a muitas tentativas falhas. Tente novamente em {minutes} minutos e {seconds} segundos."
+        )
+    return user
+
+def _register_login_result(db: Session, user: models.Usuario, password_ok: bool):
+    """Grava o resultado da tentativa: reset em caso de sucesso, contagem e bloqueio em caso de falha (corre no threadpool)."""
+    if password_ok:
+        # Login bem-sucedido: resetar tentativas falhas e bloqueio
+        user.failed_login_attempts = 0
+        user.locked_until = None
+        logger.info(f"LOGIN_SUCCESS: Usuário '{user.id}' ({user.email}) logado com sucesso.")
+        db.commit() # Salva o reset
+        return
+
+    user.failed_login_attempts += 1
+    if user.failed_login_attempts >= MAX_FAILED_LOGIN_ATTEMPTS_PER_USER:
+        user.locked_until = datetime.now(timezone.utc) + timedelta(minutes=ACCOUNT_LOCKOUT_DURATION_MINUTES)
+        user.failed_login_attempts = 0 # Resetar para o próximo ciclo de bloqueio
+        logger.error(f"ACCOUNT_LOCKED: Conta do usuário '{user.id}' ({user.email}) bloqueada por {ACCOUNT_LOCKOUT_DURATION_MINUTES} minutos após {MAX_FAILED_LOGIN_ATTEMPTS_PER_USER} tentativas falhas.")
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Sua conta foi bloqueada por {ACCOUNT_LOCKOUT_DURATION_MINUTES} minutos devido a muitas tentativas de login falhas."
+        )
+    logger.warning(f"LOGIN_FAILED: Tentativa de login falha para e-mail: {user.email}. Tentativas: {user.failed_login_attempts}/{MAX_FAILED_LOGIN_ATTEMPTS_PER_USER}")
+    db.commit() # Salva as tentativas falhas
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="E-mail ou senha incorretos", headers={"WWW-Authenticate": "Bearer"})
+
 @router.post("/token", dependencies=[Depends(rate_limit_user_login)], response_model=schemas.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
     """
     Endpoint para login de usuários.
     Autentica o usuário e retorna um token JWT.
+
+    O acesso à base de dados corre no threadpool e o bcrypt no pool de hashing; enquanto
+    o pedido espera pelo hash não ocupa nenhuma thread do servidor.
     """
-    user = db.query(models.Usuario).filter(models.Usuario.email == form_data.username).first()
-    
-    if user:
-        now = datetime.now(timezone.utc)
-        if user.locked_until and user.locked_until > now:
-            remaining_time = user.locked_until - now
-            minutes = int(remaining_time.total_seconds() / 60)
-            seconds = int(remaining_time.total_seconds() % 60)
-            logger.warning(f"LOGIN_FAILED_LOCKED: Tentativa de login para conta bloqueada: '{user.id}' ({user.email}). Tempo restante: {minutes}m {seconds}s.")
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"Sua conta está bloqueada devido a muitas tentativas falhas. Tente novamente em {minutes} minutos e {seconds} segundos."
-            )
+    user = await run_in_threadpool(_get_user_for_login, db, form_data.username)
+    password_ok = await security.verify_password_async(form_data.password, user.senha)
+    await run_in_threadpool(_register_login_result, db, user, password_ok)
 
-        if not security.verify_password(form_data.password, user.senha):
-            user.failed_login_attempts += 1
-            if user.failed_login_attempts >= MAX_FAILED_LOGIN_ATTEMPTS_PER_USER:
-                user.locked_until = now + timedelta(minutes=ACCOUNT_LOCKOUT_DURATION_MINUTES)
-                user.failed_login_attempts = 0 # Resetar para o próximo ciclo de bloqueio
-                logger.error(f"ACCOUNT_LOCKED: Conta do usuário '{user.id}' ({user.email}) bloqueada por {ACCOUNT_LOCKOUT_DURATION_MINUTES} minutos após {MAX_FAILED_LOGIN_ATTEMPTS_PER_USER} tentativas falhas.")
-                db.commit()
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail=f"Sua conta foi bloqueada por {ACCOUNT_LOCKOUT_DURATION_MINUTES} minutos devido a muitas tentativas de login falhas."
-                )
-            logger.warning(f"LOGIN_FAILED: Tentativa de login falha para e-mail: {form_data.username}. Tentativas: {user.failed_login_attempts}/{MAX_FAILED_LOGIN_ATTEMPTS_PER_USER}")
-            db.commit() # Salva as tentativas falhas
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="E-mail ou senha incorretos", headers={"WWW-Authenticate": "Bearer"})
-        else:
-            # Login bem-sucedido: resetar tentativas falhas e bloqueio
-            user.failed_login_attempts = 0
-            user.locked_until = None
-            logger.info(f"LOGIN_SUCCESS: Usuário '{user.id}' ({user.email}) logado com sucesso.")
-            db.commit() # Salva o reset
-    else:
-        # Usuário não encontrado: logar e retornar erro genérico para evitar enumeração de usuários
-        logger.warning(f"LOGIN_FAILED_UNKNOWN_USER: Tentativa de login para e-mail não existente: {form_data.username}")
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="E-mail ou senha incorretos", headers={"WWW-Authenticate": "Bearer"})
-    
     access_token = security.create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -228,11 +249,8 @@ def verify_code(request: schemas.VerifyCodeRequest, db: Session = Depends(databa
     logger.info(f"VERIFY_CODE_SUCCESS: Código de recuperação verificado com sucesso para usuário '{user.id}' ({user.email}).")
     return {"message": "Código verificado com sucesso."}
 
-@router.post("/reset-password", dependencies=[Depends(rate_limit_recovery)])
-def reset_password(request: schemas.ResetPasswordRequest, db: Session = Depends(database.get_db)):
-    """
-    Redefine a senha do usuário após a verificação bem-sucedida do código.
-    """
+def _get_user_for_reset(db: Session, request: schemas.ResetPasswordRequest) -> models.Usuario:
+    """Busca o usuário e valida o código de recuperação (corre no threadpool)."""
     user = db.query(models.Usuario).filter(models.Usuario.email == request.email).first()
     
     if not user:
@@ -242,13 +260,23 @@ def reset_password(request: schemas.ResetPasswordRequest, db: Session = Depends(
     if user.reset_token != request.code or user.reset_token_expires < datetime.now(timezone.utc):
         logger.warning(f"RESET_PASSWORD_FAILED: Código inválido ou expirado durante redefinição de senha para usuário '{user.id}' ({user.email}).")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Código inválido ou expirado.")
+    return user
+
+@router.post("/reset-password", dependencies=[Depends(rate_limit_recovery)])
+async def reset_password(request: schemas.ResetPasswordRequest, db: Session = Depends(database.get_db)):
+    """
+    Redefine a senha do usuário após a verificação bem-sucedida do código.
+    O bcrypt corre no pool de hashing e a base de dados no threadpool, como no login.
+    """
+    user = await run_in_threadpool(_get_user_for_reset, db, request)
+    user_id, email = user.id, user.email
 
-    user.senha = security.get_password_hash(request.new_password)
+    user.senha = await security.get_password_hash_async(request.new_password)
     user.reset_token = None # Limpa o token de reset após o uso
     user.reset_token_expires = None # Limpa a expiração
     user.failed_login_attempts = 0
     user.locked_until = None
-    db.commit()
-    logger.info(f"RESET_PASSWORD_SUCCESS: Senha redefinida com sucesso para usuário '{user.id}' ({user.email}).")
+    await run_in_threadpool(db.commit)
+    logger.info(f"RESET_PASSWORD_SUCCESS: Senha redefinida com sucesso para usuário '{user_id}' ({email}).")
 
     return {"message": "Senha redefinida com sucesso."}
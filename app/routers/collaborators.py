@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request # Importado Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, extract
 from datetime import datetime, timedelta, date
@@ -21,6 +22,11 @@ LOGIN_ATTEMPT_WINDOW_SECONDS = 60 # Janela de tempo em segundos (1 minuto)
 # FIM DA ALTERAÇÃO
 
 from .. import database, schemas, models, security
+from ..services import cache_service, ai_service
+from ..services.password_service import password_hasher
+from ..services.gemini_service import gemini_client
+from ..services.scheduler_service import scheduler
+from .ai import ai_batcher
 
 router = APIRouter(
     prefix="/collaborators",
@@ -54,7 +60,7 @@ def rate_limit_login(request: Request):
 # FIM DA ALTERAÇÃO
 
 # Helper para verificar se o colaborador é um administrador
-def require_admin(current_user: models.Colaborador = Depends(security.get_current_collaborator)):
+def require_admin(current_user: security.CollaboratorPrincipal = Depends(security.get_current_collaborator)):
     """
     Verifica se o usuário autenticado é um administrador.
     Levanta uma HTTPException 403 se o cargo não for 'adm'.
@@ -66,17 +72,22 @@ def require_admin(current_user: models.Colaborador = Depends(security.get_curren
 # INÍCIO DA ALTERAÇÃO: Adicionada a dependência de Rate Limiting ao endpoint de login
 @router.post("/token", dependencies=[Depends(rate_limit_login)], response_model=schemas.Token)
 # FIM DA ALTERAÇÃO
-def login_for_access_token(form_data: schemas.ColaboradorLogin, db: Session = Depends(database.get_db)):
+async def login_for_access_token(form_data: schemas.ColaboradorLogin, db: Session = Depends(database.get_db)):
     """
     Endpoint para login de colaboradores.
     Autentica o colaborador e retorna um token JWT.
+
+    A consulta corre no threadpool e o bcrypt no pool de hashing, sem ocupar uma
+    thread do servidor durante a espera pelo hash.
     """
-    colaborador = db.query(models.Colaborador).filter(
-        (models.Colaborador.email == form_data.login) | (models.Colaborador.cpf == form_data.login)
-    ).first()
+    colaborador = await run_in_threadpool(
+        lambda: db.query(models.Colaborador).filter(
+            (models.Colaborador.email == form_data.login) | (models.Colaborador.cpf == form_data.login)
+        ).first()
+    )
 
     # Verifica se o colaborador existe e se a senha está correta
-    if not colaborador or not security.verify_password(form_data.senha, colaborador.senha):
+    if not colaborador or not await security.verify_password_async(form_data.senha, colaborador.senha):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Login ou senha incorretos",
@@ -93,7 +104,7 @@ def login_for_access_token(form_data: schemas.ColaboradorLogin, db: Session = De
 
 
 @router.get("/dashboard/stats", response_model=schemas.DashboardStats)
-def get_dashboard_stats(db: Session = Depends(database.get_db), admin: models.Colaborador = Depends(require_admin)):
+def get_dashboard_stats(db: Session = Depends(database.get_db), admin: security.CollaboratorPrincipal = Depends(require_admin)):
     """ 
     Retorna as estatísticas gerais para os cards do topo do dashboard do administrador.
     Requer privilégios de administrador.
@@ -112,7 +123,7 @@ def get_dashboard_stats(db: Session = Depends(database.get_db), admin: models.Co
 def get_chart_data(
     period: str = Query("mes", enum=["semana", "mes", "ano"]), 
     db: Session = Depends(database.get_db), 
-    admin: models.Colaborador = Depends(require_admin)
+    admin: security.CollaboratorPrincipal = Depends(require_admin)
 ):
     """
     Retorna dados agregados para os gráficos do dashboard do colaborador.
@@ -207,7 +218,7 @@ def get_chart_data(
 # --- Endpoints de Suporte ---
 
 @router.get("/support/tickets", response_model=List[schemas.SuporteChamado])
-def get_all_tickets(db: Session = Depends(database.get_db), current_user: models.Colaborador = Depends(security.get_current_collaborator)):
+def get_all_tickets(db: Session = Depends(database.get_db), current_user: security.CollaboratorPrincipal = Depends(security.get_current_collaborator)):
     """ 
     Lista todos os chamados de suporte abertos.
     Acessível por qualquer colaborador, mas a lógica de atribuição pode ser adicionada aqui.
@@ -232,7 +243,7 @@ def get_all_tickets(db: Session = Depends(database.get_db), current_user: models
 def complete_ticket(
     ticket_id: str, 
     db: Session = Depends(database.get_db), 
-    current_user: models.Colaborador = Depends(security.get_current_collaborator)
+    current_user: security.CollaboratorPrincipal = Depends(security.get_current_collaborator)
 ):
     """ 
     Marca um chamado de suporte como concluído.
@@ -256,7 +267,7 @@ def complete_ticket(
     }
 
 @router.get("/support/stats", response_model=List[schemas.SuporteStats])
-def get_support_stats(db: Session = Depends(database.get_db), admin: models.Colaborador = Depends(require_admin)):
+def get_support_stats(db: Session = Depends(database.get_db), admin: security.CollaboratorPrincipal = Depends(require_admin)):
     """ 
     Retorna estatísticas de chamados resolvidos por cada colaborador.
     Requer privilégios de administrador.
@@ -282,3 +293,21 @@ def get_support_stats(db: Session = Depends(database.get_db), admin: models.Cola
         })
     return stats
 
+
+# --- Métricas internas do processo ---
+
+@router.get("/metrics")
+def get_runtime_metrics(admin: security.CollaboratorPrincipal = Depends(require_admin)):
+    """
+    Retorna as métricas em memória deste worker (pool de hashing, caches, cliente do Gemini e agendador).
+    Requer privilégios de administrador.
+    """
+    return {
+        "password_hashing": password_hasher.stats(),
+        "response_cache": cache_service.response_cache.stats(),
+        "gemini_client": gemini_client.stats(),
+        "ai_parse_cache": ai_service.parse_cache.stats(),
+        "ai_batcher": ai_batcher.stats(),
+        "scheduler": scheduler.stats(),
+        **security.auth_cache_stats(),
+    }
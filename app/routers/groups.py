@@ -1,16 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, BackgroundTasks
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, extract
-from typing import List
+from sqlalchemy import func
+from typing import List, Optional
 from decimal import Decimal
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone, timedelta, date
 from dateutil.relativedelta import relativedelta
 import bleach
 import html
 
 from .. import database, schemas, models
-from ..models import Conquista, TipoMedalhaEnum
-from ..security import get_current_user_from_token
+from ..security import UserPrincipal, get_current_user_from_token, get_current_user_model, invalidate_principal, require_group_member, check_group_membership, get_group_role, invalidate_group_membership
+from ..services import dashboard_service, ledger_service, rollup_service, cache_service, event_service, achievements_service
+from ..config import settings
 
 router = APIRouter(
     prefix="/groups",
@@ -18,170 +19,182 @@ router = APIRouter(
     dependencies=[Depends(get_current_user_from_token)]
 )
 
-@router.get("/{group_id}/dashboard", response_model=schemas.DashboardData)
-def get_dashboard_data(group_id: str, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
-    group = db.query(models.Grupo).options(
-        joinedload(models.Grupo.associacoes_membros).joinedload(models.GrupoMembro.usuario),
-        joinedload(models.Grupo.conquistas)
-    ).filter(models.Grupo.id == group_id).first()
+def _membros_do_grupo(db: Session, group_id) -> list:
+    """Id, nome e papel de cada membro do grupo, numa única consulta."""
+    return db.query(models.Usuario.id, models.Usuario.nome, models.GrupoMembro.papel).join(
+        models.GrupoMembro, models.GrupoMembro.usuario_id == models.Usuario.id
+    ).filter(models.GrupoMembro.grupo_id == group_id).all()
 
-    if not group:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Grupo não encontrado.")
+def _build_dashboard_data(db: Session, group: models.Grupo, current_user: UserPrincipal) -> dict:
+    group_id = group.id
+    membros_com_papel = [{"id": id, "nome": nome, "papel": papel} for id, nome, papel in _membros_do_grupo(db, group_id)]
     
-    if current_user not in group.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido a este grupo.")
-
-    membros_com_papel = [{"id": assoc.usuario.id, "nome": assoc.usuario.nome, "papel": assoc.papel} for assoc in group.associacoes_membros]
-    
-    movimentacoes = db.query(models.Movimentacao).filter(models.Movimentacao.grupo_id == group_id).order_by(models.Movimentacao.data_transacao.desc()).limit(30).all()
-    movimentacoes_com_responsavel = [{"id": mov.id, "tipo": mov.tipo, "descricao": mov.descricao, "valor": mov.valor, "data_transacao": mov.data_transacao, "responsavel_nome": mov.responsavel.nome} for mov in movimentacoes]
+    # O nome do responsável vem do mesmo SELECT, evitando um lazy load por movimentação
+    movimentacoes = db.query(models.Movimentacao, models.Usuario.nome).join(
+        models.Usuario, models.Movimentacao.responsavel_id == models.Usuario.id
+    ).filter(models.Movimentacao.grupo_id == group_id).order_by(models.Movimentacao.data_transacao.desc()).limit(30).all()
+    movimentacoes_com_responsavel = [{"id": mov.id, "tipo": mov.tipo, "descricao": mov.descricao, "valor": mov.valor, "data_transacao": mov.data_transacao, "responsavel_nome": nome} for mov, nome in movimentacoes]
     
     meta_ativa = db.query(models.Meta).filter(models.Meta.grupo_id == group_id, models.Meta.status == 'ativa').first()
 
-    def get_total_for_type(tipo: str) -> Decimal:
-        total = db.query(func.sum(models.Movimentacao.valor)).filter(models.Movimentacao.grupo_id == group_id, models.Movimentacao.tipo == tipo).scalar()
-        return total or Decimal('0.0')
-
-    total_ganhos = get_total_for_type('ganho')
-    total_gastos = get_total_for_type('gasto')
-    saldo_total = total_ganhos - total_gastos
-
-    total_investido = db.query(func.sum(models.Meta.valor_atual)).filter(models.Meta.grupo_id == group_id).scalar() or Decimal('0.0')
-
-    today = datetime.now(timezone.utc)
-    
-    def get_total_for_current_month(tipo: str) -> Decimal:
-        total = db.query(func.sum(models.Movimentacao.valor)).filter(
-            models.Movimentacao.grupo_id == group_id,
-            models.Movimentacao.tipo == tipo,
-            extract('year', models.Movimentacao.data_transacao) == today.year,
-            extract('month', models.Movimentacao.data_transacao) == today.month
-        ).scalar()
-        return total or Decimal('0.0')
-
-    ganhos_mes_atual = get_total_for_current_month('ganho')
-    gastos_mes_atual = get_total_for_current_month('gasto')
-
-    thirty_days_ago = today - timedelta(days=30)
-    
-    def get_total_for_last_30_days(tipo: str) -> Decimal:
-        total = db.query(func.sum(models.Movimentacao.valor)).filter(
-            models.Movimentacao.grupo_id == group_id,
-            models.Movimentacao.tipo == tipo,
-            models.Movimentacao.data_transacao >= thirty_days_ago
-        ).scalar()
-        return total or Decimal('0.0')
-
-    ganhos_ultimos_30dias = get_total_for_last_30_days('ganho')
-    gastos_ultimos_30dias = get_total_for_last_30_days('gasto')
+    # Todos os totais (saldo, mês atual, últimos 30 dias, investido e uso de IA) numa só consulta
+    totais = dashboard_service.get_dashboard_totals(db, group.id, incluir_uso_ia=(group.plano == 'gratuito'))
 
     conquistas_recentes = group.conquistas[:3]
 
-    ai_usage_count_today = 0
-    ai_first_usage_timestamp_today = None
-    if group.plano == 'gratuito':
-        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(days=1)
-        recent_usages = db.query(models.AIUsage).filter(
-            models.AIUsage.grupo_id == group.id,
-            models.AIUsage.timestamp >= twenty_four_hours_ago
-        ).order_by(models.AIUsage.timestamp.asc()).all()
-
-        ai_usage_count_today = len(recent_usages)
-        if ai_usage_count_today > 0:
-            ai_first_usage_timestamp_today = recent_usages[0].timestamp
-
     dashboard_data = {
+        **totais.model_dump(),
         "current_user_id": current_user.id,
         "nome_utilizador": current_user.nome, "nome_grupo": group.nome, "plano": group.plano,
         "membros": membros_com_papel, "movimentacoes_recentes": movimentacoes_com_responsavel,
         "meta_ativa": meta_ativa,
-        "total_investido": total_investido,
-        "saldo_total": saldo_total,
-        "conquistas_recentes": conquistas_recentes,
-        "ganhos_mes_atual": ganhos_mes_atual,
-        "gastos_mes_atual": gastos_mes_atual,
-        "ganhos_ultimos_30dias": ganhos_ultimos_30dias,
-        "gastos_ultimos_30dias": gastos_ultimos_30dias,
-        "ai_usage_count_today": ai_usage_count_today,
-        "ai_first_usage_timestamp_today": ai_first_usage_timestamp_today
+        "conquistas_recentes": conquistas_recentes
     }
     return dashboard_data
 
-@router.get("/{group_id}/stats", response_model=List[schemas.MemberStats])
-def get_group_stats(
-    group_id: str,
-    year: int,
-    month: int,
-    db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(get_current_user_from_token)
-):
-    """Retorna as estatísticas de gastos, ganhos e investimentos para cada membro em um determinado mês/ano."""
-    group = db.query(models.Grupo).options(joinedload(models.Grupo.associacoes_membros).joinedload(models.GrupoMembro.usuario)).filter(models.Grupo.id == group_id).first()
-    if not group or current_user not in group.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido.")
+@router.get("/{group_id}/dashboard", response_model=schemas.DashboardData, dependencies=[Depends(require_group_member())])
+def get_dashboard_data(group_id: str, request: Request, db: Session = Depends(database.get_db), current_user: UserPrincipal = Depends(get_current_user_from_token)):
+    group = db.query(models.Grupo).filter(models.Grupo.id == group_id).first()
 
-    stats = []
-    for member in group.member_list:
-        def get_total_for_type(tipo: str) -> Decimal:
-            total = db.query(func.sum(models.Movimentacao.valor)).filter(
-                models.Movimentacao.grupo_id == group_id,
-                models.Movimentacao.responsavel_id == member.id,
-                models.Movimentacao.tipo == tipo,
-                extract('year', models.Movimentacao.data_transacao) == year,
-                extract('month', models.Movimentacao.data_transacao) == month
-            ).scalar()
-            return total or Decimal('0.0')
+    # Os totais dos últimos 30 dias e o uso de IA das últimas 24h dependem da hora atual
+    hora_atual = datetime.now(timezone.utc).strftime("%Y%m%d%H")
+    return cache_service.cached_group_response(
+        request, group, "dashboard", schemas.DashboardData,
+        lambda: _build_dashboard_data(db, group, current_user),
+        variacao=(current_user.id, hora_atual)
+    )
+
+def _build_group_stats(db: Session, group: models.Grupo, year: int, month: int) -> list:
+    # Uma única leitura por chave (grupo, mês) no resumo mensal, em vez de três SUMs por membro
+    resumo = db.query(models.ResumoMensal.responsavel_id, models.ResumoMensal.tipo, models.ResumoMensal.total).filter(
+        models.ResumoMensal.grupo_id == group.id,
+        models.ResumoMensal.ano_mes == date(year, month, 1)
+    ).all()
+    totais = {(responsavel_id, tipo): total for responsavel_id, tipo, total in resumo}
 
+    stats = []
+    for member_id, member_name, _ in _membros_do_grupo(db, group.id):
         stats.append({
-            "member_id": member.id,
-            "member_name": member.nome,
-            "ganhos": get_total_for_type('ganho'),
-            "gastos": get_total_for_type('gasto'),
-            "investimentos": get_total_for_type('investimento')
+            "member_id": member_id,
+            "member_name": member_name,
+            "ganhos": totais.get((member_id, 'ganho'), Decimal('0.0')),
+            "gastos": totais.get((member_id, 'gasto'), Decimal('0.0')),
+            "investimentos": totais.get((member_id, 'investimento'), Decimal('0.0'))
         })
     return stats
 
-@router.get("/{group_id}/chart_data", response_model=List[schemas.ChartMonthData])
-def get_chart_data(group_id: str, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
+@router.get("/{group_id}/stats", response_model=List[schemas.MemberStats], dependencies=[Depends(require_group_member())])
+def get_group_stats(
+    group_id: str,
+    request: Request,
+    year: int = Query(..., ge=1),
+    month: int = Query(..., ge=1, le=12),
+    db: Session = Depends(database.get_db)
+):
+    """Retorna as estatísticas de gastos, ganhos e investimentos para cada membro em um determinado mês/ano."""
     group = db.query(models.Grupo).filter(models.Grupo.id == group_id).first()
-    if not group or current_user not in group.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido.")
-    today = datetime.now()
+
+    return cache_service.cached_group_response(
+        request, group, "stats", List[schemas.MemberStats],
+        lambda: _build_group_stats(db, group, year, month),
+        variacao=(year, month)
+    )
+
+MESES_PT = {1: "Jan", 2: "Fev", 3: "Mar", 4: "Abr", 5: "Mai", 6: "Jun", 7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"}
+MAX_CHART_BUCKETS = 400 # Limite de pontos por série (≈ 13 meses diários ou 33 anos mensais)
+
+def _chart_buckets(start: date, end: date, granularity: str) -> List[date]:
+    """Inícios de todos os períodos entre start e end, para preencher com zero os que não têm dados."""
+    if granularity == 'month':
+        current, step = rollup_service.month_start(start), relativedelta(months=1)
+    elif granularity == 'week':
+        current, step = start - timedelta(days=start.weekday()), timedelta(weeks=1)
+    else:
+        current, step = start, timedelta(days=1)
+    buckets = []
+    while current <= end:
+        buckets.append(current)
+        current += step
+    return buckets
+
+def _as_date(value) -> date:
+    # O SQLite devolve as datas truncadas como texto
+    return date.fromisoformat(value[:10]) if isinstance(value, str) else value
+
+def _build_chart_data(db: Session, group: models.Grupo, buckets: List[date], end: date, granularity: str) -> list:
+    if granularity == 'month':
+        # Os meses já estão truncados no resumo mensal: a série sai de um GROUP BY sobre ele
+        periodo = models.ResumoMensal.ano_mes
+        rows = db.query(periodo, models.ResumoMensal.tipo, func.sum(models.ResumoMensal.total)).filter(
+            models.ResumoMensal.grupo_id == group.id,
+            periodo >= buckets[0],
+            periodo <= end
+        ).group_by(periodo, models.ResumoMensal.tipo).all()
+    else:
+        periodo = rollup_service.period_start_expr(db, models.Movimentacao.data_transacao, granularity)
+        rows = db.query(periodo, models.Movimentacao.tipo, func.sum(models.Movimentacao.valor)).filter(
+            models.Movimentacao.grupo_id == group.id,
+            models.Movimentacao.data_transacao >= buckets[0],
+            models.Movimentacao.data_transacao < end + timedelta(days=1)
+        ).group_by(periodo, models.Movimentacao.tipo).all()
+    totais = {(_as_date(inicio), tipo): Decimal(str(total or 0)) for inicio, tipo, total in rows}
+
     chart_data = []
-    meses_pt = {1: "Jan", 2: "Fev", 3: "Mar", 4: "Abr", 5: "Mai", 6: "Jun", 7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"}
-    for i in range(3):
-        target_date = today - relativedelta(months=i)
-        year, month = target_date.year, target_date.month
-        def get_total_for_type(tipo: str) -> Decimal:
-            total = db.query(func.sum(models.Movimentacao.valor)).filter(
-                models.Movimentacao.grupo_id == group_id, models.Movimentacao.tipo == tipo,
-                extract('year', models.Movimentacao.data_transacao) == year,
-                extract('month', models.Movimentacao.data_transacao) == month
-            ).scalar()
-            return total or Decimal('0.0')
-        ganhos = get_total_for_type('ganho')
-        gastos = get_total_for_type('gasto')
-        investimentos = get_total_for_type('investimento')
-        saldo = ganhos - gastos
+    for inicio in buckets:
+        ganhos = totais.get((inicio, 'ganho'), Decimal('0.0'))
+        gastos = totais.get((inicio, 'gasto'), Decimal('0.0'))
+        investimentos = totais.get((inicio, 'investimento'), Decimal('0.0'))
+        if granularity == 'month':
+            label = f"{MESES_PT[inicio.month]}/{str(inicio.year)[2:]}"
+        else:
+            label = inicio.strftime("%d/%m")
         chart_data.append({
-            "mes": f"{meses_pt[month]}/{str(year)[2:]}",
+            "mes": label,
+            "inicio": inicio,
             "ganhos": float(ganhos),
             "gastos": float(gastos),
             "investimentos": float(investimentos),
-            "saldo": float(saldo)
+            "saldo": float(ganhos - gastos)
         })
-    return chart_data[::-1]
-@router.get("/{group_id}/goals", response_model=List[schemas.Meta])
-def get_all_goals_for_group(group_id: str, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
+    return chart_data
+
+@router.get("/{group_id}/chart_data", response_model=List[schemas.ChartMonthData], dependencies=[Depends(require_group_member())])
+def get_chart_data(
+    group_id: str,
+    request: Request,
+    months: int = Query(3, ge=1, le=60, description="Número de meses até hoje (ignorado se 'start' for enviado)."),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = Query("month", pattern="^(day|week|month)$"),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Retorna a série de ganhos, gastos, investimentos e saldo do grupo por dia, semana ou mês.
+    Toda a série vem de uma única consulta agrupada; os períodos sem movimentações são preenchidos com zero.
+    """
     group = db.query(models.Grupo).filter(models.Grupo.id == group_id).first()
-    if not group or current_user not in group.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido.")
-    return group.metas
-@router.post("/{group_id}/goals", response_model=schemas.Meta, status_code=status.HTTP_201_CREATED)
-def create_goal_for_group(group_id: str, goal: schemas.GoalCreate, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
+
+    end = end or datetime.now().date()
+    start = start or rollup_service.month_start(end - relativedelta(months=months - 1))
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A data inicial deve ser anterior à data final.")
+    buckets = _chart_buckets(start, end, granularity)
+    if len(buckets) > MAX_CHART_BUCKETS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Intervalo muito grande para a granularidade escolhida.")
+
+    return cache_service.cached_group_response(
+        request, group, "chart_data", List[schemas.ChartMonthData],
+        lambda: _build_chart_data(db, group, buckets, end, granularity),
+        variacao=(buckets[0], end, granularity)
+    )
+
+@router.get("/{group_id}/goals", response_model=List[schemas.Meta], dependencies=[Depends(require_group_member())])
+def get_all_goals_for_group(group_id: str, request: Request, db: Session = Depends(database.get_db)):
+    group = db.query(models.Grupo).filter(models.Grupo.id == group_id).first()
+    return cache_service.cached_group_response(request, group, "goals", List[schemas.Meta], lambda: group.metas)
+@router.post("/{group_id}/goals", response_model=schemas.Meta, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_group_member())])
+def create_goal_for_group(group_id: str, goal: schemas.GoalCreate, db: Session = Depends(database.get_db)):
     group = db.query(models.Grupo).options(joinedload(models.Grupo.metas)).filter(models.Grupo.id == group_id).first()
-    if not group or current_user not in group.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido.")
     if group.plano == 'gratuito' and len([m for m in group.metas if m.status == 'ativa']) > 0:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="O plano gratuito permite apenas uma meta ativa.")
     
@@ -189,26 +202,30 @@ def create_goal_for_group(group_id: str, goal: schemas.GoalCreate, db: Session =
 
     db_goal = models.Meta(titulo=sanitized_title, valor_meta=goal.valor_meta, data_limite=goal.data_limite, grupo_id=group_id)
     db.add(db_goal)
+    cache_service.bump_group_version(db, group.id)
     db.commit()
     db.refresh(db_goal)
     return db_goal
 @router.put("/goals/{goal_id}", response_model=schemas.Meta)
-def update_goal(goal_id: str, goal_update: schemas.GoalUpdate, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
-    db_goal = db.query(models.Meta).options(joinedload(models.Meta.grupo)).filter(models.Meta.id == goal_id).first()
-    if not db_goal or current_user not in db_goal.grupo.member_list:
+def update_goal(goal_id: str, goal_update: schemas.GoalUpdate, db: Session = Depends(database.get_db), current_user: UserPrincipal = Depends(get_current_user_from_token)):
+    db_goal = db.query(models.Meta).filter(models.Meta.id == goal_id).first()
+    if not db_goal:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido.")
+    check_group_membership(db, db_goal.grupo_id, current_user.id)
     
     db_goal.titulo = bleach.clean(html.unescape(goal_update.titulo))
     db_goal.valor_meta = goal_update.valor_meta
     db_goal.data_limite = goal_update.data_limite
+    cache_service.bump_group_version(db, db_goal.grupo_id)
     db.commit()
     db.refresh(db_goal)
     return db_goal
 @router.delete("/goals/{goal_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_goal(goal_id: str, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
-    db_goal = db.query(models.Meta).options(joinedload(models.Meta.grupo)).filter(models.Meta.id == goal_id).first()
-    if not db_goal or current_user not in db_goal.grupo.member_list:
+def delete_goal(goal_id: str, db: Session = Depends(database.get_db), current_user: UserPrincipal = Depends(get_current_user_from_token)):
+    db_goal = db.query(models.Meta).filter(models.Meta.id == goal_id).first()
+    if not db_goal:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido.")
+    check_group_membership(db, db_goal.grupo_id, current_user.id)
     
     if db_goal.valor_atual > 0:
         return_transaction = models.Movimentacao(
@@ -218,55 +235,47 @@ def delete_goal(goal_id: str, db: Session = Depends(database.get_db), current_us
             descricao=f"Valor retornado da meta '{db_goal.titulo}' excluída.",
             valor=db_goal.valor_atual
         )
+        ledger_service.record_transaction(db, return_transaction)
         db.add(return_transaction)
         
     db.delete(db_goal)
+    cache_service.bump_group_version(db, db_goal.grupo_id)
     db.commit()
     return
 
 @router.post("/goals/{goal_id}/add_funds", response_model=schemas.Meta)
-def add_funds_to_goal(goal_id: str, funds: schemas.GoalAddFunds, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
-    db_goal = db.query(models.Meta).options(joinedload(models.Meta.grupo)).filter(models.Meta.id == goal_id).first()
-    if not db_goal or current_user not in db_goal.grupo.member_list:
+def add_funds_to_goal(goal_id: str, funds: schemas.GoalAddFunds, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db), current_user: UserPrincipal = Depends(get_current_user_from_token)):
+    db_goal = db.query(models.Meta).filter(models.Meta.id == goal_id).first()
+    if not db_goal:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido a esta meta.")
+    check_group_membership(db, db_goal.grupo_id, current_user.id, detail="Acesso não permitido a esta meta.")
     
     # --- INÍCIO DA ALTERAÇÃO: Verificar se há saldo suficiente ---
-    # Calcula o saldo atual antes de tentar adicionar fundos
-    total_ganhos = db.query(func.sum(models.Movimentacao.valor)).filter(models.Movimentacao.grupo_id == db_goal.grupo_id, models.Movimentacao.tipo == 'ganho').scalar() or Decimal('0.0')
-    total_gastos = db.query(func.sum(models.Movimentacao.valor)).filter(models.Movimentacao.grupo_id == db_goal.grupo_id, models.Movimentacao.tipo == 'gasto').scalar() or Decimal('0.0')
-    saldo_atual = total_ganhos - total_gastos
+    # Lê o saldo materializado com a linha bloqueada até ao commit, para que dois
+    # aportes simultâneos não consigam gastar o mesmo saldo
+    saldo_atual = ledger_service.lock_group_balance(db, db_goal.grupo_id).saldo
+    # Relê a meta já com o lock obtido, para não somar sobre um valor_atual desatualizado
+    db.refresh(db_goal)
     
     if funds.valor > saldo_atual:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Saldo insuficiente para investir. Saldo atual: {saldo_atual:.2f}")
     # --- FIM DA ALTERAÇÃO ---
 
     db_goal.valor_atual += funds.valor
-    if db_goal.valor_atual >= db_goal.valor_meta and db_goal.status == 'ativa':
+    concluida = db_goal.valor_atual >= db_goal.valor_meta and db_goal.status == 'ativa'
+    if concluida:
         db_goal.status = 'concluida'
-        
-        if db_goal.grupo.is_premium:
-            medalhas_por_valor = {
-                TipoMedalhaEnum.diamante: (Decimal('1000000.00'), "Atingiu a incrível marca de R$ 1.000.000 em uma meta!"),
-                TipoMedalhaEnum.platina: (Decimal('100000.00'), "Parabéns por atingir uma meta de mais de R$ 100.000!"),
-                TipoMedalhaEnum.ouro: (Decimal('10000.00'), "Vocês atingiram uma meta de mais de R$ 10.000! Excelente!")
-            }
-            for tipo, (valor_minimo, descricao) in medalhas_por_valor.items():
-                if db_goal.valor_meta >= valor_minimo:
-                    data_limite_cooldown = datetime.now(timezone.utc) - relativedelta(months=3)
-                    ultima_conquista_do_tipo = db.query(models.Conquista).filter(
-                        models.Conquista.grupo_id == db_goal.grupo_id,
-                        models.Conquista.tipo_medalha == tipo,
-                        models.Conquista.data_conquista > data_limite_cooldown
-                    ).first()
-                    if not ultima_conquista_do_tipo:
-                        nova_conquista = models.Conquista(
-                            grupo_id=db_goal.grupo_id,
-                            tipo_medalha=tipo,
-                            descricao=descricao
-                        )
-                        db.add(nova_conquista)
-                    break 
-    
+
+    # As medalhas de meta (Ouro, Platina, Diamante) são avaliadas fora do pedido
+    # (ver services/achievements_service.py), só para a meta acabada de concluir
+    if concluida:
+        event_service.publish(
+            db, event_service.META_FINANCIADA, db_goal.grupo_id,
+            meta_id=str(db_goal.id), valor=str(funds.valor), valor_meta=str(db_goal.valor_meta), concluida=True
+        )
+        if not settings.SCHEDULER_ENABLED:
+            background_tasks.add_task(achievements_service.drain_events)
+
     # --- INÍCIO DA ALTERAÇÃO: Registrar aporte como GASTO ---
     db_transaction = models.Movimentacao(
         grupo_id=db_goal.grupo_id, 
@@ -276,33 +285,34 @@ def add_funds_to_goal(goal_id: str, funds: schemas.GoalAddFunds, db: Session = D
         valor=funds.valor
     )
     # --- FIM DA ALTERAÇÃO ---
+    ledger_service.record_transaction(db, db_transaction)
     db.add(db_transaction)
+    cache_service.bump_group_version(db, db_goal.grupo_id)
     db.commit()
     db.refresh(db_goal)
     return db_goal
 @router.post("/goals/{goal_id}/withdraw_funds", response_model=schemas.Meta)
-def withdraw_funds_from_goal(goal_id: str, funds: schemas.GoalWithdrawFunds, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
-    db_goal = db.query(models.Meta).options(joinedload(models.Meta.grupo)).filter(models.Meta.id == goal_id).first()
-    if not db_goal or current_user not in db_goal.grupo.member_list:
+def withdraw_funds_from_goal(goal_id: str, funds: schemas.GoalWithdrawFunds, db: Session = Depends(database.get_db), current_user: UserPrincipal = Depends(get_current_user_from_token)):
+    db_goal = db.query(models.Meta).filter(models.Meta.id == goal_id).first()
+    if not db_goal:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido.")
+    check_group_membership(db, db_goal.grupo_id, current_user.id)
     valor_a_retirar = funds.valor
     if valor_a_retirar > db_goal.valor_atual:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Valor de retirada excede os fundos na meta.")
     db_goal.valor_atual -= valor_a_retirar
     db_transaction = models.Movimentacao(grupo_id=db_goal.grupo_id, responsavel_id=current_user.id, tipo='ganho', descricao=f"Retirada da meta: {db_goal.titulo}", valor=valor_a_retirar)
+    ledger_service.record_transaction(db, db_transaction)
     db.add(db_transaction)
+    cache_service.bump_group_version(db, db_goal.grupo_id)
     db.commit()
     db.refresh(db_goal)
     return db_goal
-@router.post("/{group_id}/invites", response_model=schemas.InviteLink)
-def create_invite_link(group_id: str, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
-    group = db.query(models.Grupo).options(joinedload(models.Grupo.associacoes_membros)).filter(models.Grupo.id == group_id).first()
-    if not group:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Grupo não encontrado.")
-    user_role = next((assoc.papel for assoc in group.associacoes_membros if assoc.usuario_id == current_user.id), None)
-    if user_role != 'dono':
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Apenas o dono do grupo pode gerar convites.")
-    if len(group.member_list) >= 4 or (group.plano == 'gratuito' and len(group.member_list) >= 2):
+@router.post("/{group_id}/invites", response_model=schemas.InviteLink, dependencies=[Depends(require_group_member('dono', "Apenas o dono do grupo pode gerar convites."))])
+def create_invite_link(group_id: str, db: Session = Depends(database.get_db)):
+    group = db.query(models.Grupo).filter(models.Grupo.id == group_id).first()
+    total_membros = db.query(func.count()).select_from(models.GrupoMembro).filter(models.GrupoMembro.grupo_id == group.id).scalar()
+    if total_membros >= 4 or (group.plano == 'gratuito' and total_membros >= 2):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="O grupo atingiu o limite máximo de membros.")
     new_invite = models.Convite(grupo_id=group.id)
     db.add(new_invite)
@@ -311,12 +321,12 @@ def create_invite_link(group_id: str, db: Session = Depends(database.get_db), cu
     invite_link = f"/pages/auth/accept_invite.html?token={new_invite.token}"
     return {"invite_link": invite_link}
 @router.post("/invites/{invite_token}/accept")
-def accept_invite(invite_token: str, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
+def accept_invite(invite_token: str, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_model)):
     invite = db.query(models.Convite).filter(models.Convite.token == invite_token, models.Convite.status == 'pendente').first()
     if not invite:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Convite inválido, expirado ou já utilizado.")
     group = invite.grupo
-    if current_user in group.member_list:
+    if get_group_role(db, group.id, current_user.id) is not None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Você já é membro deste grupo.")
     association = models.GrupoMembro(usuario_id=current_user.id, grupo_id=group.id, papel='membro')
     db.add(association)
@@ -324,18 +334,13 @@ def accept_invite(invite_token: str, db: Session = Depends(database.get_db), cur
     
     current_user.grupo_ativo_id = group.id
     
+    cache_service.bump_group_version(db, group.id)
     db.commit()
+    invalidate_group_membership(group.id, current_user.id)
+    invalidate_principal(current_user.email)
     return {"message": "Convite aceite com sucesso! Você foi adicionado ao grupo.", "group_id": group.id}
-@router.delete("/{group_id}/members/{member_id}", status_code=status.HTTP_204_NO_CONTENT)
-def remove_group_member(group_id: str, member_id: str, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
-    group = db.query(models.Grupo).options(joinedload(models.Grupo.associacoes_membros)).filter(models.Grupo.id == group_id).first()
-    if not group:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Grupo não encontrado.")
-    
-    user_role = next((assoc.papel for assoc in group.associacoes_membros if assoc.usuario_id == current_user.id), None)
-    if user_role != 'dono':
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Apenas o dono do grupo pode remover membros.")
-    
+@router.delete("/{group_id}/members/{member_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_group_member('dono', "Apenas o dono do grupo pode remover membros."))])
+def remove_group_member(group_id: str, member_id: str, db: Session = Depends(database.get_db), current_user: UserPrincipal = Depends(get_current_user_from_token)):
     if str(current_user.id) == member_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="O dono não pode sair do grupo.")
     
@@ -363,14 +368,15 @@ def remove_group_member(group_id: str, member_id: str, db: Session = Depends(dat
         user_to_remove.grupo_ativo_id = owner_association.grupo_id
     else:
         user_to_remove.grupo_ativo_id = None
+    cache_service.bump_group_version(db, group_id)
         
     db.commit()
+    invalidate_group_membership(group_id, member_id)
+    invalidate_principal(user_to_remove.email)
     return
 
-@router.get("/{group_id}/achievements", response_model=List[schemas.Conquista])
-def get_all_achievements_for_group(group_id: str, db: Session = Depends(database.get_db), current_user: models.Usuario = Depends(get_current_user_from_token)):
+@router.get("/{group_id}/achievements", response_model=List[schemas.Conquista], dependencies=[Depends(require_group_member())])
+def get_all_achievements_for_group(group_id: str, request: Request, db: Session = Depends(database.get_db)):
     """Lista todas as conquistas (medalhas) de um grupo."""
     group = db.query(models.Grupo).filter(models.Grupo.id == group_id).first()
-    if not group or current_user not in group.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido.")
-    return group.conquistas
+    return cache_service.cached_group_response(request, group, "achievements", List[schemas.Conquista], lambda: group.conquistas)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session, joinedload
 from typing import List
 from datetime import datetime, timezone
@@ -6,6 +6,7 @@ import bleach
 import html # INÍCIO DA ALTERAÇÃO: Importa o módulo html
 
 from .. import database, schemas, models, security
+from ..services import cache_service
 
 router = APIRouter(
     prefix="/pagamentos",
@@ -15,45 +16,37 @@ router = APIRouter(
 
 # --- Endpoints ---
 
-@router.get("/grupo/{group_id}", response_model=List[schemas.PagamentoAgendado])
+@router.get("/grupo/{group_id}", response_model=List[schemas.PagamentoAgendado], dependencies=[Depends(security.require_group_member())])
 def get_pagamentos_agendados_por_grupo(
     group_id: str,
-    db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(security.get_current_user_from_token)
+    request: Request,
+    db: Session = Depends(database.get_db)
 ):
     """
     Lista todos os pagamentos agendados para um grupo premium.
     """
     group = db.query(models.Grupo).filter(models.Grupo.id == group_id).first()
-    if not group or current_user not in group.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido a este grupo.")
 
-    pagamentos = db.query(models.PagamentoAgendado).filter(
-        models.PagamentoAgendado.grupo_id == group_id
-    ).order_by(models.PagamentoAgendado.data_vencimento.asc()).all()
-    return pagamentos
+    def build():
+        return db.query(models.PagamentoAgendado).filter(
+            models.PagamentoAgendado.grupo_id == group_id
+        ).order_by(models.PagamentoAgendado.data_vencimento.asc()).all()
+
+    return cache_service.cached_group_response(request, group, "pagamentos", List[schemas.PagamentoAgendado], build)
 
-@router.post("/grupo/{group_id}", response_model=schemas.PagamentoAgendado, status_code=status.HTTP_201_CREATED)
+@router.post("/grupo/{group_id}", response_model=schemas.PagamentoAgendado, status_code=status.HTTP_201_CREATED, dependencies=[Depends(security.require_group_member())])
 def create_pagamento_agendado(
     group_id: str,
     pagamento: schemas.PagamentoAgendadoCreate,
-    db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(security.get_current_user_from_token)
+    db: Session = Depends(database.get_db)
 ):
     """
     Cria um novo pagamento agendado para um grupo premium.
     """
     group = db.query(models.Grupo).options(
-        joinedload(models.Grupo.associacoes_membros),
         joinedload(models.Grupo.assinatura)
     ).filter(models.Grupo.id == group_id).first()
 
-    if not group:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Grupo não encontrado.")
-
-    if current_user not in group.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido a este grupo.")
-
     if not group.is_premium:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -73,6 +66,7 @@ def create_pagamento_agendado(
         grupo_id=group_id
     )
     db.add(db_pagamento)
+    cache_service.bump_group_version(db, group.id)
     db.commit()
     db.refresh(db_pagamento)
     return db_pagamento
@@ -83,20 +77,17 @@ def update_pagamento_agendado(
     pagamento_id: str,
     pagamento_update: schemas.PagamentoAgendadoUpdate,
     db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(security.get_current_user_from_token)
+    current_user: security.UserPrincipal = Depends(security.get_current_user_from_token)
 ):
     """
     Atualiza um pagamento agendado existente.
     """
-    db_pagamento = db.query(models.PagamentoAgendado).options(
-        joinedload(models.PagamentoAgendado.grupo)
-    ).filter(models.PagamentoAgendado.id == pagamento_id).first()
+    db_pagamento = db.query(models.PagamentoAgendado).filter(models.PagamentoAgendado.id == pagamento_id).first()
 
     if not db_pagamento:
         raise HTTPException(status_code=404, detail="Pagamento não encontrado")
 
-    if current_user not in db_pagamento.grupo.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido.")
+    security.check_group_membership(db, db_pagamento.grupo_id, current_user.id)
 
     update_data = pagamento_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
@@ -109,6 +100,7 @@ def update_pagamento_agendado(
         else:
             setattr(db_pagamento, key, value)
     
+    cache_service.bump_group_version(db, db_pagamento.grupo_id)
     db.commit()
     db.refresh(db_pagamento)
     return db_pagamento
@@ -118,23 +110,21 @@ def update_pagamento_agendado(
 def marcar_como_pago(
     pagamento_id: str,
     db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(security.get_current_user_from_token)
+    current_user: security.UserPrincipal = Depends(security.get_current_user_from_token)
 ):
     """
     Marca um pagamento agendado como 'pago'.
     """
-    db_pagamento = db.query(models.PagamentoAgendado).options(
-        joinedload(models.PagamentoAgendado.grupo)
-    ).filter(models.PagamentoAgendado.id == pagamento_id).first()
+    db_pagamento = db.query(models.PagamentoAgendado).filter(models.PagamentoAgendado.id == pagamento_id).first()
 
     if not db_pagamento:
         raise HTTPException(status_code=404, detail="Pagamento não encontrado")
     
-    if current_user not in db_pagamento.grupo.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido a este pagamento.")
+    security.check_group_membership(db, db_pagamento.grupo_id, current_user.id, detail="Acesso não permitido a este pagamento.")
     
     db_pagamento.status = models.StatusPagamentoEnum.pago
     db_pagamento.data_pagamento = datetime.now(timezone.utc)
+    cache_service.bump_group_version(db, db_pagamento.grupo_id)
     db.commit()
     db.refresh(db_pagamento)
     return db_pagamento
@@ -143,22 +133,20 @@ def marcar_como_pago(
 def delete_pagamento_agendado(
     pagamento_id: str,
     db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(security.get_current_user_from_token)
+    current_user: security.UserPrincipal = Depends(security.get_current_user_from_token)
 ):
     """
     Apaga um pagamento agendado.
     """
-    db_pagamento = db.query(models.PagamentoAgendado).options(
-        joinedload(models.PagamentoAgendado.grupo)
-    ).filter(models.PagamentoAgendado.id == pagamento_id).first()
+    db_pagamento = db.query(models.PagamentoAgendado).filter(models.PagamentoAgendado.id == pagamento_id).first()
 
     if not db_pagamento:
         raise HTTPException(status_code=404, detail="Pagamento não encontrado")
 
-    if current_user not in db_pagamento.grupo.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido a este pagamento.")
+    security.check_group_membership(db, db_pagamento.grupo_id, current_user.id, detail="Acesso não permitido a este pagamento.")
     
     db.delete(db_pagamento)
+    cache_service.bump_group_version(db, db_pagamento.grupo_id)
     db.commit()
     return
 
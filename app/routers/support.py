@@ -14,7 +14,7 @@ router = APIRouter(
 def create_support_ticket(
     ticket_data: schemas.SuporteChamadoCreate,
     db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(security.get_current_user_from_token)
+    current_user: security.UserPrincipal = Depends(security.get_current_user_from_token)
 ):
     """
     Cria um novo chamado de suporte para o usuário autenticado.
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, status, Header, BackgroundTasks
 from sqlalchemy.orm import Session
 
-from .. import database
-from ..services import achievements_service
+from .. import database, models, schemas
+from ..services import achievements_service, task_run_service
 from ..config import settings # Importa as configurações para a chave secreta
 
 router = APIRouter(
@@ -14,24 +15,55 @@ router = APIRouter(
 # Adicione uma linha no seu ficheiro .env: TASK_SECRET_KEY="uma-chave-muito-secreta"
 TASK_SECRET_KEY = settings.SECRET_KEY # Reutilizando a SECRET_KEY por simplicidade
 
-@router.post("/check-monthly-achievements", summary="Verifica e atribui medalhas de saldo")
+def verify_task_secret(x_task_secret: str = Header(None)):
+    """Dependência que exige o cabeçalho 'x-task-secret' correto."""
+    if not x_task_secret or x_task_secret != TASK_SECRET_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Chave secreta da tarefa inválida ou em falta."
+        )
+
+@router.post(
+    "/check-monthly-achievements",
+    response_model=schemas.TarefaExecucao,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Fecha o mês para as medalhas de saldo",
+    dependencies=[Depends(verify_task_secret)]
+)
 def run_check_monthly_achievements(
-    x_task_secret: str = Header(None), 
+    background_tasks: BackgroundTasks,
     db: Session = Depends(database.get_db)
 ):
     """
-    Endpoint para ser chamado por um Cron Job (tarefa agendada) para verificar
-    e atribuir as medalhas de Bronze e Prata.
-    
+    Fecha o mês anterior: atualiza as sequências de meses positivos e publica os
+    eventos a partir dos quais as medalhas de Bronze e Prata são atribuídas (ver
+    services/achievements_service.py). A mesma execução é feita pelo agendador interno
+    (ver services/scheduler_service.py); este endpoint permite dispará-la de fora, por
+    exemplo com SCHEDULER_ENABLED=false. Nesse caso, sem o consumidor periódico, os
+    eventos são consumidos no fim da própria execução.
+
+    Responde logo com a execução do mês, que corre em segundo plano; o progresso
+    pode ser consultado em /tasks/runs/{run_id}. Há uma única execução por mês:
+    chamar de novo não repete o trabalho já feito, mas retoma uma execução que
+    falhou ou ficou parada a partir do último bloco gravado.
+
     Requer um cabeçalho 'x-task-secret' para segurança.
     """
-    if not x_task_secret or x_task_secret != TASK_SECRET_KEY:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Chave secreta da tarefa inválida ou em falta."
-        )
-        
-    results = achievements_service.check_monthly_balance_achievements(db)
-    
-    return {"status": "success", "details": results}
+    execucao = task_run_service.get_or_create_run(
+        db, achievements_service.TAREFA, achievements_service.previous_period()
+    )
+    if execucao.status != task_run_service.CONCLUIDA:
+        background_tasks.add_task(task_run_service.execute, execucao.id, achievements_service.run_for_task)
+    return execucao
 
+@router.get(
+    "/runs/{run_id}",
+    response_model=schemas.TarefaExecucao,
+    summary="Consulta o estado de uma execução de tarefa",
+    dependencies=[Depends(verify_task_secret)]
+)
+def get_task_run(run_id: uuid.UUID, db: Session = Depends(database.get_db)):
+    execucao = db.query(models.TarefaExecucao).filter(models.TarefaExecucao.id == run_id).first()
+    if not execucao:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Execução não encontrada.")
+    return execucao
@@ -1,13 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form
+from sqlalchemy.orm import Session
+from sqlalchemy import tuple_, select, insert
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from datetime import date
+import uuid
+import io
+import csv
+import json
 import bleach
 import html # INÍCIO DA ALTERAÇÃO: Importa a biblioteca html
 
 from .. import database, schemas, models
-from ..security import get_current_user_from_token
+from ..utils import encode_cursor, decode_cursor, cursor_datetime_key, cursor_datetime_value
+from ..security import UserPrincipal, get_current_user_from_token, require_group_member, check_group_membership, get_group_role
+from ..services import ledger_service, cache_service, statement_import_service, search_service, rollup_service
 
 router = APIRouter(
     prefix="/transactions",
@@ -15,54 +23,150 @@ router = APIRouter(
     dependencies=[Depends(get_current_user_from_token)]
 )
 
-@router.get("/group/{group_id}/full_history", response_model=List[schemas.Movimentacao])
+def _filtros_do_historico(group_id: str, start_date: Optional[date], end_date: Optional[date], transaction_type: Optional[str], q: Optional[str] = None) -> list:
+    """Condições WHERE comuns ao histórico paginado e à exportação."""
+    filtros = [models.Movimentacao.grupo_id == group_id]
+    if q:
+        filtros.append(search_service.search_condition(database.engine.dialect.name, q))
+    if start_date:
+        filtros.append(models.Movimentacao.data_transacao >= start_date)
+    if end_date:
+        filtros.append(models.Movimentacao.data_transacao <= end_date)
+    if transaction_type:
+        filtros.append(models.Movimentacao.tipo == transaction_type)
+    return filtros
+
+@router.get("/group/{group_id}/full_history", response_model=schemas.MovimentacaoPage, dependencies=[Depends(require_group_member())])
 def get_full_transaction_history(
     group_id: str,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     transaction_type: Optional[str] = Query(None, alias="type"),
-    db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(get_current_user_from_token)
+    q: Optional[str] = Query(None, min_length=2, max_length=100),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: Session = Depends(database.get_db)
 ):
-    """Busca o histórico de transações completo para um grupo, com filtros."""
-    group = db.query(models.Grupo).filter(models.Grupo.id == group_id).first()
-    if not group or current_user not in group.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido a este grupo.")
+    """
+    Busca o histórico de transações de um grupo, com filtros, paginado por cursor
+    sobre (data_transacao DESC, id DESC). Envie o 'next_cursor' recebido para obter a
+    página seguinte.
 
-    query = db.query(models.Movimentacao).filter(models.Movimentacao.grupo_id == group_id)
+    Com 'q', só devolve as movimentações cuja descrição corresponde à pesquisa, das mais
+    relevantes para as menos, e o cursor passa a incluir a relevância.
+    """
+    q = q.strip() if q else None
+    # Com pesquisa, a relevância vem antes da data na ordenação e no cursor
+    dialect = db.get_bind().dialect.name
+    rank = search_service.search_rank(dialect, q) if q else None
+    chave = [cursor_datetime_key(models.Movimentacao.data_transacao, dialect).label("chave_data"), models.Movimentacao.id]
+    if rank is not None:
+        chave.insert(0, rank)
 
-    if start_date:
-        query = query.filter(models.Movimentacao.data_transacao >= start_date)
-    if end_date:
-        query = query.filter(models.Movimentacao.data_transacao <= end_date)
-    if transaction_type:
-        query = query.filter(models.Movimentacao.tipo == transaction_type)
+    query = db.query(models.Movimentacao, models.Usuario.nome, *chave[:-1]).join(
+        models.Usuario, models.Movimentacao.responsavel_id == models.Usuario.id
+    ).filter(*_filtros_do_historico(group_id, start_date, end_date, transaction_type, q))
 
-    transactions = query.order_by(models.Movimentacao.data_transacao.desc()).all()
-    
-    return [
-        {
-            "id": tx.id, "tipo": tx.tipo, "descricao": tx.descricao,
-            "valor": tx.valor, "data_transacao": tx.data_transacao,
-            "responsavel_nome": tx.responsavel.nome
-        } for tx in transactions
-    ]
+    if cursor:
+        valores = decode_cursor(cursor, len(chave))
+        try:
+            ultima = [Decimal(v) for v in valores[:-2]] + [cursor_datetime_value(valores[-2], dialect), uuid.UUID(valores[-1])]
+        except (TypeError, ValueError, InvalidOperation):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido.")
+        query = query.filter(tuple_(*chave) < tuple_(*ultima))
 
+    # Uma linha a mais indica se existe página seguinte
+    rows = query.order_by(*[coluna.desc() for coluna in chave]).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        ultima = rows[-1]
+        next_cursor = encode_cursor(*ultima[2:], ultima[0].id)
 
-@router.post("/group/{group_id}", response_model=schemas.Movimentacao, status_code=status.HTTP_201_CREATED)
+    return {
+        "items": [
+            {
+                "id": tx.id, "tipo": tx.tipo, "descricao": tx.descricao,
+                "valor": tx.valor, "data_transacao": tx.data_transacao,
+                "responsavel_nome": nome
+            } for tx, nome, *_ in rows
+        ],
+        "next_cursor": next_cursor
+    }
+
+
+EXPORT_CHUNK_SIZE = 1000 # Linhas lidas do cursor do servidor e enviadas ao cliente de cada vez
+
+def _stream_export(filtros: list, formato: str):
+    """
+    Gera o ficheiro de exportação em blocos de EXPORT_CHUNK_SIZE linhas, lidas com um
+    cursor do lado do servidor: a memória usada não depende do tamanho do histórico.
+    Usa a sua própria sessão, pois corre enquanto a resposta é enviada.
+    """
+    stmt = select(
+        models.Movimentacao.id, models.Movimentacao.data_transacao, models.Movimentacao.tipo,
+        models.Movimentacao.descricao, models.Movimentacao.valor, models.Usuario.nome
+    ).join(
+        models.Usuario, models.Movimentacao.responsavel_id == models.Usuario.id
+    ).where(*filtros).order_by(
+        models.Movimentacao.data_transacao.desc(), models.Movimentacao.id.desc()
+    ).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+
+    db = database.SessionLocal()
+    try:
+        if formato == 'csv':
+            # BOM para o Excel reconhecer o UTF-8, como na exportação feita no navegador
+            yield "\ufeffData,Tipo,Descricao,Valor,Responsavel\r\n"
+        for bloco in db.execute(stmt).partitions():
+            buffer = io.StringIO()
+            if formato == 'csv':
+                writer = csv.writer(buffer)
+                for id, data_transacao, tipo, descricao, valor, nome in bloco:
+                    writer.writerow([
+                        data_transacao.strftime("%d/%m/%Y") if data_transacao else "",
+                        tipo, descricao or "", f"{valor:.2f}".replace(".", ","), nome
+                    ])
+            else:
+                for id, data_transacao, tipo, descricao, valor, nome in bloco:
+                    buffer.write(json.dumps({
+                        "id": str(id),
+                        "data_transacao": data_transacao.isoformat() if data_transacao else None,
+                        "tipo": tipo, "descricao": descricao, "valor": str(valor),
+                        "responsavel_nome": nome
+                    }, ensure_ascii=False))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+@router.get("/group/{group_id}/export", dependencies=[Depends(require_group_member())])
+def export_transaction_history(
+    group_id: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    transaction_type: Optional[str] = Query(None, alias="type"),
+    q: Optional[str] = Query(None, min_length=2, max_length=100),
+    formato: str = Query("csv", alias="format", pattern="^(csv|ndjson)$")
+):
+    """Exporta o histórico de transações do grupo (com os mesmos filtros do histórico) em CSV ou NDJSON, via streaming."""
+    filtros = _filtros_do_historico(group_id, start_date, end_date, transaction_type, q.strip() if q else None)
+    media_type = "text/csv; charset=utf-8" if formato == 'csv' else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_export(filtros, formato),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="transacoes_clarify.{formato}"'}
+    )
+
+@router.post("/group/{group_id}", response_model=schemas.Movimentacao, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_group_member())])
 def create_transaction(
     group_id: str,
     transaction: schemas.TransactionCreate,
-    db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(get_current_user_from_token)
+    db: Session = Depends(database.get_db)
 ):
     """Cria uma nova transação manual para um grupo."""
     group = db.query(models.Grupo).filter(models.Grupo.id == group_id).first()
-    if not group or current_user not in group.member_list:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido a este grupo.")
 
-    responsavel = db.query(models.Usuario).filter(models.Usuario.id == transaction.responsavel_id).first()
-    if not responsavel or responsavel not in group.member_list:
+    if get_group_role(db, group.id, transaction.responsavel_id) is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Responsável inválido.")
 
     transaction_data = transaction.model_dump()
@@ -74,10 +178,12 @@ def create_transaction(
 
     db_transaction = models.Movimentacao(
         **transaction_data,
-        grupo_id=group_id
+        grupo_id=group.id
     )
     
+    ledger_service.record_transaction(db, db_transaction)
     db.add(db_transaction)
+    cache_service.bump_group_version(db, group.id)
     db.commit()
     db.refresh(db_transaction)
     
@@ -87,17 +193,106 @@ def create_transaction(
         "responsavel_nome": db_transaction.responsavel.nome
     }
 
+@router.post("/group/{group_id}/bulk", response_model=List[schemas.Movimentacao], status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_group_member())])
+def create_transactions_bulk(
+    group_id: str,
+    payload: schemas.TransactionBulkCreate,
+    db: Session = Depends(database.get_db)
+):
+    """
+    Cria várias transações de uma vez (ex.: as confirmadas da análise por IA), com um
+    único INSERT de várias linhas e um único commit. Se algum item for inválido, nada é gravado.
+    """
+    group = db.query(models.Grupo).filter(models.Grupo.id == group_id).first()
+
+    # Todos os responsáveis são validados (e os seus nomes obtidos) numa só consulta
+    responsaveis_ids = {tx.responsavel_id for tx in payload.transacoes}
+    nomes = dict(db.query(models.Usuario.id, models.Usuario.nome).join(
+        models.GrupoMembro, models.GrupoMembro.usuario_id == models.Usuario.id
+    ).filter(
+        models.GrupoMembro.grupo_id == group.id,
+        models.Usuario.id.in_(responsaveis_ids)
+    ).all())
+    if len(nomes) != len(responsaveis_ids):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Responsável inválido.")
+
+    linhas = []
+    for tx in payload.transacoes:
+        transaction_data = tx.model_dump()
+        transaction_data['valor'] = Decimal(str(transaction_data['valor']))
+        transaction_data['descricao'] = bleach.clean(html.unescape(transaction_data['descricao'])) if transaction_data['descricao'] else None
+        transaction_data['grupo_id'] = group.id
+        transaction_data['id'] = uuid.uuid4()
+        # O INSERT grava estes dicionários: a data vai em UTC, como no resumo mensal
+        transaction_data['data_transacao'] = rollup_service.as_utc(transaction_data['data_transacao'])
+        linhas.append(transaction_data)
+
+    # O saldo e o resumo mensal são atualizados antes do INSERT, como em create_transaction
+    ledger_service.record_transactions(db, group.id, [models.Movimentacao(**linha) for linha in linhas])
+    criadas = db.execute(
+        insert(models.Movimentacao).returning(
+            models.Movimentacao.id, models.Movimentacao.tipo, models.Movimentacao.descricao,
+            models.Movimentacao.valor, models.Movimentacao.data_transacao, models.Movimentacao.responsavel_id,
+            sort_by_parameter_order=True
+        ),
+        linhas
+    ).all()
+    cache_service.bump_group_version(db, group.id)
+    db.commit()
+
+    return [
+        {
+            "id": row.id, "tipo": row.tipo, "descricao": row.descricao,
+            "valor": row.valor, "data_transacao": row.data_transacao,
+            "responsavel_nome": nomes[row.responsavel_id]
+        } for row in criadas
+    ]
+
+@router.post("/group/{group_id}/import", response_model=schemas.ImportacaoExtrato, dependencies=[Depends(require_group_member())])
+def import_bank_statement(
+    group_id: str,
+    arquivo: UploadFile = File(...),
+    responsavel_id: Optional[uuid.UUID] = Form(None),
+    db: Session = Depends(database.get_db),
+    current_user: UserPrincipal = Depends(get_current_user_from_token)
+):
+    """
+    Importa um extrato bancário (.ofx ou .csv) para o grupo. O ficheiro é lido e gravado
+    em blocos, e as linhas já importadas antes são ignoradas. Sem 'responsavel_id', as
+    movimentações ficam em nome de quem importa.
+    """
+    group = db.query(models.Grupo).filter(models.Grupo.id == group_id).first()
+    responsavel_id = responsavel_id or current_user.id
+    if get_group_role(db, group.id, responsavel_id) is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Responsável inválido.")
+
+    try:
+        formato = statement_import_service.detect_format(arquivo.filename, arquivo.content_type)
+        result = statement_import_service.import_statement(db, arquivo.file, formato, group.id, responsavel_id)
+    except statement_import_service.StatementImportError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if result.importadas:
+        cache_service.bump_group_version(db, group.id)
+    db.commit()
+    return result
+
 @router.put("/{transaction_id}", response_model=schemas.Movimentacao)
 def update_transaction(
     transaction_id: str,
     transaction: schemas.TransactionUpdate,
     db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(get_current_user_from_token)
+    current_user: UserPrincipal = Depends(get_current_user_from_token)
 ):
     """Atualiza uma transação existente."""
-    db_transaction = db.query(models.Movimentacao).options(joinedload(models.Movimentacao.grupo)).filter(models.Movimentacao.id == transaction_id).first()
-    if not db_transaction or current_user not in db_transaction.grupo.member_list:
+    db_transaction = db.query(models.Movimentacao).filter(models.Movimentacao.id == transaction_id).first()
+    if not db_transaction:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido.")
+    check_group_membership(db, db_transaction.grupo_id, current_user.id)
+
+    # Retira os valores antigos do saldo antes de aplicar a edição
+    ledger_service.reverse_transaction(db, db_transaction)
 
     update_data = transaction.model_dump(exclude_unset=True)
     for key, value in update_data.items():
@@ -110,6 +305,8 @@ def update_transaction(
         else:
             setattr(db_transaction, key, value)
 
+    ledger_service.record_transaction(db, db_transaction)
+    cache_service.bump_group_version(db, db_transaction.grupo_id)
     db.commit()
     db.refresh(db_transaction)
     
@@ -123,14 +320,17 @@ def update_transaction(
 def delete_transaction(
     transaction_id: str,
     db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(get_current_user_from_token)
+    current_user: UserPrincipal = Depends(get_current_user_from_token)
 ):
     """Apaga uma transação."""
-    db_transaction = db.query(models.Movimentacao).options(joinedload(models.Movimentacao.grupo)).filter(models.Movimentacao.id == transaction_id).first()
-    if not db_transaction or current_user not in db_transaction.grupo.member_list:
+    db_transaction = db.query(models.Movimentacao).filter(models.Movimentacao.id == transaction_id).first()
+    if not db_transaction:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido.")
+    check_group_membership(db, db_transaction.grupo_id, current_user.id)
     
+    ledger_service.reverse_transaction(db, db_transaction)
     db.delete(db_transaction)
+    cache_service.bump_group_version(db, db_transaction.grupo_id)
     db.commit()
     return
 
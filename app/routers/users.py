@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
 
 from .. import database, schemas, models, security
+from ..services import cache_service
 
 router = APIRouter(
     prefix="/users",
@@ -11,7 +13,7 @@ router = APIRouter(
 @router.get("/me", response_model=schemas.UserSessionData)
 def read_users_me(
     db: Session = Depends(database.get_db), 
-    current_user: models.Usuario = Depends(security.get_current_user_from_token)
+    current_user: models.Usuario = Depends(security.get_current_user_model)
 ):
     """
     Retorna os dados do usuário autenticado, incluindo o plano e o ID
@@ -48,6 +50,7 @@ def read_users_me(
             # Sincroniza o grupo ativo no banco de dados para consistência futura
             current_user.grupo_ativo_id = group_id
             db.commit()
+            security.invalidate_principal(current_user.email)
 
     return {
         "id": current_user.id,
@@ -58,13 +61,13 @@ def read_users_me(
     }
 
 @router.post("/verify-password", response_model=schemas.PasswordVerifyResponse)
-def verify_user_password(
+async def verify_user_password(
     password_data: schemas.PasswordVerify,
-    db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(security.get_current_user_from_token)
+    current_user: models.Usuario = Depends(security.get_current_user_model)
 ):
     """Verifica se a senha fornecida pelo usuário é válida."""
-    if not security.verify_password(password_data.password, current_user.senha):
+    # O bcrypt corre no pool de hashing sem ocupar uma thread do servidor enquanto espera
+    if not await security.verify_password_async(password_data.password, current_user.senha):
         return {"verified": False}
     return {"verified": True}
 
@@ -72,9 +75,10 @@ def verify_user_password(
 def update_user_me(
     user_update: schemas.UserUpdate,
     db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(security.get_current_user_from_token)
+    current_user: models.Usuario = Depends(security.get_current_user_model)
 ):
     """Atualiza o nome e/ou e-mail do usuário autenticado."""
+    email_anterior = current_user.email
     if user_update.email and user_update.email != current_user.email:
         existing_user = db.query(models.Usuario).filter(models.Usuario.email == user_update.email).first()
         if existing_user:
@@ -83,32 +87,43 @@ def update_user_me(
 
     if user_update.nome:
         current_user.nome = user_update.nome
+        # O nome aparece no dashboard de todos os grupos do usuário
+        cache_service.bump_user_groups_versions(db, current_user.id)
     
     db.commit()
+    security.invalidate_principal(email_anterior)
     db.refresh(current_user)
     return current_user
 
 @router.put("/me/password")
-def update_user_password(
+async def update_user_password(
     password_update: schemas.PasswordUpdate,
     db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(security.get_current_user_from_token)
+    current_user: models.Usuario = Depends(security.get_current_user_model)
 ):
-    """Atualiza a senha do usuário autenticado."""
-    if not security.verify_password(password_update.current_password, current_user.senha):
+    """
+    Atualiza a senha do usuário autenticado.
+    O bcrypt corre no pool de hashing e o commit no threadpool, como no login.
+    """
+    if not await security.verify_password_async(password_update.current_password, current_user.senha):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A senha atual está incorreta.")
     
-    hashed_password = security.get_password_hash(password_update.new_password)
-    current_user.senha = hashed_password
-    db.commit()
+    email = current_user.email # Lido antes do commit, que expira o objeto
+    current_user.senha = await security.get_password_hash_async(password_update.new_password)
+    await run_in_threadpool(db.commit)
+    security.invalidate_principal(email)
     return {"message": "Senha atualizada com sucesso."}
 
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
 def delete_user_me(
     db: Session = Depends(database.get_db),
-    current_user: models.Usuario = Depends(security.get_current_user_from_token)
+    current_user: models.Usuario = Depends(security.get_current_user_model)
 ):
     """Apaga a conta do usuário autenticado."""
+    cache_service.bump_user_groups_versions(db, current_user.id)
+    user_id, email = current_user.id, current_user.email
     db.delete(current_user)
     db.commit()
+    security.invalidate_group_membership(user_id=user_id)
+    security.invalidate_principal(email)
     return
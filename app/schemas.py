@@ -130,6 +130,8 @@ class TransactionBase(BaseModel):
     data_transacao: datetime.date
     responsavel_id: uuid.UUID
 class TransactionCreate(TransactionBase): pass
+class TransactionBulkCreate(BaseModel):
+    transacoes: List[TransactionCreate] = Field(..., min_length=1, max_length=100)
 class TransactionUpdate(BaseModel):
     tipo: Optional[str] = None
     descricao: Optional[str] = None
@@ -145,6 +147,15 @@ class Movimentacao(BaseModel):
     responsavel_nome: str
     class Config:
         from_attributes = True
+class MovimentacaoPage(BaseModel):
+    items: List[Movimentacao]
+    next_cursor: Optional[str] = None # Ausente na última página
+class ImportacaoExtrato(BaseModel):
+    importadas: int
+    duplicadas: int # Já importadas antes (mesmo hash de conteúdo)
+    invalidas: int # Linhas ignoradas por data ou valor ilegível
+    class Config:
+        from_attributes = True
 class Conquista(BaseModel):
     id: uuid.UUID
     tipo_medalha: str
@@ -164,17 +175,10 @@ class MembroInfo(BaseModel):
     nome: str
     papel: str
 
-class DashboardData(BaseModel):
-    current_user_id: uuid.UUID
-    nome_utilizador: str
-    nome_grupo: str
-    plano: str
-    membros: List[MembroInfo]
-    movimentacoes_recentes: List[Movimentacao]
-    meta_ativa: Optional[Meta] = None
+class DashboardTotals(BaseModel):
+    """Totais agregados do dashboard, calculados numa única consulta pelo dashboard_service."""
     total_investido: Decimal = Field(default=0.0, max_digits=10, decimal_places=2)
     saldo_total: Decimal = Field(default=0.0, max_digits=10, decimal_places=2)
-    conquistas_recentes: List[Conquista] = []
     ganhos_mes_atual: Decimal = Field(default=0.0, max_digits=10, decimal_places=2)
     gastos_mes_atual: Decimal = Field(default=0.0, max_digits=10, decimal_places=2)
     # --- INÍCIO DA ALTERAÇÃO: Adicionados campos para a lógica do mascote ---
@@ -183,6 +187,16 @@ class DashboardData(BaseModel):
     # --- FIM DA ALTERAÇÃO ---
     ai_usage_count_today: int = 0
     ai_first_usage_timestamp_today: Optional[datetime.datetime] = None
+
+class DashboardData(DashboardTotals):
+    current_user_id: uuid.UUID
+    nome_utilizador: str
+    nome_grupo: str
+    plano: str
+    membros: List[MembroInfo]
+    movimentacoes_recentes: List[Movimentacao]
+    meta_ativa: Optional[Meta] = None
+    conquistas_recentes: List[Conquista] = []
 class InviteLink(BaseModel):
     invite_link: str
 class MemberStats(BaseModel):
@@ -192,7 +206,8 @@ class MemberStats(BaseModel):
     gastos: float
     investimentos: float
 class ChartMonthData(BaseModel):
-    mes: str
+    mes: str # Rótulo do período (ex.: "Out/25" para meses, "06/10" para dias e semanas)
+    inicio: Optional[datetime.date] = None
     ganhos: float
     gastos: float
     investimentos: float
@@ -267,6 +282,10 @@ class AdminUserList(BaseModel):
     plano: str
     class Config:
         from_attributes = True
+class AdminUserPage(BaseModel):
+    items: List[AdminUserList]
+    next_cursor: Optional[str] = None # Ausente na última página
+    total_estimado: int # Aproximado (estatísticas do Postgres ou contagem em cache)
 class AdminUserDetails(AdminUserList):
     movimentacoes: List[Movimentacao]
     class Config:
@@ -305,3 +324,19 @@ class PagamentoAgendado(PagamentoAgendadoBase):
     
     class Config:
         from_attributes = True
+
+# --- Schemas para Tarefas agendadas ---
+class TarefaExecucao(BaseModel):
+    id: uuid.UUID
+    tarefa: str
+    periodo: str
+    status: str
+    ultimo_grupo_id: Optional[uuid.UUID] = None
+    resultado: dict
+    erro: Optional[str] = None
+    criada_em: Optional[datetime.datetime] = None
+    atualizada_em: Optional[datetime.datetime] = None
+    concluida_em: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
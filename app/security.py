@@ -1,15 +1,16 @@
+import uuid
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 from .config import settings
 from . import database, models
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .services.cache_service import TTLCache
+from .services.password_service import password_hasher
 
 # Esquema para clientes
 oauth2_scheme_user = OAuth2PasswordBearer(tokenUrl="/api/token")
@@ -18,12 +19,20 @@ oauth2_scheme_user = OAuth2PasswordBearer(tokenUrl="/api/token")
 oauth2_scheme_collaborator = OAuth2PasswordBearer(tokenUrl="/collaborators/token")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifica se a senha em texto puro corresponde à senha hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verifica se a senha em texto puro corresponde à senha hash (no pool de hashing)."""
+    return password_hasher.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Gera um hash bcrypt para a senha fornecida."""
-    return pwd_context.hash(password)
+    """Gera um hash bcrypt para a senha fornecida (no pool de hashing)."""
+    return password_hasher.hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Versão assíncrona de verify_password, para rotas 'async def'."""
+    return await password_hasher.verify_async(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Versão assíncrona de get_password_hash, para rotas 'async def'."""
+    return await password_hasher.hash_async(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, is_collaborator: bool = False):
     """
@@ -44,9 +53,40 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, i
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_current_user_from_token(token: str = Depends(oauth2_scheme_user), db: Session = Depends(database.get_db)):
+# --- Cache de principais autenticados ---
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """Dados leves do usuário autenticado, guardados em cache entre requisições."""
+    id: uuid.UUID
+    nome: str
+    email: str
+    grupo_ativo_id: Optional[uuid.UUID]
+
+@dataclass(frozen=True)
+class CollaboratorPrincipal:
+    """Dados leves do colaborador autenticado, guardados em cache entre requisições."""
+    id: uuid.UUID
+    nome: str
+    email: str
+    cargo: str
+
+# Chaveado por (escopo, sub, exp) do token já validado: cada token tem a sua entrada,
+# que nunca vive mais do que o TTL nem do que o próprio token.
+_principal_cache = TTLCache(settings.PRINCIPAL_CACHE_MAX_ENTRIES, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+def invalidate_principal(sub, scope: str = "usuario"):
+    """
+    Remove do cache os principais de um 'sub' (e-mail do usuário ou ID do colaborador).
+    Chamar depois do commit de qualquer alteração de perfil, senha, grupo ativo ou exclusão.
+    """
+    _principal_cache.discard_where(lambda key: key[0] == scope and key[1] == str(sub))
+
+def get_current_user_from_token(token: str = Depends(oauth2_scheme_user), db: Session = Depends(database.get_db)) -> UserPrincipal:
     """
     Dependência para obter o usuário (cliente) autenticado a partir do token JWT.
+    Retorna um UserPrincipal; rotas que alteram o próprio usuário devem usar
+    get_current_user_model.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -62,13 +102,36 @@ def get_current_user_from_token(token: str = Depends(oauth2_scheme_user), db: Se
         # Captura erros de JWT (token expirado, inválido, etc.)
         raise credentials_exception
     
-    user = db.query(models.Usuario).filter(models.Usuario.email == email).first()
+    cache_key = ("usuario", email, payload.get("exp"))
+    principal = _principal_cache.get(cache_key)
+    if principal is not None:
+        return principal
+
+    user = db.query(
+        models.Usuario.id, models.Usuario.nome, models.Usuario.email, models.Usuario.grupo_ativo_id
+    ).filter(models.Usuario.email == email).first()
     if user is None:
         raise credentials_exception
+    principal = UserPrincipal(id=user.id, nome=user.nome, email=user.email, grupo_ativo_id=user.grupo_ativo_id)
+    _principal_cache.set(cache_key, principal)
+    return principal
+
+def get_current_user_model(
+    principal: UserPrincipal = Depends(get_current_user_from_token),
+    db: Session = Depends(database.get_db)
+) -> models.Usuario:
+    """Dependência que carrega o modelo ORM do usuário autenticado (para rotas que o alteram)."""
+    user = db.get(models.Usuario, principal.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Não foi possível validar as credenciais",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 # NOVO: Função para obter o colaborador atual logado
-def get_current_collaborator(token: str = Depends(oauth2_scheme_collaborator), db: Session = Depends(database.get_db)):
+def get_current_collaborator(token: str = Depends(oauth2_scheme_collaborator), db: Session = Depends(database.get_db)) -> CollaboratorPrincipal:
     """
     Dependência para obter o colaborador autenticado a partir do token JWT.
     """
@@ -88,8 +151,74 @@ def get_current_collaborator(token: str = Depends(oauth2_scheme_collaborator), d
         # Captura erros de JWT (token expirado, inválido, etc.)
         raise credentials_exception
     
-    collaborator = db.query(models.Colaborador).filter(models.Colaborador.id == collaborator_id).first()
+    cache_key = ("colaborador", collaborator_id, payload.get("exp"))
+    principal = _principal_cache.get(cache_key)
+    if principal is not None:
+        return principal
+
+    collaborator = db.query(
+        models.Colaborador.id, models.Colaborador.nome, models.Colaborador.email, models.Colaborador.cargo
+    ).filter(models.Colaborador.id == collaborator_id).first()
     if collaborator is None:
         raise credentials_exception
-    return collaborator
+    principal = CollaboratorPrincipal(id=collaborator.id, nome=collaborator.nome, email=collaborator.email, cargo=collaborator.cargo)
+    _principal_cache.set(cache_key, principal)
+    return principal
+
+
+# --- Autorização por grupo ---
+
+# Papel do usuário em cada grupo, chaveado por (grupo_id, usuario_id). Só guarda
+# associações existentes: um convite aceite nunca fica bloqueado por um "não membro"
+# em cache, e as remoções limpam a entrada (nos outros workers expira pelo TTL).
+_membership_cache = TTLCache(settings.MEMBERSHIP_CACHE_MAX_ENTRIES, settings.MEMBERSHIP_CACHE_TTL_SECONDS)
+
+def get_group_role(db: Session, group_id, user_id) -> Optional[str]:
+    """Retorna o papel ('dono' ou 'membro') do usuário no grupo, ou None se não for membro."""
+    key = (str(group_id), str(user_id))
+    papel = _membership_cache.get(key)
+    if papel is None:
+        # Consulta pela chave primária de 'grupo_membros', sem carregar o grupo nem os membros
+        papel = db.query(models.GrupoMembro.papel).filter(
+            models.GrupoMembro.grupo_id == group_id,
+            models.GrupoMembro.usuario_id == user_id
+        ).scalar()
+        if papel is not None:
+            _membership_cache.set(key, papel)
+    return papel
+
+def check_group_membership(db: Session, group_id, user_id, role: Optional[str] = None, detail: str = "Acesso não permitido.") -> str:
+    """
+    Garante que o usuário pertence ao grupo (e tem o papel 'role', se indicado).
+    Levanta 403 caso contrário; retorna o papel do usuário.
+    """
+    papel = get_group_role(db, group_id, user_id)
+    if papel is None or (role is not None and papel != role):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+    return papel
+
+def invalidate_group_membership(group_id=None, user_id=None):
+    """Remove do cache as associações de um grupo, de um usuário ou de um par grupo/usuário."""
+    if group_id is not None and user_id is not None:
+        _membership_cache.pop((str(group_id), str(user_id)))
+    elif group_id is not None:
+        _membership_cache.discard_where(lambda key: key[0] == str(group_id))
+    elif user_id is not None:
+        _membership_cache.discard_where(lambda key: key[1] == str(user_id))
+
+def require_group_member(role: Optional[str] = None, detail: str = "Acesso não permitido a este grupo."):
+    """
+    Fábrica de dependências para rotas com 'group_id' no caminho: garante que o
+    usuário autenticado é membro do grupo (ou tem o papel 'role') e retorna o papel.
+    """
+    def dependency(
+        group_id: str,
+        db: Session = Depends(database.get_db),
+        current_user: UserPrincipal = Depends(get_current_user_from_token)
+    ) -> str:
+        return check_group_membership(db, group_id, current_user.id, role, detail)
+    return dependency
 
+def auth_cache_stats() -> dict:
+    """Estatísticas dos caches de principais e de associações a grupos."""
+    return {"principal_cache": _principal_cache.stats(), "membership_cache": _membership_cache.stats()}
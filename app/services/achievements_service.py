@@ -1,88 +1,288 @@
+import logging
+from collections import defaultdict, namedtuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy import func, select, insert, update, delete, case
 from decimal import Decimal
 from datetime import datetime, timezone
+from typing import Optional
 from dateutil.relativedelta import relativedelta
 
-from .. import models
+from .. import models, database
+from ..config import settings
+from . import cache_service, task_run_service, event_service
 
-def check_monthly_balance_achievements(db: Session):
+logger = logging.getLogger(__name__)
+
+# Nome da tarefa de fecho do mês em 'tarefa_execucoes'
+TAREFA = 'conquistas_mensais'
+# Meses seguidos com saldo positivo necessários para a medalha de Prata
+MESES_PARA_PRATA = 3
+# Período em que não se atribui de novo uma medalha do mesmo tipo
+COOLDOWN = relativedelta(months=3)
+# Medalhas por valor da meta concluída (grupos premium), da maior para a menor
+MEDALHAS_POR_VALOR = [
+    (models.TipoMedalhaEnum.diamante, Decimal('1000000.00'), "Atingiu a incrível marca de R$ 1.000.000 em uma meta!"),
+    (models.TipoMedalhaEnum.platina, Decimal('100000.00'), "Parabéns por atingir uma meta de mais de R$ 100.000!"),
+    (models.TipoMedalhaEnum.ouro, Decimal('10000.00'), "Vocês atingiram uma meta de mais de R$ 10.000! Excelente!"),
+]
+
+# --- Regras ---
+# Cada regra recebe um evento e o contexto do seu grupo ({"premium": bool}) e retorna a
+# medalha merecida, ou None. A medalha só é atribuída se o grupo não tiver recebido uma
+# do mesmo tipo no período de espera.
+
+Medalha = namedtuple('Medalha', ['tipo', 'descricao', 'reinicia_sequencia'], defaults=[False])
+
+REGRAS = defaultdict(list)
+
+def regra(tipo_evento: str):
+    """Regista a função decorada como regra para os eventos do tipo indicado."""
+    def registar(funcao):
+        REGRAS[tipo_evento].append(funcao)
+        return funcao
+    return registar
+
+@regra(event_service.MES_POSITIVO)
+def _bronze_mes_positivo(evento: models.EventoDominio, contexto: dict) -> Optional[Medalha]:
+    mes = datetime.strptime(evento.dados["periodo"], '%Y-%m')
+    return Medalha(models.TipoMedalhaEnum.bronze, f"Parabéns! Vocês terminaram {mes.strftime('%B de %Y')} com saldo positivo.")
+
+@regra(event_service.MES_POSITIVO)
+def _prata_meses_seguidos(evento: models.EventoDominio, contexto: dict) -> Optional[Medalha]:
+    if evento.dados["meses_positivos"] < MESES_PARA_PRATA:
+        return None
+    # A sequência recomeça depois da Prata
+    return Medalha(
+        models.TipoMedalhaEnum.prata, f"Incrível! {MESES_PARA_PRATA} meses seguidos terminando com saldo positivo.",
+        reinicia_sequencia=True
+    )
+
+@regra(event_service.META_FINANCIADA)
+def _meta_concluida(evento: models.EventoDominio, contexto: dict) -> Optional[Medalha]:
+    if not evento.dados["concluida"] or not contexto["premium"]:
+        return None
+    valor_meta = Decimal(evento.dados["valor_meta"])
+    for tipo, valor_minimo, descricao in MEDALHAS_POR_VALOR:
+        if valor_meta >= valor_minimo:
+            return Medalha(tipo, descricao)
+    return None
+
+# --- Consumo dos eventos ---
+
+def _em_cooldown(db: Session, grupo_ids: list, desde: datetime) -> set:
+    """Pares (grupo_id, tipo_medalha) com uma medalha recebida depois de 'desde'."""
+    conquista = models.Conquista
+    return set(db.execute(
+        select(conquista.grupo_id, conquista.tipo_medalha).distinct().where(
+            conquista.grupo_id.in_(grupo_ids), conquista.data_conquista > desde
+        )
+    ).all())
+
+def _grupos_premium(db: Session, grupo_ids: list, now: datetime) -> set:
+    return set(db.execute(
+        select(models.Assinatura.grupo_id).where(
+            models.Assinatura.grupo_id.in_(grupo_ids), models.Assinatura.data_fim > now
+        )
+    ).scalars())
+
+def process_events(db: Session, batch_size: Optional[int] = None, now: Optional[datetime] = None) -> int:
     """
-    Verifica e atribui medalhas de Bronze e Prata para todos os grupos.
-    Esta função deve ser executada uma vez por mês (ex: no dia 1).
+    Avalia as regras sobre os eventos em fila, por ordem, em lotes de 'batch_size'.
+    Cada lote lê os eventos (FOR UPDATE SKIP LOCKED, para poder correr em paralelo),
+    o contexto e os períodos de espera dos seus grupos numa consulta cada, grava as
+    medalhas em lote, apaga os eventos e faz commit. Retorna o número de eventos.
     """
-    
-    # Pega o ano e o mês anterior para análise
-    today = datetime.now(timezone.utc)
-    first_day_of_current_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    last_day_of_previous_month = first_day_of_current_month - relativedelta(days=1)
-    previous_month = last_day_of_previous_month.month
-    previous_month_year = last_day_of_previous_month.year
-
-    all_groups = db.query(models.Grupo).all()
-    results = {"checked": 0, "awarded_bronze": 0, "awarded_silver": 0}
-
-    for group in all_groups:
-        results["checked"] += 1
-        
-        # Calcula o saldo total do grupo até o final do mês anterior
-        total_ganhos = db.query(func.sum(models.Movimentacao.valor)).filter(
-            models.Movimentacao.grupo_id == group.id,
-            models.Movimentacao.tipo == 'ganho',
-            models.Movimentacao.data_transacao <= last_day_of_previous_month
-        ).scalar() or Decimal('0.0')
-
-        total_gastos = db.query(func.sum(models.Movimentacao.valor)).filter(
-            models.Movimentacao.grupo_id == group.id,
-            models.Movimentacao.tipo == 'gasto',
-            models.Movimentacao.data_transacao <= last_day_of_previous_month
-        ).scalar() or Decimal('0.0')
-
-        saldo_final_mes = total_ganhos - total_gastos
-
-        if saldo_final_mes > 0:
-            # Mês positivo, incrementa a contagem
-            group.meses_positivos_consecutivos += 1
-            
-            # --- Lógica da Medalha de Bronze ---
-            data_limite_cooldown = today - relativedelta(months=3)
-            ultima_conquista_bronze = db.query(models.Conquista).filter(
-                models.Conquista.grupo_id == group.id,
-                models.Conquista.tipo_medalha == models.TipoMedalhaEnum.bronze,
-                models.Conquista.data_conquista > data_limite_cooldown
-            ).first()
-
-            if not ultima_conquista_bronze:
-                nova_conquista = models.Conquista(
-                    grupo_id=group.id,
-                    tipo_medalha=models.TipoMedalhaEnum.bronze,
-                    descricao=f"Parabéns! Vocês terminaram {last_day_of_previous_month.strftime('%B de %Y')} com saldo positivo."
-                )
-                db.add(nova_conquista)
-                results["awarded_bronze"] += 1
-
-            # --- Lógica da Medalha de Prata ---
-            if group.meses_positivos_consecutivos >= 3:
-                ultima_conquista_prata = db.query(models.Conquista).filter(
-                    models.Conquista.grupo_id == group.id,
-                    models.Conquista.tipo_medalha == models.TipoMedalhaEnum.prata,
-                    models.Conquista.data_conquista > data_limite_cooldown
-                ).first()
-
-                if not ultima_conquista_prata:
-                    nova_conquista = models.Conquista(
-                        grupo_id=group.id,
-                        tipo_medalha=models.TipoMedalhaEnum.prata,
-                        descricao="Incrível! 3 meses seguidos terminando com saldo positivo."
-                    )
-                    db.add(nova_conquista)
-                    results["awarded_silver"] += 1
-                    # Opcional: resetar a contagem para o desafio começar de novo
-                    group.meses_positivos_consecutivos = 0
-
-        else:
-            # Mês negativo, quebra a sequência
-            group.meses_positivos_consecutivos = 0
-
-    db.commit()
+    batch_size = batch_size or settings.ACHIEVEMENT_EVENTS_BATCH_SIZE
+    total = 0
+
+    while True:
+        momento = now or datetime.now(timezone.utc)
+        eventos = db.execute(
+            select(models.EventoDominio).order_by(models.EventoDominio.id)
+            .limit(batch_size).with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not eventos:
+            break
+
+        grupo_ids = list({evento.grupo_id for evento in eventos})
+        premium = _grupos_premium(db, grupo_ids, momento)
+        em_cooldown = _em_cooldown(db, grupo_ids, momento - COOLDOWN)
+        medalhas, descontar = [], {}
+
+        for evento in eventos:
+            contexto = {"premium": evento.grupo_id in premium}
+            for avaliar in REGRAS.get(evento.tipo, []):
+                medalha = avaliar(evento, contexto)
+                if medalha is None or (evento.grupo_id, medalha.tipo) in em_cooldown:
+                    continue
+                medalhas.append({"grupo_id": evento.grupo_id, "tipo_medalha": medalha.tipo, "descricao": medalha.descricao})
+                em_cooldown.add((evento.grupo_id, medalha.tipo))
+                if medalha.reinicia_sequencia:
+                    descontar[evento.grupo_id] = evento.dados["meses_positivos"]
+
+        if medalhas:
+            db.execute(insert(models.Conquista), medalhas)
+        # Desconta da sequência os meses do evento em vez de a pôr a 0: um fecho de mês
+        # feito entretanto (fila atrasada, nova execução) mantém o seu incremento
+        for meses in set(descontar.values()):
+            sequencia = models.Grupo.meses_positivos_consecutivos
+            db.execute(
+                update(models.Grupo)
+                .where(models.Grupo.id.in_([grupo_id for grupo_id, n in descontar.items() if n == meses]))
+                .values(meses_positivos_consecutivos=case((sequencia > meses, sequencia - meses), else_=0)),
+                execution_options={"synchronize_session": False}
+            )
+        db.execute(delete(models.EventoDominio).where(models.EventoDominio.id.in_([evento.id for evento in eventos])))
+
+        # As novas medalhas aparecem no dashboard e na página de conquistas
+        cache_service.bump_group_versions(db, {medalha["grupo_id"] for medalha in medalhas})
+        db.commit()
+        total += len(eventos)
+        if medalhas:
+            logger.info(f"ACHIEVEMENTS: {len(medalhas)} medalha(s) atribuída(s) a partir de {len(eventos)} evento(s).")
+
+    return total
+
+def drain_events():
+    """
+    Consome a fila numa sessão própria (ex.: como BackgroundTask). Com o agendador
+    desligado (SCHEDULER_ENABLED=false) não há consumidor periódico, e as escritas que
+    publicam eventos chamam esta função para as medalhas não ficarem por atribuir.
+    """
+    with database.SessionLocal() as db:
+        process_events(db)
+
+# --- Fecho do mês ---
+
+def _variacao(*condicoes):
+    """Soma de ganhos menos gastos das movimentações que satisfazem as condições."""
+    mov = models.Movimentacao
+    return (
+        func.coalesce(func.sum(mov.valor).filter(mov.tipo == 'ganho', *condicoes), 0)
+        - func.coalesce(func.sum(mov.valor).filter(mov.tipo == 'gasto', *condicoes), 0)
+    )
+
+def _saldos_no_fim_do_mes_stmt(grupo_ids: list, corte: datetime):
+    """
+    SELECT (id, meses_positivos_consecutivos, saldo no fim do mês) dos grupos indicados,
+    numa única consulta agrupada. 'corte' é o início do mês seguinte (exclusivo), para
+    que todo o último dia do mês entre no saldo.
+
+    Parte do saldo materializado ('grupo_saldos') e desconta as movimentações a partir
+    do corte. Grupos ainda sem essa linha somam o histórico anterior ao corte.
+    """
+    mov, saldo = models.Movimentacao, models.SaldoGrupo
+    sem_saldo = ~select(saldo.grupo_id).where(saldo.grupo_id == mov.grupo_id).exists()
+
+    depois = select(mov.grupo_id, _variacao().label("variacao")).where(
+        mov.grupo_id.in_(grupo_ids), mov.data_transacao >= corte
+    ).group_by(mov.grupo_id).subquery()
+    historico = select(mov.grupo_id, _variacao().label("saldo")).where(
+        mov.grupo_id.in_(grupo_ids), mov.data_transacao < corte, sem_saldo
+    ).group_by(mov.grupo_id).subquery()
+
+    saldo_fim_do_mes = (
+        func.coalesce(saldo.total_ganhos - saldo.total_gastos - func.coalesce(depois.c.variacao, 0), historico.c.saldo, 0)
+    )
+    return (
+        select(models.Grupo.id, models.Grupo.meses_positivos_consecutivos, saldo_fim_do_mes.label("saldo"))
+        .outerjoin(saldo, saldo.grupo_id == models.Grupo.id)
+        .outerjoin(depois, depois.c.grupo_id == models.Grupo.id)
+        .outerjoin(historico, historico.c.grupo_id == models.Grupo.id)
+        .where(models.Grupo.id.in_(grupo_ids))
+    )
+
+def close_month(
+    db: Session,
+    periodo: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    execucao: Optional[models.TarefaExecucao] = None
+):
+    """
+    Fecha o mês 'periodo' ('AAAA-MM', por omissão o anterior) para todos os grupos:
+    atualiza a sequência de meses positivos e publica um evento 'mes_positivo' para
+    cada grupo que terminou o mês com saldo positivo. As medalhas de Bronze e Prata são
+    atribuídas depois, pelas regras, ao consumir esses eventos (ver process_events).
+
+    Os grupos são processados em blocos de 'chunk_size' (por ordem de id), cada um com
+    uma consulta de saldos, UPDATE/INSERT em lote e o seu próprio commit. Com
+    'execucao', começa depois do seu último grupo processado e grava o progresso no
+    commit de cada bloco (ver services/task_run_service.py).
+    """
+    periodo = periodo or previous_period()
+    chunk_size = chunk_size or settings.ACHIEVEMENTS_CHUNK_SIZE
+
+    ano, mes = map(int, periodo.split('-'))
+    first_day_of_next_month = datetime(ano, mes, 1, tzinfo=timezone.utc) + relativedelta(months=1)
+
+    results = {"checked": 0, "positive_months": 0}
+    ultimo_id = None
+    if execucao is not None:
+        results.update(execucao.resultado or {})
+        ultimo_id = execucao.ultimo_grupo_id
+
+    while True:
+        bloco = select(models.Grupo.id).order_by(models.Grupo.id).limit(chunk_size)
+        if ultimo_id is not None:
+            bloco = bloco.where(models.Grupo.id > ultimo_id)
+        grupo_ids = db.execute(bloco).scalars().all()
+        if not grupo_ids:
+            break
+        ultimo_id = grupo_ids[-1]
+
+        positivos, zerar = [], []
+        for grupo_id, meses, saldo in db.execute(_saldos_no_fim_do_mes_stmt(grupo_ids, first_day_of_next_month)):
+            if saldo > 0:
+                positivos.append((grupo_id, {"periodo": periodo, "meses_positivos": meses + 1}))
+            elif meses:
+                # Mês negativo, quebra a sequência
+                zerar.append(grupo_id)
+
+        if positivos:
+            db.execute(
+                update(models.Grupo).where(models.Grupo.id.in_([grupo_id for grupo_id, _ in positivos]))
+                .values(meses_positivos_consecutivos=models.Grupo.meses_positivos_consecutivos + 1),
+                execution_options={"synchronize_session": False}
+            )
+            event_service.publish_many(db, event_service.MES_POSITIVO, positivos)
+        if zerar:
+            db.execute(
+                update(models.Grupo).where(models.Grupo.id.in_(zerar)).values(meses_positivos_consecutivos=0),
+                execution_options={"synchronize_session": False}
+            )
+
+        results["checked"] += len(grupo_ids)
+        results["positive_months"] += len(positivos)
+        if execucao is not None:
+            task_run_service.checkpoint(execucao, ultimo_id, results)
+        db.commit()
+
     return results
+
+def previous_period(now: Optional[datetime] = None) -> str:
+    """Mês fechado por uma execução feita em 'now' (o anterior), no formato 'AAAA-MM'."""
+    now = now or datetime.now(timezone.utc)
+    return (now.replace(day=1) - relativedelta(days=1)).strftime('%Y-%m')
+
+def run_for_task(db: Session, execucao: models.TarefaExecucao) -> dict:
+    """
+    Fecha o mês da execução, retomando-a a partir do seu checkpoint. Sem o agendador,
+    consome logo os eventos publicados (ver drain_events).
+    """
+    resultado = close_month(db, execucao.periodo, execucao=execucao)
+    if not settings.SCHEDULER_ENABLED:
+        process_events(db)
+    return resultado
+
+def run_scheduled(db: Session):
+    """
+    Tarefa do agendador interno: cria (ou retoma) a execução do mês anterior e corre-a,
+    se ainda não estiver concluída. Uma falha é relançada para ficar nas métricas.
+    """
+    execucao = task_run_service.get_or_create_run(db, TAREFA, previous_period())
+    if execucao.status == task_run_service.CONCLUIDA:
+        return
+    task_run_service.execute(execucao.id, run_for_task)
+    db.refresh(execucao)
+    if execucao.status == task_run_service.FALHOU:
+        raise RuntimeError(execucao.erro)
@@ -0,0 +1,85 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, delete, func, case
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+from sqlalchemy.engine import Row
+
+from .. import models
+from ..config import settings
+from .rollup_service import _dialect_insert, period_start_expr
+
+# Duração da janela do limite de uso da IA, contada a partir do primeiro uso
+QUOTA_WINDOW = timedelta(days=1)
+
+def try_consume(db: Session, grupo_id, limite: int, now: Optional[datetime] = None) -> Optional[Row]:
+    """
+    Reserva um uso da IA para o grupo, se ainda houver quota na janela atual.
+
+    Verificação e incremento são um único UPSERT atómico na linha do grupo: cria-a no
+    primeiro uso, reinicia a janela se já passaram 24h e só incrementa se o contador
+    estiver abaixo de 'limite'. Retorna (usos, janela_inicio) após o incremento, ou
+    None se a quota estiver esgotada. Não faz commit.
+    """
+    now = now or datetime.now(timezone.utc)
+    expirada = models.AIQuota.janela_inicio <= now - QUOTA_WINDOW
+
+    insert = _dialect_insert(db)
+    stmt = insert(models.AIQuota).values(grupo_id=grupo_id, janela_inicio=now, usos=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.AIQuota.grupo_id],
+        set_={
+            "janela_inicio": case((expirada, now), else_=models.AIQuota.janela_inicio),
+            "usos": case((expirada, 1), else_=models.AIQuota.usos + 1),
+        },
+        where=expirada | (models.AIQuota.usos < limite)
+    ).returning(models.AIQuota.usos, models.AIQuota.janela_inicio)
+    return db.execute(stmt).first()
+
+def refund(db: Session, grupo_id):
+    """Devolve um uso reservado por try_consume (ex.: a chamada à IA falhou). Não faz commit."""
+    db.execute(
+        update(models.AIQuota).where(models.AIQuota.grupo_id == grupo_id, models.AIQuota.usos > 0)
+        .values(usos=models.AIQuota.usos - 1),
+        execution_options={"synchronize_session": False}
+    )
+
+def usage_in_window(grupo_id, now: Optional[datetime] = None):
+    """
+    Subconsultas escalares (usos, início da janela) da janela atual do grupo, lidas da
+    sua linha em 'ai_quotas' pela chave primária. Numa janela já expirada: (0, NULL).
+    """
+    now = now or datetime.now(timezone.utc)
+    ativa = models.AIQuota.janela_inicio > now - QUOTA_WINDOW
+    linha = models.AIQuota.grupo_id == grupo_id
+    usos = func.coalesce(select(case((ativa, models.AIQuota.usos), else_=0)).where(linha).scalar_subquery(), 0)
+    inicio = select(case((ativa, models.AIQuota.janela_inicio), else_=None)).where(linha).scalar_subquery()
+    return usos, inicio
+
+def compact_usage_log(db: Session, retention_days: int, now: Optional[datetime] = None) -> int:
+    """
+    Soma em 'ai_usage_diario' as linhas de 'ai_usage' anteriores ao período de retenção
+    (a partir do início do dia) e apaga-as. Pode ser repetida sem duplicar contagens,
+    pois as linhas somadas são apagadas na mesma transação. Retorna o número de linhas
+    compactadas. Não faz commit.
+    """
+    now = now or datetime.now(timezone.utc)
+    corte = datetime.combine((now - timedelta(days=retention_days)).date(), datetime.min.time(), tzinfo=timezone.utc)
+    antigas = models.AIUsage.timestamp < corte
+
+    dia = period_start_expr(db, models.AIUsage.timestamp, 'day')
+    por_dia = select(
+        models.AIUsage.grupo_id, dia.label("dia"), func.count(models.AIUsage.id).label("usos")
+    ).where(antigas).group_by(models.AIUsage.grupo_id, dia)
+
+    insert = _dialect_insert(db)
+    stmt = insert(models.AIUsageDiario).from_select(["grupo_id", "dia", "usos"], por_dia)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.AIUsageDiario.grupo_id, models.AIUsageDiario.dia],
+        set_={"usos": models.AIUsageDiario.usos + stmt.excluded.usos}
+    )
+    db.execute(stmt)
+    return db.execute(delete(models.AIUsage).where(antigas)).rowcount
+
+def compact_usage_log_job(db: Session) -> int:
+    """Tarefa do agendador interno: compacta com o período de retenção configurado."""
+    return compact_usage_log(db, settings.AI_USAGE_RETENTION_DAYS)
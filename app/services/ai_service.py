@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import re
+import unicodedata
+from typing import Any, Awaitable, Callable, Optional
+
+from .. import schemas
+from ..config import settings
+from .cache_service import ResponseCache
+from .transaction_parser_service import parse_br_number
+
+# Respostas já analisadas pelo Gemini, por texto normalizado (JSON de ParsedTransactionResponse)
+parse_cache = ResponseCache(settings.AI_PARSE_CACHE_MAX_BYTES, ttl=settings.AI_PARSE_CACHE_TTL_SECONDS)
+
+_NUMERO = re.compile(r"\d+(?:[.,]\d+)*")
+_MOEDA = re.compile(r"r\$|\b(?:reais|real)\b")
+# Símbolos mantidos na forma canónica, separados dos números ('30%' fica '30 %')
+_SIMBOLOS = re.compile(r"([%$/+-])")
+_OUTRAS_MOEDAS = {"€": "eur", "£": "gbp", "¥": "jpy"}
+
+def _normalizar_numero(match: re.Match) -> str:
+    """'1.234,50', '1,234.50' e '1234.5' viram '1234.5'; '30,00' vira '30'."""
+    valor = parse_br_number(match.group(0))
+    return match.group(0) if valor is None else format(valor.normalize(), "f")
+
+def normalize_text(texto: str) -> str:
+    """
+    Forma canónica do texto enviado à IA: minúsculas, sem acentos, espaços colapsados,
+    números num só formato e sem a moeda ('R$ 30' e '30 reais' ficam '30'). Textos com
+    a mesma forma canónica recebem a mesma análise.
+
+    Os símbolos que mudam o sentido do valor ('%', sinais, '/', '$' e outras moedas) são
+    mantidos: 'gastei 30% do salario' não partilha a análise de 'gastei 30 do salario'.
+    """
+    texto = _MOEDA.sub(" ", texto.lower())
+    # Antes do NFKD, que apagaria os símbolos fora do ASCII
+    for simbolo, codigo in _OUTRAS_MOEDAS.items():
+        texto = texto.replace(simbolo, f" {codigo} ")
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+    texto = _NUMERO.sub(_normalizar_numero, texto)
+    texto = _SIMBOLOS.sub(r" \1 ", texto)
+    texto = re.sub(r"[^\w\s.%$/+-]", " ", texto)
+    return " ".join(texto.split()).strip(" .")
+
+def _chave(texto_normalizado: str) -> str:
+    return hashlib.sha256(texto_normalizado.encode()).hexdigest()
+
+def get_cached_parse(texto: str) -> Optional[bytes]:
+    """JSON da análise já feita para um texto equivalente, ou None."""
+    return parse_cache.get(_chave(normalize_text(texto)))
+
+def cache_parse(texto: str, resultado: schemas.ParsedTransactionResponse) -> bytes:
+    """Guarda a análise do texto e retorna o JSON guardado."""
+    corpo = resultado.model_dump_json().encode()
+    parse_cache.set(_chave(normalize_text(texto)), corpo)
+    return corpo
+
+# --- Agrupamento de pedidos concorrentes (micro-batching) ---
+
+class MicroBatcher:
+    """
+    Junta os itens submetidos dentro de uma janela curta ('janela' segundos, ou até
+    'max_size' itens) e processa-os numa única chamada a 'processar', que recebe a lista
+    de itens e devolve uma lista de resultados na mesma ordem. Um resultado que seja uma
+    exceção é levantado apenas para o chamador desse item.
+    """
+    def __init__(self, processar: Callable[[list], Awaitable[list]], max_size: int, janela: float):
+        self.processar = processar
+        self.max_size = max_size
+        self.janela = janela
+        self._pendentes: list = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tarefas: set = set() # Referências às tarefas em curso, para não serem recolhidas
+        self.lotes = 0
+        self.itens = 0
+        self.fallbacks = 0 # Itens que 'processar' teve de tratar à parte (contados por ele)
+
+    async def submit(self, item) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pendentes.append((item, future))
+        if len(self._pendentes) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.janela, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        lote, self._pendentes = self._pendentes, []
+        if not lote:
+            return
+        self.lotes += 1
+        self.itens += len(lote)
+        tarefa = asyncio.get_running_loop().create_task(self._executar(lote))
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _executar(self, lote: list):
+        try:
+            try:
+                resultados = await self.processar([item for item, _ in lote])
+                if len(resultados) != len(lote):
+                    raise ValueError("O processamento do lote devolveu um número de resultados diferente do de itens.")
+            except Exception as e:
+                resultados = [e] * len(lote)
+            for (_, future), resultado in zip(lote, resultados):
+                if future.done(): # O chamador desistiu (ex.: o cliente desligou)
+                    continue
+                if isinstance(resultado, Exception):
+                    future.set_exception(resultado)
+                else:
+                    future.set_result(resultado)
+        finally:
+            # Se o lote foi cancelado (ex.: no encerramento), ninguém fica à espera para sempre
+            for _, future in lote:
+                if not future.done():
+                    future.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "max_size": self.max_size,
+            "window_seconds": self.janela,
+            "pending": len(self._pendentes),
+            "batches": self.lotes,
+            "items": self.itens,
+            "avg_batch_size": round(self.itens / self.lotes, 2) if self.lotes else None,
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,214 @@
+import hashlib
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Callable, Iterable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import update, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+
+# --- Versão dos grupos ---
+
+def bump_group_version(db: Session, grupo_id):
+    """
+    Incrementa a versão do grupo na mesma transação da escrita.
+    Deve ser chamada por toda rota que altera dados lidos pelo dashboard.
+    """
+    db.execute(
+        update(models.Grupo).where(models.Grupo.id == grupo_id).values(versao=models.Grupo.versao + 1),
+        execution_options={"synchronize_session": False}
+    )
+
+def bump_group_versions(db: Session, grupo_ids: Iterable):
+    """Incrementa a versão de vários grupos num único UPDATE."""
+    grupo_ids = list(grupo_ids)
+    if not grupo_ids:
+        return
+    db.execute(
+        update(models.Grupo).where(models.Grupo.id.in_(grupo_ids)).values(versao=models.Grupo.versao + 1),
+        execution_options={"synchronize_session": False}
+    )
+
+def bump_user_groups_versions(db: Session, usuario_id):
+    """Incrementa a versão de todos os grupos de um usuário (ex.: mudança de nome)."""
+    grupos_do_usuario = select(models.GrupoMembro.grupo_id).where(models.GrupoMembro.usuario_id == usuario_id)
+    db.execute(
+        update(models.Grupo).where(models.Grupo.id.in_(grupos_do_usuario)).values(versao=models.Grupo.versao + 1),
+        execution_options={"synchronize_session": False}
+    )
+
+# --- Cache LRU com orçamento de bytes ---
+
+class ResponseCache:
+    """
+    Cache LRU em memória de corpos JSON já serializados, limitado pelo total de bytes
+    e, opcionalmente, pelo tempo de vida das entradas (ttl, em segundos).
+    Thread-safe; cada worker do gunicorn tem o seu, e a versão do grupo (guardada na
+    base de dados) mantém todos consistentes.
+    """
+    def __init__(self, max_bytes: int, ttl: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict() # chave -> (expira_em, corpo)
+        self._bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self._bytes -= len(entry[1])
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (expires, value)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_BYTES)
+
+# --- Cache LRU com expiração (TTL) ---
+
+class TTLCache:
+    """
+    Cache LRU em memória com tempo de vida por entrada e número máximo de entradas.
+    Thread-safe. Usado para dados pequenos e muito lidos (ex.: associações a grupos).
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Any], bool]):
+        """Remove todas as entradas cuja chave satisfaz 'predicate'."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+@lru_cache(maxsize=None)
+def _type_adapter(response_model) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+def _make_etag(grupo, recurso: str, variacao: tuple) -> str:
+    chave = "|".join(str(parte) for parte in (grupo.id, grupo.versao, recurso, *variacao))
+    return f'"{hashlib.sha256(chave.encode()).hexdigest()[:32]}"'
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return etag in [tag.strip() for tag in if_none_match.split(",")]
+
+def cached_group_response(
+    request: Request,
+    grupo: models.Grupo,
+    recurso: str,
+    response_model: Any,
+    build: Callable[[], Any],
+    variacao: tuple = ()
+) -> Response:
+    """
+    Serve uma resposta de leitura do grupo a partir do cache, chaveado por
+    (grupo, versão, recurso, variação). 'variacao' deve conter tudo o mais de que o
+    corpo depende (usuário, parâmetros, período de tempo).
+
+    Responde 304 quando o cliente já tem a versão atual (If-None-Match); caso
+    contrário devolve o corpo em cache ou chama 'build', valida-o com 'response_model'
+    e guarda o JSON serializado.
+    """
+    etag = _make_etag(grupo, recurso, variacao)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(etag)
+    if body is None:
+        adapter = _type_adapter(response_model)
+        body = adapter.dump_json(adapter.validate_python(build(), from_attributes=True))
+        response_cache.set(etag, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,71 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, and_, literal, null
+from datetime import datetime, timezone, timedelta
+from dateutil.relativedelta import relativedelta
+from typing import Optional
+
+from .. import models, schemas
+from . import ledger_service, ai_quota_service
+
+def get_dashboard_totals(db: Session, group_id, incluir_uso_ia: bool = False, now: Optional[datetime] = None) -> schemas.DashboardTotals:
+    """
+    Calcula todos os totais do dashboard de um grupo numa única consulta.
+
+    As somas de 'movimentacoes' usam agregados condicionais (FILTER) sobre uma só
+    leitura do índice (grupo_id, data_transacao), limitada ao período recente; o saldo
+    vem da linha materializada em 'grupo_saldos', e o total investido nas metas e o
+    uso de IA da janela atual (linha do grupo em 'ai_quotas') entram como subconsultas
+    escalares do mesmo SELECT.
+    """
+    now = now or datetime.now(timezone.utc)
+    inicio_mes_atual = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    inicio_proximo_mes = inicio_mes_atual + relativedelta(months=1)
+    thirty_days_ago = now - timedelta(days=30)
+
+    mov = models.Movimentacao
+
+    def soma(*condicoes):
+        return func.coalesce(func.sum(mov.valor).filter(and_(*condicoes)), 0)
+
+    saldo_materializado = select(models.SaldoGrupo.total_ganhos - models.SaldoGrupo.total_gastos).where(
+        models.SaldoGrupo.grupo_id == group_id
+    ).scalar_subquery()
+
+    total_investido = select(func.coalesce(func.sum(models.Meta.valor_atual), 0)).where(
+        models.Meta.grupo_id == group_id
+    ).scalar_subquery()
+
+    if incluir_uso_ia:
+        ai_usage_count, ai_first_usage = ai_quota_service.usage_in_window(group_id, now)
+    else:
+        ai_usage_count = literal(0)
+        ai_first_usage = null()
+
+    stmt = select(
+        saldo_materializado.label("saldo_total"),
+        soma(mov.tipo == 'ganho', mov.data_transacao >= inicio_mes_atual, mov.data_transacao < inicio_proximo_mes).label("ganhos_mes_atual"),
+        soma(mov.tipo == 'gasto', mov.data_transacao >= inicio_mes_atual, mov.data_transacao < inicio_proximo_mes).label("gastos_mes_atual"),
+        soma(mov.tipo == 'ganho', mov.data_transacao >= thirty_days_ago).label("ganhos_ultimos_30dias"),
+        soma(mov.tipo == 'gasto', mov.data_transacao >= thirty_days_ago).label("gastos_ultimos_30dias"),
+        total_investido.label("total_investido"),
+        ai_usage_count.label("ai_usage_count_today"),
+        ai_first_usage.label("ai_first_usage_timestamp_today"),
+    ).where(mov.grupo_id == group_id, mov.data_transacao >= min(inicio_mes_atual, thirty_days_ago))
+
+    row = db.execute(stmt).one()
+
+    saldo_total = row.saldo_total
+    if saldo_total is None:
+        # Grupo ainda sem linha de saldo: calcula a partir do histórico
+        saldo_total = ledger_service.get_group_balance(db, group_id).saldo
+
+    return schemas.DashboardTotals(
+        total_investido=row.total_investido,
+        saldo_total=saldo_total,
+        ganhos_mes_atual=row.ganhos_mes_atual,
+        gastos_mes_atual=row.gastos_mes_atual,
+        ganhos_ultimos_30dias=row.ganhos_ultimos_30dias,
+        gastos_ultimos_30dias=row.gastos_ultimos_30dias,
+        ai_usage_count_today=row.ai_usage_count_today,
+        ai_first_usage_timestamp_today=row.ai_first_usage_timestamp_today,
+    )
@@ -0,0 +1,23 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from typing import Iterable, Tuple
+
+from .. import models
+
+# Tipos de evento de domínio. Só se publicam tipos com regras que os consumam
+# (ver services/achievements_service.py): cada evento custa um INSERT na escrita.
+META_FINANCIADA = 'meta_financiada'
+MES_POSITIVO = 'mes_positivo'
+
+def publish(db: Session, tipo: str, grupo_id, **dados):
+    """
+    Acrescenta um evento à fila, na transação atual: só fica visível para os
+    consumidores se a escrita que o originou for confirmada. Não faz commit.
+    """
+    db.execute(insert(models.EventoDominio).values(tipo=tipo, grupo_id=grupo_id, dados=dados))
+
+def publish_many(db: Session, tipo: str, eventos: Iterable[Tuple[object, dict]]):
+    """Acrescenta vários eventos (grupo_id, dados) do mesmo tipo num único INSERT. Não faz commit."""
+    linhas = [{"tipo": tipo, "grupo_id": grupo_id, "dados": dados} for grupo_id, dados in eventos]
+    if linhas:
+        db.execute(insert(models.EventoDominio), linhas)
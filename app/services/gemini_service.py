@@ -0,0 +1,90 @@
+import time
+from typing import Optional
+
+import httpx
+
+from ..config import settings
+
+def _http2_available() -> bool:
+    """O HTTP/2 do httpx depende do pacote opcional 'h2' (pip install httpx[http2])."""
+    try:
+        import h2 # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class GeminiClient:
+    """
+    Cliente HTTP único e partilhado para a API do Gemini, com pool de conexões
+    reaproveitadas (keep-alive), para não pagar o handshake TCP/TLS a cada análise.
+    É aberto e fechado no lifespan da aplicação; fora dela (scripts), é criado no
+    primeiro uso.
+    """
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.http2 = False
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_seconds = 0.0
+
+    def start(self):
+        if self._client is not None:
+            return
+        self.http2 = _http2_available()
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=settings.GEMINI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GEMINI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.GEMINI_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.GEMINI_CONNECT_TIMEOUT_SECONDS,
+                read=settings.GEMINI_READ_TIMEOUT_SECONDS,
+                write=settings.GEMINI_CONNECT_TIMEOUT_SECONDS,
+                pool=settings.GEMINI_POOL_TIMEOUT_SECONDS,
+            ),
+        )
+
+    async def aclose(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        self.start()
+        self.in_flight += 1
+        inicio = time.perf_counter()
+        try:
+            resposta = await self._client.post(url, **kwargs)
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+        else:
+            # 429/5xx e outras respostas de erro também contam, embora não levantem aqui
+            if resposta.is_error:
+                self.errors += 1
+            return resposta
+        finally:
+            self.in_flight -= 1
+            self.requests += 1
+            self.total_seconds += time.perf_counter() - inicio
+
+    def stats(self) -> dict:
+        # O pool do httpcore não tem API pública de métricas; lemos as conexões abertas
+        conexoes = getattr(getattr(getattr(self._client, "_transport", None), "_pool", None), "connections", [])
+        return {
+            "started": self._client is not None,
+            "http2": self.http2,
+            "max_connections": settings.GEMINI_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.GEMINI_MAX_KEEPALIVE_CONNECTIONS,
+            "open_connections": len(conexoes),
+            "idle_connections": sum(1 for c in conexoes if c.is_idle()),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_latency_seconds": round(self.total_seconds / self.requests, 4) if self.requests else None,
+        }
+
+gemini_client = GeminiClient()
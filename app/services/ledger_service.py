@@ -0,0 +1,138 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from decimal import Decimal
+from typing import List, Optional
+
+from .. import models
+from . import rollup_service
+
+# Coluna de 'grupo_saldos' acumulada para cada tipo de movimentação
+COLUNAS_POR_TIPO = {
+    'ganho': 'total_ganhos',
+    'gasto': 'total_gastos',
+    'investimento': 'total_investimentos',
+}
+
+def _totais_do_historico_stmt():
+    """SELECT com os totais por tipo de cada grupo, calculados a partir de 'movimentacoes'."""
+    mov = models.Movimentacao
+    return select(
+        mov.grupo_id,
+        *[
+            func.coalesce(func.sum(mov.valor).filter(mov.tipo == tipo), 0).label(coluna)
+            for tipo, coluna in COLUNAS_POR_TIPO.items()
+        ]
+    ).group_by(mov.grupo_id)
+
+def _calcular_totais_do_historico(db: Session, grupo_id) -> dict:
+    row = db.execute(_totais_do_historico_stmt().where(models.Movimentacao.grupo_id == grupo_id)).first()
+    return {coluna: (getattr(row, coluna) if row else Decimal('0.0')) for coluna in COLUNAS_POR_TIPO.values()}
+
+def get_group_balance(db: Session, grupo_id) -> models.SaldoGrupo:
+    """
+    Retorna o saldo materializado do grupo, sem bloqueio.
+    Se a linha ainda não existir (grupo sem escritas desde o deploy), devolve um
+    objeto transitório calculado a partir do histórico, sem persisti-lo.
+    """
+    saldo = db.query(models.SaldoGrupo).filter(models.SaldoGrupo.grupo_id == grupo_id).first()
+    if saldo:
+        return saldo
+    return models.SaldoGrupo(grupo_id=grupo_id, **_calcular_totais_do_historico(db, grupo_id))
+
+def lock_group_balance(db: Session, grupo_id) -> models.SaldoGrupo:
+    """
+    Bloqueia (SELECT ... FOR UPDATE) e retorna a linha de saldo do grupo, criando-a
+    a partir do histórico se necessário.
+
+    Deve ser chamada antes do flush da movimentação que está a ser gravada, pois os
+    totais iniciais são calculados com o que já está na base de dados.
+    """
+    saldo = db.query(models.SaldoGrupo).filter(models.SaldoGrupo.grupo_id == grupo_id).with_for_update().first()
+    if saldo:
+        return saldo
+
+    totais = _calcular_totais_do_historico(db, grupo_id)
+    try:
+        with db.begin_nested():
+            db.add(models.SaldoGrupo(grupo_id=grupo_id, **totais))
+    except IntegrityError:
+        # Outra transação criou a linha ao mesmo tempo; usamos a dela.
+        pass
+    return db.query(models.SaldoGrupo).filter(models.SaldoGrupo.grupo_id == grupo_id).with_for_update().one()
+
+def _aplicar(db: Session, grupo_id, tipo: str, valor, sinal: int) -> models.SaldoGrupo:
+    saldo = lock_group_balance(db, grupo_id)
+    coluna = COLUNAS_POR_TIPO.get(tipo)
+    if coluna:
+        setattr(saldo, coluna, getattr(saldo, coluna) + sinal * Decimal(str(valor)))
+    return saldo
+
+def record_transaction(db: Session, movimentacao: models.Movimentacao) -> models.SaldoGrupo:
+    """
+    Soma uma movimentação nova (ou os valores novos de uma editada) ao saldo do grupo
+    e ao seu resumo mensal.
+    """
+    saldo = _aplicar(db, movimentacao.grupo_id, movimentacao.tipo, movimentacao.valor, 1)
+    rollup_service.apply_transaction(db, movimentacao, 1)
+    return saldo
+
+def record_transactions(db: Session, grupo_id, movimentacoes: List[models.Movimentacao]) -> models.SaldoGrupo:
+    """
+    Versão em lote de record_transaction para movimentações novas do mesmo grupo:
+    um único lock do saldo e um único UPSERT no resumo mensal.
+    """
+    saldo = lock_group_balance(db, grupo_id)
+    for mov in movimentacoes:
+        coluna = COLUNAS_POR_TIPO.get(mov.tipo)
+        if coluna:
+            setattr(saldo, coluna, getattr(saldo, coluna) + Decimal(str(mov.valor)))
+    rollup_service.apply_transactions(db, movimentacoes, 1)
+    return saldo
+
+def reverse_transaction(db: Session, movimentacao: models.Movimentacao) -> models.SaldoGrupo:
+    """
+    Retira do saldo do grupo e do seu resumo mensal uma movimentação apagada (ou os
+    valores antigos de uma editada).
+    """
+    saldo = _aplicar(db, movimentacao.grupo_id, movimentacao.tipo, movimentacao.valor, -1)
+    rollup_service.apply_transaction(db, movimentacao, -1)
+    return saldo
+
+def rebuild_balances(db: Session, grupo_id: Optional[str] = None) -> int:
+    """
+    Recalcula a partir do histórico as linhas de saldo de todos os grupos (ou de um só).
+    Retorna o número de grupos reconstruídos. Não faz commit.
+    """
+    grupos_query = db.query(models.Grupo.id)
+    totais_stmt = _totais_do_historico_stmt()
+    if grupo_id:
+        grupos_query = grupos_query.filter(models.Grupo.id == grupo_id)
+        totais_stmt = totais_stmt.where(models.Movimentacao.grupo_id == grupo_id)
+
+    totais_por_grupo = {row.grupo_id: row for row in db.execute(totais_stmt)}
+    count = 0
+    for (gid,) in grupos_query.all():
+        row = totais_por_grupo.get(gid)
+        db.merge(models.SaldoGrupo(
+            grupo_id=gid,
+            **{coluna: (getattr(row, coluna) if row else Decimal('0.0')) for coluna in COLUNAS_POR_TIPO.values()}
+        ))
+        count += 1
+    return count
+
+def verify_balances(db: Session) -> list:
+    """
+    Compara as linhas de 'grupo_saldos' com os totais do histórico.
+    Retorna uma lista de divergências (grupo, coluna, valor materializado, valor esperado).
+    """
+    totais_por_grupo = {row.grupo_id: row for row in db.execute(_totais_do_historico_stmt())}
+    divergencias = []
+    for saldo in db.query(models.SaldoGrupo).all():
+        row = totais_por_grupo.get(saldo.grupo_id)
+        for coluna in COLUNAS_POR_TIPO.values():
+            esperado = Decimal(str(getattr(row, coluna))) if row else Decimal('0.0')
+            atual = getattr(saldo, coluna)
+            if atual != esperado:
+                divergencias.append({"grupo_id": saldo.grupo_id, "coluna": coluna, "materializado": atual, "esperado": esperado})
+    return divergencias
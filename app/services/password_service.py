@@ -0,0 +1,139 @@
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from ..config import settings
+
+# Cada processo do pool cria o seu próprio contexto ao importar este módulo
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+class PasswordServiceBusy(Exception):
+    """Levantada quando a fila de hashing está cheia; a API responde 503."""
+    pass
+
+# --- Funções executadas nos processos do pool ---
+# Retornam também o instante em que começaram, para medir o tempo de espera na fila.
+
+def _verify_in_worker(plain_password: str, hashed_password: str):
+    return time.time(), pwd_context.verify(plain_password, hashed_password)
+
+def _hash_in_worker(password: str):
+    return time.time(), pwd_context.hash(password)
+
+class PasswordHasher:
+    """
+    Executa o bcrypt num pool de processos dedicado, fora das threads que servem
+    requisições. 'workers' limita quantos hashes correm em paralelo e 'queue_depth'
+    quantos podem esperar; acima disso os pedidos são recusados com PasswordServiceBusy.
+    Com workers=0 o hashing corre na própria thread (desenvolvimento e scripts).
+    """
+    def __init__(self, workers: int, queue_depth: int):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = Lock()
+        self._in_flight = 0
+        self._waits = deque(maxlen=1000) # Tempos de espera (s) das últimas execuções
+        self.completed = 0
+        self.rejected = 0
+        self.max_wait = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 'spawn' evita herdar, via fork, locks de threads do servidor
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_depth:
+                self.rejected += 1
+                raise PasswordServiceBusy()
+            self._in_flight += 1
+
+    def _release(self, submitted_at: float, future: Future, executor: ProcessPoolExecutor):
+        with self._lock:
+            self._in_flight -= 1
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                # Um processo morreu: o pool fica inutilizável e é recriado no próximo pedido
+                if isinstance(future.exception(), BrokenProcessPool) and self._executor is executor:
+                    self._executor = None
+                return
+            wait = max(0.0, future.result()[0] - submitted_at)
+            self._waits.append(wait)
+            self.max_wait = max(self.max_wait, wait)
+            self.completed += 1
+
+    def _submit(self, fn, *args) -> Future:
+        self._admit()
+        submitted_at = time.time()
+        try:
+            executor = self._get_executor()
+            future = executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        future.add_done_callback(lambda f: self._release(submitted_at, f, executor))
+        return future
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verifica a senha bloqueando a thread atual até o resultado."""
+        if not self.workers:
+            return pwd_context.verify(plain_password, hashed_password)
+        return self._submit(_verify_in_worker, plain_password, hashed_password).result()[1]
+
+    def hash(self, password: str) -> str:
+        """Gera o hash bloqueando a thread atual até o resultado."""
+        if not self.workers:
+            return pwd_context.hash(password)
+        return self._submit(_hash_in_worker, password).result()[1]
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        """Verifica a senha sem ocupar nenhuma thread enquanto espera."""
+        if not self.workers:
+            return await asyncio.to_thread(pwd_context.verify, plain_password, hashed_password)
+        return (await asyncio.wrap_future(self._submit(_verify_in_worker, plain_password, hashed_password)))[1]
+
+    async def hash_async(self, password: str) -> str:
+        """Gera o hash sem ocupar nenhuma thread enquanto espera."""
+        if not self.workers:
+            return await asyncio.to_thread(pwd_context.hash, password)
+        return (await asyncio.wrap_future(self._submit(_hash_in_worker, password)))[1]
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            def percentil(p):
+                return round(waits[min(len(waits) - 1, int(p * len(waits)))], 4) if waits else None
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "in_flight": self._in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "queue_wait_p50_seconds": percentil(0.50),
+                "queue_wait_p95_seconds": percentil(0.95),
+                "queue_wait_max_seconds": round(self.max_wait, 4),
+            }
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_DEPTH)
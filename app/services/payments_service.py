@@ -0,0 +1,25 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import update
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from .. import models
+from . import cache_service
+
+def mark_overdue_payments(db: Session, today: Optional[date] = None) -> int:
+    """
+    Marca como 'atrasado' os pagamentos agendados ainda pendentes cujo vencimento já
+    passou, num único UPDATE, e invalida o cache dos grupos afetados. Retorna o número
+    de pagamentos marcados. Não faz commit.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    pagamento = models.PagamentoAgendado
+    grupos = db.execute(
+        update(pagamento)
+        .where(pagamento.status == models.StatusPagamentoEnum.pendente, pagamento.data_vencimento < today)
+        .values(status=models.StatusPagamentoEnum.atrasado)
+        .returning(pagamento.grupo_id),
+        execution_options={"synchronize_session": False}
+    ).scalars().all()
+    cache_service.bump_group_versions(db, set(grupos))
+    return len(grupos)
@@ -0,0 +1,151 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, delete, cast, Date
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from .. import models
+
+def _dialect_insert(db: Session):
+    """Retorna o 'insert' do dialeto em uso, que suporta ON CONFLICT DO UPDATE."""
+    if db.get_bind().dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
+def as_utc(value) -> datetime:
+    """
+    Datetime em UTC de uma data de movimentação: None é a hora atual, e datas ou
+    datetimes sem fuso são tomados como UTC. É a regra dos meses do resumo, a mesma
+    de period_start_expr no SQL.
+    """
+    if value is None:
+        return datetime.now(timezone.utc)
+    if not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def month_start(value) -> date:
+    """Primeiro dia do mês (em UTC) de uma data/datetime, ou do mês atual se None."""
+    value = as_utc(value)
+    return date(value.year, value.month, 1)
+
+# Modificadores do SQLite equivalentes ao date_trunc do Postgres (semana começa na segunda)
+_SQLITE_PERIOD_MODIFIERS = {
+    'day': (),
+    'week': ('weekday 0', '-6 days'),
+    'month': ('start of month',),
+}
+
+def period_start_expr(db: Session, column, granularity: str = 'month'):
+    """
+    Expressão SQL (date_trunc) com o início do dia/semana/mês de uma coluna de data,
+    em UTC e não no fuso da sessão, como month_start. O SQLite guarda as datas sem fuso,
+    já em UTC (ver apply_transactions).
+    """
+    if db.get_bind().dialect.name == 'sqlite':
+        return func.date(column, *_SQLITE_PERIOD_MODIFIERS[granularity])
+    if getattr(column.type, 'timezone', False):
+        column = func.timezone('UTC', column)
+    return cast(func.date_trunc(granularity, column), Date)
+
+def apply_transaction(db: Session, movimentacao: models.Movimentacao, sinal: int = 1):
+    """
+    Soma (sinal=1) ou retira (sinal=-1) uma movimentação do resumo mensal do seu
+    grupo/responsável/mês/tipo com um único UPSERT atómico.
+    """
+    apply_transactions(db, [movimentacao], sinal)
+
+def apply_transactions(db: Session, movimentacoes: Iterable[models.Movimentacao], sinal: int = 1):
+    """
+    Versão em lote de apply_transaction: agrupa as movimentações por chave do resumo
+    e aplica todas num único UPSERT de várias linhas.
+
+    As movimentações somadas (sinal=1) ficam com a data em UTC (ver as_utc): sem data,
+    a linha receberia o now() da base de dados, e uma data sem fuso seria lida no fuso
+    da sessão, podendo cair noutro mês que o do resumo.
+    """
+    agregado = {}
+    for mov in movimentacoes:
+        if sinal > 0:
+            mov.data_transacao = as_utc(mov.data_transacao)
+        chave = (mov.grupo_id, month_start(mov.data_transacao), mov.responsavel_id, mov.tipo)
+        total, quantidade = agregado.get(chave, (Decimal('0.0'), 0))
+        agregado[chave] = (total + sinal * Decimal(str(mov.valor)), quantidade + sinal)
+    if not agregado:
+        return
+
+    insert = _dialect_insert(db)
+    stmt = insert(models.ResumoMensal).values([
+        {
+            "grupo_id": grupo_id, "ano_mes": ano_mes, "responsavel_id": responsavel_id, "tipo": tipo,
+            "total": total, "quantidade": quantidade
+        }
+        for (grupo_id, ano_mes, responsavel_id, tipo), (total, quantidade) in agregado.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            models.ResumoMensal.grupo_id, models.ResumoMensal.ano_mes,
+            models.ResumoMensal.responsavel_id, models.ResumoMensal.tipo
+        ],
+        set_={
+            "total": models.ResumoMensal.total + stmt.excluded.total,
+            "quantidade": models.ResumoMensal.quantidade + stmt.excluded.quantidade,
+        }
+    )
+    db.execute(stmt)
+
+def _resumo_do_historico_stmt(db: Session):
+    """SELECT que agrega 'movimentacoes' no formato de 'resumos_mensais'."""
+    mov = models.Movimentacao
+    ano_mes = period_start_expr(db, mov.data_transacao, 'month')
+    return select(
+        mov.grupo_id,
+        ano_mes.label("ano_mes"),
+        mov.responsavel_id,
+        mov.tipo,
+        func.sum(mov.valor).label("total"),
+        func.count(mov.id).label("quantidade")
+    ).group_by(mov.grupo_id, ano_mes, mov.responsavel_id, mov.tipo)
+
+def rebuild_monthly_rollup(db: Session, grupo_id: Optional[str] = None) -> int:
+    """
+    Recalcula 'resumos_mensais' a partir do histórico (todos os grupos ou um só),
+    com um INSERT ... SELECT. Retorna o número de linhas geradas. Não faz commit.
+    """
+    apagar = delete(models.ResumoMensal)
+    origem = _resumo_do_historico_stmt(db)
+    if grupo_id:
+        apagar = apagar.where(models.ResumoMensal.grupo_id == grupo_id)
+        origem = origem.where(models.Movimentacao.grupo_id == grupo_id)
+
+    db.execute(apagar)
+    result = db.execute(
+        models.ResumoMensal.__table__.insert().from_select(
+            ["grupo_id", "ano_mes", "responsavel_id", "tipo", "total", "quantidade"], origem
+        )
+    )
+    return result.rowcount
+
+def verify_monthly_rollup(db: Session) -> list:
+    """
+    Compara 'resumos_mensais' com o histórico.
+    Retorna uma lista de divergências (chave, valor materializado, valor esperado).
+    """
+    def chave(row):
+        return (row.grupo_id, str(row.ano_mes), row.responsavel_id, row.tipo)
+
+    esperado = {chave(row): Decimal(str(row.total)) for row in db.execute(_resumo_do_historico_stmt(db))}
+    materializado = {
+        chave(row): row.total
+        for row in db.query(models.ResumoMensal).filter(models.ResumoMensal.quantidade != 0)
+    }
+
+    divergencias = []
+    for k in esperado.keys() | materializado.keys():
+        if esperado.get(k, Decimal('0.0')) != materializado.get(k, Decimal('0.0')):
+            divergencias.append({"chave": k, "materializado": materializado.get(k), "esperado": esperado.get(k)})
+    return divergencias
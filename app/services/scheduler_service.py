@@ -0,0 +1,264 @@
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from .. import models, database
+from ..config import settings
+from .rollup_service import _dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# Limites (mínimo, máximo) de cada campo de uma expressão cron: minuto, hora, dia, mês, dia da semana
+_CAMPOS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+class CronSpec:
+    """
+    Expressão cron de 5 campos ('minuto hora dia mês dia-da-semana', em UTC), com
+    '*', listas ('1,15'), intervalos ('1-5') e passos ('*/10', '0-30/5'). O domingo
+    é 0 ou 7. Como no cron, se dia e dia da semana forem ambos restritos basta um.
+    """
+    def __init__(self, expressao: str):
+        partes = expressao.split()
+        if len(partes) != 5:
+            raise ValueError(f"Expressão cron inválida (esperados 5 campos): '{expressao}'")
+        self.expressao = expressao
+        self.minutos, self.horas, self.dias, self.meses, dias_semana = (
+            self._campo(parte, minimo, maximo) for parte, (minimo, maximo) in zip(partes, _CAMPOS)
+        )
+        self.dias_semana = {d % 7 for d in dias_semana}
+        self._dia_restrito = partes[2] != '*'
+        self._semana_restrita = partes[4] != '*'
+
+    @staticmethod
+    def _campo(parte: str, minimo: int, maximo: int) -> set:
+        valores = set()
+        for item in parte.split(','):
+            intervalo, _, passo = item.partition('/')
+            if intervalo == '*':
+                inicio, fim = minimo, maximo
+            elif '-' in intervalo:
+                inicio, fim = map(int, intervalo.split('-'))
+            else:
+                inicio = fim = int(intervalo)
+                if passo:
+                    fim = maximo
+            if not (minimo <= inicio <= fim <= maximo):
+                raise ValueError(f"Campo cron fora do intervalo {minimo}-{maximo}: '{parte}'")
+            valores.update(range(inicio, fim + 1, int(passo) if passo else 1))
+        return valores
+
+    def _dia_coincide(self, dt: datetime) -> bool:
+        no_dia = dt.day in self.dias
+        na_semana = (dt.weekday() + 1) % 7 in self.dias_semana
+        if self._dia_restrito and self._semana_restrita:
+            return no_dia or na_semana
+        return no_dia and na_semana
+
+    def next_after(self, dt: datetime) -> datetime:
+        """Primeiro instante (ao minuto) estritamente posterior a 'dt' que satisfaz a expressão."""
+        dt = dt.astimezone(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = dt + timedelta(days=366 * 5)
+        while dt < limite:
+            if dt.month not in self.meses:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._dia_coincide(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.horas:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutos:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"A expressão cron '{self.expressao}' nunca é satisfeita.")
+
+def _utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """O SQLite devolve datas sem fuso; são sempre gravadas em UTC."""
+    return dt.replace(tzinfo=timezone.utc) if dt is not None and dt.tzinfo is None else dt
+
+def _lock_key(nome: str) -> int:
+    """Chave (bigint) do advisory lock do Postgres para a tarefa, estável entre processos."""
+    return int.from_bytes(hashlib.sha256(f"clarify:scheduler:{nome}".encode()).digest()[:8], 'big', signed=True)
+
+class ScheduledJob:
+    def __init__(self, nome: str, cron: str, funcao: Callable[[Session], object]):
+        self.nome = nome
+        self.spec = CronSpec(cron)
+        self.funcao = funcao
+        self.proxima_execucao: Optional[datetime] = None
+        self.em_execucao = False
+        # Usado no lugar do advisory lock quando a base de dados não é Postgres
+        self.lock_local = threading.Lock()
+        # Métricas deste processo
+        self.execucoes = 0
+        self.falhas = 0
+        self.ignoradas = 0
+        self.ultima_execucao: Optional[datetime] = None
+        self.ultima_duracao_s: Optional[float] = None
+        self.ultimo_erro: Optional[str] = None
+
+class Scheduler:
+    """
+    Agendador de tarefas periódicas que corre dentro da aplicação, em todos os workers.
+
+    Cada tarefa é executada por um só worker ou nó: quem chega primeiro obtém um
+    advisory lock do Postgres com a chave da tarefa (os outros ignoram essa vez) e,
+    com o lock, confirma em 'tarefas_agendadas' que a execução ainda está em falta
+    antes de correr a tarefa e gravar a próxima. Noutras bases de dados (ex.: SQLite
+    em desenvolvimento) o lock é só deste processo.
+
+    As tarefas recebem uma sessão própria, que é confirmada (commit) no fim, e correm
+    numa thread para não bloquearem o event loop.
+    """
+    def __init__(self, tick_seconds: float = 30):
+        self._tick = tick_seconds
+        self._jobs: dict = {}
+        self._task: Optional[asyncio.Task] = None
+        self._execucoes: set = set() # Referências às execuções em curso, para não serem recolhidas
+
+    def register(self, nome: str, cron: str, funcao: Callable[[Session], object]):
+        self._jobs[nome] = ScheduledJob(nome, cron, funcao)
+
+    def start(self):
+        """Inicia o ciclo do agendador no event loop atual (no lifespan da aplicação)."""
+        if self._task is None and self._jobs:
+            self._task = asyncio.create_task(self._loop())
+
+    async def aclose(self):
+        """Pára o ciclo e espera que as tarefas já em curso terminem (correm numa thread, que não se interrompe)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._execucoes:
+            await asyncio.gather(*self._execucoes, return_exceptions=True)
+
+    def _carregar_proximas(self):
+        """Retoma as próximas execuções gravadas, para que uma vez perdida (ex.: deploy) corra logo."""
+        with database.SessionLocal() as db:
+            for nome, proxima in db.execute(
+                select(models.TarefaAgendada.nome, models.TarefaAgendada.proxima_execucao)
+                .where(models.TarefaAgendada.nome.in_(list(self._jobs)))
+            ):
+                self._jobs[nome].proxima_execucao = _utc(proxima)
+
+    async def _loop(self):
+        try:
+            await asyncio.to_thread(self._carregar_proximas)
+        except Exception:
+            logger.exception("SCHEDULER: Não foi possível ler as próximas execuções gravadas.")
+        while True:
+            agora = datetime.now(timezone.utc)
+            for job in self._jobs.values():
+                if job.proxima_execucao is None:
+                    job.proxima_execucao = job.spec.next_after(agora)
+                if job.proxima_execucao <= agora and not job.em_execucao:
+                    job.em_execucao = True
+                    execucao = asyncio.create_task(self._executar(job))
+                    self._execucoes.add(execucao)
+                    execucao.add_done_callback(self._execucoes.discard)
+            await asyncio.sleep(self._tick)
+
+    async def _executar(self, job: ScheduledJob):
+        try:
+            await asyncio.to_thread(self.run_job, job)
+        except Exception:
+            logger.exception(f"SCHEDULER: Erro inesperado ao executar '{job.nome}'.")
+        finally:
+            job.em_execucao = False
+
+    def run_job(self, job: ScheduledJob, now: Optional[datetime] = None) -> bool:
+        """
+        Executa a tarefa se este processo obtiver o lock e a execução ainda estiver em
+        falta. Retorna se a tarefa foi executada.
+        """
+        now = now or datetime.now(timezone.utc)
+        with database.engine.connect() as conexao:
+            postgres = conexao.dialect.name == 'postgresql'
+            if postgres:
+                obtido = conexao.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _lock_key(job.nome)}).scalar()
+                conexao.commit()
+            else:
+                obtido = job.lock_local.acquire(blocking=False)
+            if not obtido:
+                job.ignoradas += 1
+                job.proxima_execucao = job.spec.next_after(now)
+                return False
+            try:
+                return self._executar_com_lock(job, now)
+            finally:
+                if postgres:
+                    conexao.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _lock_key(job.nome)})
+                    conexao.commit()
+                else:
+                    job.lock_local.release()
+
+    def _executar_com_lock(self, job: ScheduledJob, now: datetime) -> bool:
+        db = database.SessionLocal()
+        try:
+            # Cria a linha da tarefa no primeiro arranque, com a execução devida agora
+            insert = _dialect_insert(db)
+            db.execute(
+                insert(models.TarefaAgendada).values(nome=job.nome, proxima_execucao=now)
+                .on_conflict_do_nothing(index_elements=[models.TarefaAgendada.nome])
+            )
+            db.commit()
+            agendada = db.get(models.TarefaAgendada, job.nome)
+            if _utc(agendada.proxima_execucao) > now:
+                # Outro worker já a executou nesta vez
+                job.proxima_execucao = _utc(agendada.proxima_execucao)
+                job.ignoradas += 1
+                return False
+
+            inicio = time.perf_counter()
+            erro = None
+            try:
+                job.funcao(db)
+                db.commit()
+            except Exception as e:
+                logger.exception(f"SCHEDULER: A tarefa '{job.nome}' falhou.")
+                db.rollback()
+                erro = str(e)
+            duracao = time.perf_counter() - inicio
+
+            job.proxima_execucao = job.spec.next_after(now)
+            job.ultima_execucao, job.ultima_duracao_s, job.ultimo_erro = now, duracao, erro
+            job.execucoes += 1
+            job.falhas += erro is not None
+
+            agendada = db.get(models.TarefaAgendada, job.nome)
+            agendada.proxima_execucao = job.proxima_execucao
+            agendada.ultima_execucao = now
+            agendada.ultima_duracao_s = duracao
+            agendada.ultimo_erro = erro
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            nome: {
+                "cron": job.spec.expressao,
+                "proxima_execucao": job.proxima_execucao.isoformat() if job.proxima_execucao else None,
+                "em_execucao": job.em_execucao,
+                "execucoes": job.execucoes,
+                "falhas": job.falhas,
+                "ignoradas": job.ignoradas,
+                "ultima_execucao": job.ultima_execucao.isoformat() if job.ultima_execucao else None,
+                "ultima_duracao_s": job.ultima_duracao_s,
+                "ultimo_erro": job.ultimo_erro,
+            }
+            for nome, job in self._jobs.items()
+        }
+
+scheduler = Scheduler(settings.SCHEDULER_TICK_SECONDS)
@@ -0,0 +1,56 @@
+from sqlalchemy import func, literal_column, or_, case, literal, cast, Numeric
+from sqlalchemy.sql.elements import ColumnElement
+
+from .. import models
+
+# Configuração de texto do Postgres usada no índice 'ix_movimentacoes_descricao_fts'
+# (ver migrate_database.py). A expressão da consulta tem de ser igual à do índice.
+TEXT_SEARCH_CONFIG = "portuguese"
+
+# Casas decimais da relevância devolvida por search_rank (e guardada no cursor)
+RANK_DECIMALS = 6
+
+def escape_like(texto: str) -> str:
+    """Escapa os caracteres especiais do LIKE; usar com escape="\\"."""
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _tsvector():
+    return func.to_tsvector(
+        literal_column(f"'{TEXT_SEARCH_CONFIG}'"),
+        func.coalesce(models.Movimentacao.descricao, literal_column("''"))
+    )
+
+def _tsquery(q: str):
+    return func.websearch_to_tsquery(literal_column(f"'{TEXT_SEARCH_CONFIG}'"), q)
+
+def search_condition(dialect: str, q: str) -> ColumnElement:
+    """
+    Condição WHERE da pesquisa na descrição das movimentações.
+    No Postgres combina a pesquisa por palavras (tsvector/GIN, com radicais em português)
+    com a pesquisa por trecho (ILIKE, servida pelo índice de trigramas); nos outros bancos
+    (ex.: SQLite local) só a pesquisa por trecho, sem índice.
+    """
+    trecho = models.Movimentacao.descricao.ilike(f"%{escape_like(q)}%", escape="\\")
+    if dialect != "postgresql":
+        return trecho
+    return or_(_tsvector().op("@@")(_tsquery(q)), trecho)
+
+def search_rank(dialect: str, q: str) -> ColumnElement:
+    """
+    Relevância de cada resultado (maior é melhor). No Postgres usa ts_rank_cd; nos
+    outros bancos prefere a descrição igual ao termo, depois a que começa por ele.
+
+    O valor é arredondado a RANK_DECIMALS casas num numeric: o ts_rank_cd é um real
+    (float4), que não se compara de forma exata com o valor que volta no cursor. Usar
+    esta mesma expressão na seleção, na ordenação e na comparação do cursor.
+    """
+    if dialect == "postgresql":
+        rank = func.ts_rank_cd(_tsvector(), _tsquery(q))
+    else:
+        descricao = func.lower(models.Movimentacao.descricao)
+        rank = case(
+            (descricao == q.lower(), literal(2.0)),
+            (descricao.like(f"{escape_like(q.lower())}%", escape="\\"), literal(1.0)),
+            else_=literal(0.0)
+        )
+    return func.round(cast(rank, Numeric), RANK_DECIMALS, type_=Numeric(asdecimal=True))
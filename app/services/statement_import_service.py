@@ -0,0 +1,227 @@
+import csv
+import hashlib
+import html
+import re
+import unicodedata
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import BinaryIO, Iterator, Optional
+
+import bleach
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+from . import ledger_service
+from .rollup_service import _dialect_insert
+from .transaction_parser_service import parse_br_number
+
+class StatementImportError(ValueError):
+    """Extrato ilegível (formato desconhecido, cabeçalho inválido); a API responde 400."""
+    pass
+
+@dataclass
+class ImportResult:
+    importadas: int = 0
+    duplicadas: int = 0
+    invalidas: int = 0
+
+# --- Leitura incremental do ficheiro ---
+
+def _linhas(arquivo: BinaryIO) -> Iterator[str]:
+    """
+    Lê o ficheiro linha a linha, sem o carregar todo em memória. Cada linha é
+    decodificada como UTF-8 e, se falhar, como Windows-1252 (comum em extratos de bancos).
+    """
+    for raw in arquivo:
+        try:
+            linha = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            linha = raw.decode("cp1252", errors="replace")
+        yield linha.lstrip("\ufeff").rstrip("\r\n")
+
+def _normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e com espaços colapsados (cabeçalhos e hash)."""
+    sem_acentos = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+    return " ".join(sem_acentos.lower().split())
+
+def _parse_valor(texto: str) -> Decimal:
+    """
+    Aceita '1.234,56', '1,234.56', '1.234' (milhares), '-30,00', 'R$ 10' etc., com as
+    mesmas regras do analisador local (ver transaction_parser_service.parse_br_number).
+    """
+    valor = parse_br_number(texto.strip().replace("R$", "").replace(" ", ""))
+    if valor is None:
+        raise ValueError(f"valor inválido: {texto}")
+    return valor
+
+_FORMATOS_DE_DATA = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%y", "%Y%m%d")
+
+def _parse_data(texto: str) -> date:
+    texto = texto.strip()[:10]
+    for formato in _FORMATOS_DE_DATA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"data inválida: {texto}")
+
+# --- OFX ---
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+def _ler_ofx(linhas: Iterator[str]) -> Iterator[Optional[dict]]:
+    """
+    Percorre as tags do OFX (SGML ou XML) e produz um dicionário por <STMTTRN>.
+    Não monta a árvore do documento: só guarda a transação corrente.
+    """
+    atual = None
+    for linha in linhas:
+        for fecho, tag, conteudo in _OFX_TAG.findall(linha):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if fecho:
+                    if atual is not None:
+                        yield atual
+                    atual = None
+                else:
+                    atual = {}
+            elif atual is not None and not fecho and conteudo.strip():
+                atual[tag] = conteudo.strip()
+
+def _linhas_ofx(linhas: Iterator[str]) -> Iterator[Optional[tuple]]:
+    for trn in _ler_ofx(linhas):
+        try:
+            data = _parse_data(trn["DTPOSTED"][:8])
+            valor = _parse_valor(trn["TRNAMT"])
+        except (KeyError, ValueError, InvalidOperation):
+            yield None
+            continue
+        descricao = " ".join(filter(None, (trn.get("NAME"), trn.get("MEMO")))) or None
+        yield data, valor, descricao, None
+
+# --- CSV ---
+
+_COLUNAS_CSV = {
+    "data": {"data", "date", "data transacao", "data lancamento", "data_transacao"},
+    "descricao": {"descricao", "description", "historico", "memo", "lancamento"},
+    "valor": {"valor", "amount", "value", "quantia", "valor (r$)"},
+    "tipo": {"tipo", "type"},
+}
+
+def _linhas_csv(linhas: Iterator[str]) -> Iterator[Optional[tuple]]:
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        raise StatementImportError("O ficheiro está vazio.")
+    delimitador = ";" if cabecalho.count(";") > cabecalho.count(",") else ","
+
+    indices = {}
+    for i, nome in enumerate(next(csv.reader([cabecalho], delimiter=delimitador))):
+        for campo, nomes in _COLUNAS_CSV.items():
+            if _normalizar(nome) in nomes and campo not in indices:
+                indices[campo] = i
+    faltando = [campo for campo in ("data", "descricao", "valor") if campo not in indices]
+    if faltando:
+        raise StatementImportError(f"Cabeçalho do CSV inválido: faltam as colunas {', '.join(faltando)}.")
+
+    for row in csv.reader(linhas, delimiter=delimitador):
+        if not any(campo.strip() for campo in row):
+            continue
+        try:
+            data = _parse_data(row[indices["data"]])
+            valor = _parse_valor(row[indices["valor"]])
+            descricao = row[indices["descricao"]].strip() or None
+            tipo = _normalizar(row[indices["tipo"]]) if "tipo" in indices and indices["tipo"] < len(row) else None
+        except (IndexError, ValueError, InvalidOperation):
+            yield None
+            continue
+        yield data, valor, descricao, tipo
+
+# --- Normalização e gravação ---
+
+_TIPOS = set(ledger_service.COLUNAS_POR_TIPO)
+_VALOR_MAXIMO = Decimal("99999999.99") # DECIMAL(10, 2)
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    nome = (filename or "").lower()
+    if nome.endswith((".ofx", ".qfx")) or "ofx" in (content_type or ""):
+        return "ofx"
+    if nome.endswith((".csv", ".txt")) or "csv" in (content_type or ""):
+        return "csv"
+    raise StatementImportError("Formato de extrato não suportado. Envie um ficheiro .ofx ou .csv.")
+
+def import_hash(data: date, valor: Decimal, descricao: Optional[str], ocorrencia: int) -> str:
+    """
+    Hash do conteúdo da linha (data, valor com sinal, descrição normalizada). 'ocorrencia'
+    distingue linhas idênticas no mesmo extrato (ex.: dois cafés no mesmo dia), de modo
+    que reimportar o mesmo ficheiro não cria nada, mas nenhuma das duas se perde.
+    """
+    chave = f"{data.isoformat()}|{valor:.2f}|{_normalizar(descricao or '')}|{ocorrencia}"
+    return hashlib.sha256(chave.encode()).hexdigest()
+
+def _movimentacoes(linhas: Iterator[Optional[tuple]], grupo_id, responsavel_id, result: ImportResult) -> Iterator[dict]:
+    ocorrencias = {}
+    for linha in linhas:
+        if linha is None:
+            result.invalidas += 1
+            continue
+        data, valor, descricao, tipo = linha
+        descricao = bleach.clean(html.unescape(descricao))[:500] if descricao else None
+        valor = valor.quantize(Decimal("0.01"))
+        if not valor or abs(valor) > _VALOR_MAXIMO:
+            result.invalidas += 1
+            continue
+
+        base = import_hash(data, valor, descricao, 0)
+        ocorrencia = ocorrencias.get(base, 0)
+        ocorrencias[base] = ocorrencia + 1
+
+        yield {
+            "id": uuid.uuid4(),
+            "grupo_id": grupo_id,
+            "responsavel_id": responsavel_id,
+            # Sem coluna de tipo (ou com um tipo desconhecido), o sinal decide: débito é gasto
+            "tipo": tipo if tipo in _TIPOS else ("gasto" if valor < 0 else "ganho"),
+            "descricao": descricao,
+            "valor": abs(valor),
+            "data_transacao": data,
+            "hash_importacao": base if ocorrencia == 0 else import_hash(data, valor, descricao, ocorrencia),
+        }
+
+def import_statement(db: Session, arquivo: BinaryIO, formato: str, grupo_id, responsavel_id) -> ImportResult:
+    """
+    Importa um extrato OFX/CSV para o grupo, lendo e gravando em blocos de
+    STATEMENT_IMPORT_CHUNK_SIZE linhas: cada bloco é um único INSERT ... ON CONFLICT
+    DO NOTHING, e as linhas já importadas antes (mesmo hash) contam como duplicadas.
+    O saldo e o resumo mensal recebem só as linhas efetivamente inseridas. Não faz commit.
+    """
+    result = ImportResult()
+    leitor = _linhas_ofx if formato == "ofx" else _linhas_csv
+    movimentacoes = _movimentacoes(leitor(_linhas(arquivo)), grupo_id, responsavel_id, result)
+
+    # O saldo é bloqueado (e criado a partir do histórico) antes do primeiro INSERT
+    ledger_service.lock_group_balance(db, grupo_id)
+
+    insert = _dialect_insert(db)
+    mov = models.Movimentacao
+    while True:
+        bloco = list(islice(movimentacoes, settings.STATEMENT_IMPORT_CHUNK_SIZE))
+        if not bloco:
+            break
+        stmt = insert(mov).on_conflict_do_nothing(
+            index_elements=[mov.grupo_id, mov.hash_importacao]
+        ).returning(mov.grupo_id, mov.responsavel_id, mov.tipo, mov.valor, mov.data_transacao)
+        inseridas = db.execute(stmt, bloco).all()
+
+        ledger_service.record_transactions(db, grupo_id, [
+            models.Movimentacao(
+                grupo_id=row.grupo_id, responsavel_id=row.responsavel_id, tipo=row.tipo,
+                valor=row.valor, data_transacao=row.data_transacao
+            ) for row in inseridas
+        ])
+        result.importadas += len(inseridas)
+        result.duplicadas += len(bloco) - len(inseridas)
+    return result
@@ -0,0 +1,89 @@
+import uuid
+import logging
+from sqlalchemy.orm import Session
+from sqlalchemy import update
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Optional
+
+from .. import models, database
+from ..config import settings
+from .rollup_service import _dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# Estados de uma execução (coluna 'status' de 'tarefa_execucoes')
+PENDENTE = 'pendente'
+EXECUTANDO = 'executando'
+CONCLUIDA = 'concluida'
+FALHOU = 'falhou'
+
+def get_or_create_run(db: Session, tarefa: str, periodo: str) -> models.TarefaExecucao:
+    """
+    Retorna a execução da tarefa para o período, criando-a ('pendente') se ainda não
+    existir. Pedidos simultâneos obtêm a mesma linha. Faz commit.
+    """
+    insert = _dialect_insert(db)
+    db.execute(
+        insert(models.TarefaExecucao)
+        .values(id=uuid.uuid4(), tarefa=tarefa, periodo=periodo, status=PENDENTE, resultado={})
+        .on_conflict_do_nothing(index_elements=[models.TarefaExecucao.tarefa, models.TarefaExecucao.periodo])
+    )
+    db.commit()
+    return db.query(models.TarefaExecucao).filter(
+        models.TarefaExecucao.tarefa == tarefa, models.TarefaExecucao.periodo == periodo
+    ).one()
+
+def claim(db: Session, run_id, now: Optional[datetime] = None) -> bool:
+    """
+    Marca a execução como 'executando' se estiver pendente, falhada ou parada (sem
+    progresso há mais de TASK_RUN_STALE_SECONDS). O UPDATE condicional garante que só
+    um processo a executa de cada vez. Retorna se a execução foi obtida. Faz commit.
+    """
+    now = now or datetime.now(timezone.utc)
+    execucao = models.TarefaExecucao
+    parada = (execucao.status == EXECUTANDO) & (execucao.atualizada_em < now - timedelta(seconds=settings.TASK_RUN_STALE_SECONDS))
+    obtida = db.execute(
+        update(execucao).where(execucao.id == run_id, execucao.status.in_([PENDENTE, FALHOU]) | parada)
+        .values(status=EXECUTANDO, atualizada_em=now, erro=None),
+        execution_options={"synchronize_session": False}
+    ).rowcount == 1
+    db.commit()
+    return obtida
+
+def checkpoint(execucao: models.TarefaExecucao, ultimo_grupo_id, resultado: dict):
+    """
+    Regista o progresso da execução. Deve ser gravado no mesmo commit das alterações
+    do bloco processado, para que a retoma não o repita. Não faz commit.
+    """
+    execucao.ultimo_grupo_id = ultimo_grupo_id
+    execucao.resultado = dict(resultado)
+    execucao.atualizada_em = datetime.now(timezone.utc)
+
+def execute(run_id, funcao: Callable[[Session, models.TarefaExecucao], dict]):
+    """
+    Corre 'funcao(db, execucao)' numa sessão própria (ex.: como BackgroundTask), se
+    conseguir obter a execução. A função processa a partir do checkpoint da execução e
+    grava-o a cada bloco; no fim a execução fica 'concluida' com o resultado retornado,
+    ou 'falhou' com o erro, podendo ser retomada por um novo pedido.
+    """
+    db = database.SessionLocal()
+    try:
+        if not claim(db, run_id):
+            return
+        execucao = db.get(models.TarefaExecucao, run_id)
+        resultado = funcao(db, execucao)
+        execucao.status = CONCLUIDA
+        execucao.resultado = dict(resultado)
+        execucao.concluida_em = execucao.atualizada_em = datetime.now(timezone.utc)
+        db.commit()
+    except Exception as e:
+        logger.exception(f"TASK_RUN_FAILED: Execução '{run_id}' falhou.")
+        db.rollback()
+        db.execute(
+            update(models.TarefaExecucao).where(models.TarefaExecucao.id == run_id)
+            .values(status=FALHOU, erro=str(e), atualizada_em=datetime.now(timezone.utc)),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,215 @@
+import re
+import unicodedata
+from decimal import Decimal, InvalidOperation
+from typing import List, Optional
+
+from .. import schemas
+
+# Analisador local, por regras, das frases mais comuns enviadas à IA ("gastei 30 reais de
+# uber", "recebi 1.500", "investi 2 mil"). Só responde quando reconhece toda a frase;
+# em qualquer dúvida retorna None e o texto segue para o Gemini.
+# A qualidade é medida com evaluate_local_parser.py sobre local_parser_corpus.jsonl.
+
+# Verbos (sem acentos) que indicam o tipo da movimentação
+VERBOS = {
+    "gasto": {
+        "gastei", "gastamos", "gasto", "paguei", "pagamos", "pago", "comprei", "compramos",
+        "torrei", "desembolsei", "saiu", "sairam",
+    },
+    "ganho": {
+        "recebi", "recebemos", "ganhei", "ganhamos", "entrou", "entraram", "caiu", "cairam",
+    },
+    "investimento": {
+        "investi", "investimos", "apliquei", "aplicamos", "aportei", "aportamos", "guardei", "guardamos",
+    },
+}
+_TIPO_DO_VERBO = {verbo: tipo for tipo, verbos in VERBOS.items() for verbo in verbos}
+
+# Substantivos que, sem verbo, indicam um tipo diferente do padrão ('gasto')
+_TIPO_DO_SUBSTANTIVO = {
+    "salario": "ganho", "pagamento": "ganho", "rendimento": "ganho", "dividendos": "ganho",
+    "reembolso": "ganho", "estorno": "ganho",
+}
+
+_MOEDA = {"r$", "reais", "real", "conto", "contos", "pila", "pilas"}
+_MULTIPLICADORES = {"mil": Decimal(1000), "k": Decimal(1000)}
+# Palavras que não entram no início/fim da descrição
+_LIGACOES = {"de", "do", "da", "dos", "das", "no", "na", "nos", "nas", "em", "com", "pra", "pro", "para", "o", "a", "os", "as", "um", "uma"}
+_TEMPO = {"hoje", "ontem", "agora", "anteontem"}
+# Palavras que mudam o sentido da frase (negação, pergunta, planos): não arriscamos
+_INCERTEZA = {"nao", "quanto", "quando", "vou", "vamos", "devo", "devia", "preciso", "se", "?"}
+# Centavos ('2 reais e 50 centavos') e moedas estrangeiras: o valor não é um valor em reais
+_INCERTEZA |= {"centavo", "centavos", "cents"}
+_INCERTEZA |= {
+    "euro", "euros", "eur", "dolar", "dolares", "usd", "us", "libra", "libras", "gbp",
+    "peso", "pesos", "iene", "ienes", "bitcoin", "bitcoins", "btc", "$", "€", "£", "¥",
+}
+# Verbos fora de VERBOS (transferir, devolver, emprestar...) não têm tipo certo: não
+# arriscamos. Além destes, palavras com terminação de verbo ('emprestei', 'pegou') também
+_VERBOS_AMBIGUOS = {
+    "transferi", "devolvi", "vendi", "dividi", "perdi", "recebeu", "fiz", "fizemos", "pixei",
+}
+_TERMINACOES_DE_VERBO = ("ei", "ou", "iu", "amos", "emos", "imos")
+_SEPARADORES = {"e", ",", ";", "mais", "depois", "também", "tambem"}
+_MAX_PALAVRAS_SEM_VERBO = 3
+
+_TOKEN = re.compile(r"r\$|\d+(?:[.,]\d+)*|[^\W\d_]+|[,;?$€£¥]")
+# Caracteres que podem ficar de fora dos tokens sem mudar o sentido ('gastei 30 de uber.')
+_IGNORAVEIS = set(" \t\n.!")
+
+def _sem_acentos(texto: str) -> str:
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+
+def parse_br_number(texto: str) -> Optional[Decimal]:
+    """
+    Converte um número escrito à brasileira ou à americana: '1.234,56', '1,234.56',
+    '30,5', '1.000' (milhares) e '30.50' (decimal). Retorna None se não for um número.
+    """
+    if "," in texto and "." in texto:
+        texto = texto.replace(".", "").replace(",", ".") if texto.rfind(",") > texto.rfind(".") else texto.replace(",", "")
+    elif "," in texto:
+        # Uma só vírgula com 1 ou 2 casas é decimal ('25,5'); caso contrário, milhares ('1,000')
+        inteiro, _, resto = texto.rpartition(",")
+        texto = f"{inteiro}.{resto}" if len(resto) <= 2 and "," not in inteiro else texto.replace(",", "")
+    elif texto.count(".") > 1 or (texto.count(".") == 1 and len(texto.rpartition(".")[2]) == 3):
+        texto = texto.replace(".", "") # '1.000' e '1.000.000' são milhares
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        return None
+
+def _verbo_ambiguo(token: str) -> bool:
+    """Palavra que parece um verbo sem tipo conhecido ('transferi', 'emprestei', 'pegou')."""
+    simples = _sem_acentos(token)
+    if simples in _TIPO_DO_VERBO:
+        return False
+    return simples in _VERBOS_AMBIGUOS or (len(simples) > 3 and simples.endswith(_TERMINACOES_DE_VERBO))
+
+def _juntar_milhares(tokens: List[str]) -> Optional[List[str]]:
+    """
+    Junta '<n> mil e <m>' (e 'mil e <m>') num só token com o valor total ('5 mil e 300'
+    é 5300), antes de o 'e' ser tratado como separador de orações. Retorna None se a
+    leitura for ambígua ('2 mil e 500 mil').
+    """
+    resultado, i = [], 0
+    while i < len(tokens):
+        inicio = i
+        base = Decimal(1)
+        if tokens[i][0].isdigit() and i + 1 < len(tokens) and tokens[i + 1] == "mil":
+            base = parse_br_number(tokens[i])
+            i += 1
+        if (
+            base is not None and tokens[i] == "mil" and i + 2 < len(tokens) and tokens[i + 1] == "e"
+            and tokens[i + 2].isdigit() and int(tokens[i + 2]) < 1000
+        ):
+            if i + 3 < len(tokens) and tokens[i + 3] in _MULTIPLICADORES:
+                return None
+            total = base * 1000 + int(tokens[i + 2])
+            resultado.append(format(total.normalize(), "f"))
+            i += 3
+        else:
+            resultado.append(tokens[inicio])
+            i = inicio + 1
+    return resultado
+
+def _clausulas(tokens: List[str]) -> List[List[str]]:
+    clausulas, atual = [], []
+    for token in tokens:
+        if token in _SEPARADORES:
+            clausulas.append(atual)
+            atual = []
+        else:
+            atual.append(token)
+    clausulas.append(atual)
+    return [c for c in clausulas if c]
+
+def _analisar_clausula(tokens: List[str]) -> Optional[dict]:
+    """Extrai tipo (se houver verbo), valor e palavras da descrição de uma oração."""
+    tipo, valor, palavras = None, None, []
+    i = 0
+    while i < len(tokens):
+        token, simples = tokens[i], _sem_acentos(tokens[i])
+        if simples in _TIPO_DO_VERBO:
+            if tipo is not None:
+                return None
+            tipo = _TIPO_DO_VERBO[simples]
+        elif token[0].isdigit() or simples in _MULTIPLICADORES:
+            if valor is not None:
+                return None # Dois valores na mesma oração
+            if token[0].isdigit():
+                valor = parse_br_number(token)
+                if valor is None:
+                    return None
+                if i + 1 < len(tokens) and tokens[i + 1] in _MULTIPLICADORES:
+                    i += 1
+                    valor *= _MULTIPLICADORES[tokens[i]]
+            else:
+                valor = _MULTIPLICADORES[simples] # 'mil reais'
+        elif token not in _MOEDA and simples not in _TEMPO:
+            palavras.append(token)
+        i += 1
+    return {"tipo": tipo, "valor": valor, "palavras": palavras}
+
+def _descricao(palavras: List[str]) -> str:
+    inicio, fim = 0, len(palavras)
+    while inicio < fim and _sem_acentos(palavras[inicio]) in _LIGACOES:
+        inicio += 1
+    while fim > inicio and _sem_acentos(palavras[fim - 1]) in _LIGACOES:
+        fim -= 1
+    return " ".join(palavras[inicio:fim])
+
+def parse(texto: str) -> Optional[schemas.ParsedTransactionResponse]:
+    """
+    Reconhece uma ou mais movimentações em frases simples. Cada oração (separada por
+    'e', vírgula etc.) precisa de exatamente um valor; o tipo vem do verbo da oração ou
+    da anterior ('gastei 30 de uber e 20 de ifood'). Orações sem valor nem verbo
+    completam a descrição da anterior ('gastei 30 de pão e leite').
+    """
+    texto = texto.lower()
+    # Texto que nenhum token reconhece ('30%', '1/2', '-30') mudaria o valor: segue para o Gemini
+    if not set(_TOKEN.sub(" ", texto)) <= _IGNORAVEIS:
+        return None
+    tokens = _TOKEN.findall(texto)
+    if not tokens or any(t in _INCERTEZA or _sem_acentos(t) in _INCERTEZA or _verbo_ambiguo(t) for t in tokens):
+        return None
+
+    tokens = _juntar_milhares(tokens)
+    if tokens is None:
+        return None
+
+    clausulas = _clausulas(tokens)
+    transacoes = []
+    tipo_anterior = None
+    for clausula in clausulas:
+        analise = _analisar_clausula(clausula)
+        if analise is None:
+            return None
+        if analise["valor"] is None:
+            if analise["tipo"] is not None or not transacoes:
+                return None # Verbo sem valor ('recebi'), ou frase sem valor nenhum
+            transacoes[-1]["palavras"] += ["e"] + analise["palavras"]
+            continue
+
+        tipo = analise["tipo"] or tipo_anterior
+        if tipo is None:
+            # Sem verbo ('almoço 25'): como no prompt do Gemini, o padrão é 'gasto', mas
+            # só para frases de uma oração com descrição curta
+            if len(clausulas) > 1 or len(analise["palavras"]) > _MAX_PALAVRAS_SEM_VERBO:
+                return None
+            substantivos = [_TIPO_DO_SUBSTANTIVO.get(_sem_acentos(p)) for p in analise["palavras"]]
+            tipo = next((t for t in substantivos if t), "gasto")
+        else:
+            tipo_anterior = tipo
+        if analise["valor"] <= 0:
+            return None
+        transacoes.append({"tipo": tipo, "valor": analise["valor"], "palavras": analise["palavras"]})
+
+    if not transacoes:
+        return None
+    return schemas.ParsedTransactionResponse(transactions=[
+        schemas.ParsedTransaction(
+            tipo=t["tipo"],
+            valor=float(t["valor"]),
+            descricao=_descricao(t["palavras"]) or t["tipo"]
+        ) for t in transacoes
+    ])
@@ -1,4 +1,10 @@
 import os
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, type_coerce
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 from .config import settings
@@ -34,3 +40,36 @@ def send_email_with_template(to_email: str, template_id: str, template_data: dic
     except Exception as e:
         print(f"Erro ao enviar e-mail com SendGrid: {e}")
         return False
+
+# --- Cursores de paginação (keyset) ---
+
+def encode_cursor(*values) -> str:
+    """Codifica os valores da última linha de uma página num cursor opaco (base64 de JSON)."""
+    raw = json.dumps([str(v) for v in values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> Optional[list]:
+    """Decodifica um cursor de encode_cursor; retorna None se for inválido."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+def cursor_datetime_key(coluna, dialect: str):
+    """
+    Coluna de data/hora a usar na seleção, na ordenação e na comparação de um cursor.
+
+    No SQLite as datas são texto, e as gravadas pelo server_default (CURRENT_TIMESTAMP)
+    não têm fração de segundos, ao contrário dos parâmetros ('12:00:00' < '12:00:00.000000'):
+    comparar com a data lida repetiria as mesmas linhas. Aí usa-se o texto gravado, que
+    o cursor guarda tal como foi lido (ver cursor_datetime_value).
+    """
+    return type_coerce(coluna, String) if dialect == "sqlite" else coluna
+
+def cursor_datetime_value(valor: str, dialect: str):
+    """Valor do cursor a comparar com cursor_datetime_key; levanta ValueError se não for uma data."""
+    data = datetime.fromisoformat(valor)
+    return valor if dialect == "sqlite" else data
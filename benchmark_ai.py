@@ -0,0 +1,94 @@
+import sys
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+
+import httpx
+
+# Mede a latência e o débito de /api/ai/parse-transaction com pedidos concorrentes.
+# Normalmente usado com a API apontada para fake_gemini_server.py (ver esse ficheiro) e,
+# para o limite do plano gratuito não interferir, com AI_FREE_PLAN_DAILY_LIMIT alto.
+
+PALAVRAS = ["feira", "presente", "conserto", "viagem", "roupa", "livro", "lanche", "curso", "remédio", "pet", "jantar", "festa"]
+SIMPLES = ["gastei 30 reais de uber", "recebi 1.500 de salário", "investi 2 mil no tesouro", "almoço 25", "paguei 89,90 de internet"]
+
+def gerar_texto(modo: str, i: int) -> str:
+    """
+    'unicos': textos sempre diferentes e sem valores, que seguem para o Gemini;
+    'repetidos': poucos textos que se repetem (mede o cache);
+    'simples': frases resolvidas pelo analisador local.
+    """
+    if modo == "simples":
+        return SIMPLES[i % len(SIMPLES)]
+    if modo == "repetidos":
+        return f"comprei umas coisas de {PALAVRAS[i % 3]} com a família"
+    sorteadas = " ".join(random.sample(PALAVRAS, 3))
+    return f"comprei umas coisas: {sorteadas} {''.join(random.choices('abcdefghij', k=6))}"
+
+async def obter_token(client: httpx.AsyncClient, email: str, senha: str) -> str:
+    """Faz login; se o usuário não existir, regista-o antes."""
+    r = await client.post("/api/token", data={"username": email, "password": senha})
+    if r.status_code != 200:
+        registo = await client.post("/api/register", json={"email": email, "nome": "Benchmark", "senha": senha})
+        if registo.status_code != 201:
+            raise SystemExit(f"Não foi possível entrar nem registar {email}: {registo.text}")
+        r = await client.post("/api/token", data={"username": email, "password": senha})
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+def percentil(valores: list, p: float) -> float:
+    return valores[min(len(valores) - 1, int(p * len(valores)))] if valores else 0.0
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+    async with httpx.AsyncClient(base_url=args.api_url, limits=limits, timeout=60) as client:
+        token = await obter_token(client, args.email, args.senha)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        latencias, status = [], Counter()
+        proximo = iter(range(args.pedidos))
+
+        async def trabalhador():
+            for i in proximo:
+                inicio = time.perf_counter()
+                try:
+                    r = await client.post("/api/ai/parse-transaction", headers=headers, json={"text": gerar_texto(args.modo, i)})
+                    status[r.status_code] += 1
+                except httpx.HTTPError as e:
+                    status[type(e).__name__] += 1
+                    continue
+                if r.status_code == 200:
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador() for _ in range(args.concorrencia)))
+        duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "pedidos": args.pedidos,
+        "duracao_s": duracao,
+        "debito_rps": args.pedidos / duracao if duracao else 0.0,
+        "status": dict(status),
+        "p50_ms": percentil(latencias, 0.50),
+        "p95_ms": percentil(latencias, 0.95),
+        "p99_ms": percentil(latencias, 0.99),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de latência e débito do endpoint de análise por IA.")
+    parser.add_argument("--api-url", default="http://127.0.0.1:8000", help="Endereço da API do Clarify.")
+    parser.add_argument("--email", default="benchmark@clarify.com.br")
+    parser.add_argument("--senha", default="Benchmark@123")
+    parser.add_argument("--pedidos", type=int, default=500, help="Número total de pedidos.")
+    parser.add_argument("--concorrencia", type=int, default=50, help="Pedidos em simultâneo.")
+    parser.add_argument("--modo", choices=["unicos", "repetidos", "simples"], default="unicos", help="Tipo de texto enviado (ver gerar_texto).")
+    args = parser.parse_args()
+
+    resultado = asyncio.run(run(args))
+    print(f"\nPedidos: {resultado['pedidos']} em {resultado['duracao_s']:.2f}s ({resultado['debito_rps']:.1f} pedidos/s)")
+    print(f"Respostas: {resultado['status']}")
+    print(f"Latência (respostas 200): p50={resultado['p50_ms']:.1f}ms p95={resultado['p95_ms']:.1f}ms p99={resultado['p99_ms']:.1f}ms")
+    sys.exit(0 if resultado["status"].get(200) else 1)
@@ -20,6 +20,8 @@ const API_URL = getApiBaseUrl();
 // --- Variáveis Globais ---
 let usersChart = null;
 let allUsers = []; 
+let usersNextCursor = null; // Cursor da página seguinte da lista de usuários (null na última)
+let userSearchTimeout = null;
 let userCargo = null; // Armazenará o cargo do colaborador logado
 
 function logout() {
@@ -204,20 +206,39 @@ function updateUsersChart(data) {
 
 // --- Lógica de Gerenciamento de Usuários ---
 
-document.getElementById('user-search-input').addEventListener('input', (e) => {
-    const searchTerm = e.target.value.toLowerCase();
-    const filteredUsers = allUsers.filter(user => 
-        user.nome.toLowerCase().includes(searchTerm) || 
-        user.email.toLowerCase().includes(searchTerm)
-    );
-    renderUsersTable(filteredUsers);
+// A pesquisa (início do nome ou do e-mail) e os filtros são feitos pela API, página a página
+document.getElementById('user-search-input').addEventListener('input', () => {
+    clearTimeout(userSearchTimeout);
+    userSearchTimeout = setTimeout(() => fetchUsers(), 300);
 });
+['user-plan-filter', 'user-date-from', 'user-date-to'].forEach(id => {
+    document.getElementById(id)?.addEventListener('change', () => fetchUsers());
+});
+document.getElementById('load-more-users-button')?.addEventListener('click', () => fetchUsers(true));
+
+function getUserFilterParams() {
+    const params = new URLSearchParams();
+    const search = document.getElementById('user-search-input').value.trim();
+    const plano = document.getElementById('user-plan-filter')?.value;
+    const desde = document.getElementById('user-date-from')?.value;
+    const ate = document.getElementById('user-date-to')?.value;
+    if (search) params.append('q', search);
+    if (plano) params.append('plano', plano);
+    if (desde) params.append('criado_desde', desde);
+    if (ate) params.append('criado_ate', ate);
+    return params;
+}
 
-async function fetchUsers() {
+async function fetchUsers(loadMore = false) {
     const tableBody = document.getElementById('users-table-body');
-    tableBody.innerHTML = '<tr><td colspan="5" class="text-center p-4">Carregando usuários...</td></tr>';
+    if (loadMore && !usersNextCursor) return;
+    if (!loadMore) {
+        tableBody.innerHTML = '<tr><td colspan="5" class="text-center p-4">Carregando usuários...</td></tr>';
+    }
+    const params = getUserFilterParams();
+    if (loadMore) params.append('cursor', usersNextCursor);
     try {
-        const response = await fetch(`${API_URL}/collaborators/admin/users/`, {
+        const response = await fetch(`${API_URL}/collaborators/admin/users/?${params.toString()}`, {
             headers: { 'Authorization': `Bearer ${token}` }
         });
         // Tratamento de erro para token inválido/expirado
@@ -226,8 +247,14 @@ async function fetchUsers() {
             return;
         }
         if (!response.ok) throw new Error('Não foi possível carregar a lista de usuários.');
-        allUsers = await response.json();
+        const page = await response.json();
+        // As páginas seguintes são acrescentadas às já carregadas
+        allUsers = loadMore ? allUsers.concat(page.items) : page.items;
+        usersNextCursor = page.next_cursor;
         renderUsersTable(allUsers);
+        document.getElementById('load-more-users-button')?.classList.toggle('hidden', !usersNextCursor);
+        const totalEl = document.getElementById('users-total');
+        if (totalEl) totalEl.textContent = `Aproximadamente ${page.total_estimado.toLocaleString('pt-BR')} usuário(s)`;
     } catch (error) {
         tableBody.innerHTML = `<tr><td colspan="5" class="text-center p-4 text-red-400">${error.message}</td></tr>`;
     }
@@ -0,0 +1,28 @@
+import os
+import sys
+import argparse
+from sqlalchemy.orm import Session
+
+# Adiciona o diretório raiz ao path para permitir a importação dos módulos da aplicação
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from app import database
+from app.config import settings
+from app.services import ai_quota_service
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compacta em totais diários os registos antigos de uso da IA (tabela ai_usage).")
+    parser.add_argument("--dias", type=int, default=settings.AI_USAGE_RETENTION_DAYS, help="Dias de registos individuais a manter.")
+    args = parser.parse_args()
+
+    db: Session = next(database.get_db())
+    try:
+        linhas = ai_quota_service.compact_usage_log(db, args.dias)
+        db.commit()
+        print(f"[SUCESSO] {linhas} registo(s) de uso da IA compactado(s) em totais diários.")
+    except Exception as e:
+        print(f"\n[ERRO FATAL] Ocorreu um erro inesperado: {e}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+# Adiciona o diretório raiz ao path para permitir a importação dos módulos da aplicação
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from app.services import transaction_parser_service
+
+CORPUS_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_parser_corpus.jsonl")
+
+def _resumo(resultado) -> list:
+    return [(t.tipo, round(t.valor, 2)) for t in resultado.transactions]
+
+def evaluate(caminho: str, verbose: bool = False) -> dict:
+    """
+    Corre o analisador local sobre o corpus rotulado. Cada linha tem o texto e as
+    movimentações esperadas ('esperado'), ou null quando o texto deve seguir para o Gemini.
+
+    - cobertura: fração dos textos a que o analisador responde;
+    - precisão: fração das respostas com os mesmos tipos e valores do rótulo (uma resposta
+      a um texto rotulado null conta como erro);
+    - descrições: fração das respostas certas cuja descrição também coincide.
+    """
+    total = respondidas = certas = descricoes_certas = 0
+    tempo = 0.0
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            if not linha.strip():
+                continue
+            exemplo = json.loads(linha)
+            total += 1
+            inicio = time.perf_counter()
+            resultado = transaction_parser_service.parse(exemplo["texto"])
+            tempo += time.perf_counter() - inicio
+
+            if resultado is None:
+                if verbose and exemplo["esperado"] is not None:
+                    print(f"[SEM RESPOSTA] {exemplo['texto']!r}")
+                continue
+            respondidas += 1
+            esperado = exemplo["esperado"]
+            if esperado is not None and _resumo(resultado) == [(e["tipo"], round(e["valor"], 2)) for e in esperado]:
+                certas += 1
+                if [t.descricao for t in resultado.transactions] == [e["descricao"] for e in esperado]:
+                    descricoes_certas += 1
+                elif verbose:
+                    print(f"[DESCRIÇÃO] {exemplo['texto']!r}: {[t.descricao for t in resultado.transactions]}")
+            else:
+                print(f"[ERRO] {exemplo['texto']!r}: esperado={esperado} obtido={resultado.model_dump()['transactions']}")
+
+    return {
+        "exemplos": total,
+        "cobertura": respondidas / total if total else 0.0,
+        "precisao": certas / respondidas if respondidas else 1.0,
+        "descricoes": descricoes_certas / certas if certas else 1.0,
+        "tempo_medio_us": tempo / total * 1e6 if total else 0.0,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede a cobertura e a precisão do analisador local de transações.")
+    parser.add_argument("--corpus", default=CORPUS_PADRAO, help="Ficheiro JSONL com os exemplos rotulados.")
+    parser.add_argument("--min-precisao", type=float, default=1.0, help="Precisão mínima aceite (termina com erro abaixo dela).")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Mostra também os textos sem resposta e as descrições diferentes.")
+    args = parser.parse_args()
+
+    metricas = evaluate(args.corpus, args.verbose)
+    print(f"\nExemplos: {metricas['exemplos']}")
+    print(f"Cobertura: {metricas['cobertura']:.1%}")
+    print(f"Precisão: {metricas['precisao']:.1%}")
+    print(f"Descrições iguais ao rótulo: {metricas['descricoes']:.1%}")
+    print(f"Tempo médio por texto: {metricas['tempo_medio_us']:.0f} µs")
+    sys.exit(0 if metricas["precisao"] >= args.min_precisao else 1)
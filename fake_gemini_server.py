@@ -0,0 +1,80 @@
+import json
+import random
+import asyncio
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Servidor local que imita o endpoint generateContent do Gemini, para testar a carga do
+# caminho de IA sem rede. Aponte a API para ele com:
+#   GEMINI_BASE_URL=http://127.0.0.1:8001 GEMINI_API_KEY=qualquer-coisa
+# As respostas têm o formato real (candidates[0].content.parts[0].text com o JSON pedido)
+# e a latência, os erros e as respostas inválidas são configuráveis (ver --help).
+
+DESCRICOES = ["mercado", "uber", "ifood", "farmácia", "aluguel", "salário", "academia", "cinema", "padaria", "gasolina"]
+TIPOS = ["gasto"] * 6 + ["ganho"] * 2 + ["investimento"]
+
+def _transacoes(texto: str) -> list:
+    """Transações plausíveis para o texto: 1 a 2, com tipo, valor e descrição aleatórios mas estáveis."""
+    gerador = random.Random(texto)
+    return [
+        {
+            "tipo": gerador.choice(TIPOS),
+            "valor": round(gerador.uniform(5, 500), 2),
+            "descricao": gerador.choice(DESCRICOES),
+        }
+        for _ in range(gerador.randint(1, 2))
+    ]
+
+def _resposta(prompt: str) -> dict:
+    """Monta o JSON que o Gemini devolveria ao prompt, simples ou de lote (ver routers/ai.py)."""
+    if "Textos: " in prompt:
+        itens = json.loads(prompt.split("Textos: ", 1)[1].split("\n", 1)[0])
+        return {"results": [{"id": item["id"], "transactions": _transacoes(item["texto"])} for item in itens]}
+    texto = prompt.split('O texto é: "', 1)[-1].split('"\n', 1)[0]
+    return {"transactions": _transacoes(texto)}
+
+def create_app(latency_ms: float, jitter_ms: float, error_rate: float, malformed_rate: float) -> FastAPI:
+    app = FastAPI(title="Gemini local (fake)")
+
+    @app.post("/v1beta/models/{modelo}:generateContent")
+    async def generate_content(modelo: str, request: Request):
+        corpo = await request.json()
+        await asyncio.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000)
+
+        sorteio = random.random()
+        if sorteio < error_rate:
+            codigo = random.choice([429, 500, 503])
+            return JSONResponse(status_code=codigo, content={"error": {"code": codigo, "message": "Erro simulado.", "status": "UNAVAILABLE"}})
+
+        if sorteio < error_rate + malformed_rate:
+            texto = random.choice(['{"transactions": [', "não é JSON", '{"outra_coisa": 1}'])
+        else:
+            texto = json.dumps(_resposta(corpo["contents"][0]["parts"][0]["text"]), ensure_ascii=False)
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": texto}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "modelVersion": modelo,
+        }
+
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API do Gemini para testes de carga.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=400, help="Latência média de cada resposta.")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="Desvio padrão da latência.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de respostas com erro HTTP (429/500/503).")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fração de respostas 200 com JSON inválido.")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.malformed_rate),
+        host=args.host, port=args.port, log_level="warning"
+    )
@@ -24,8 +24,9 @@ if (!token) {
 let allGoals = []; // Agora armazena TODAS as metas
 let groupMembers = [];
 let allTransactions = []; // Armazena as transações recentes (página principal)
-let fullTransactionHistory = []; // Armazena TODAS as transações para o modal
+let fullTransactionHistory = []; // Armazena as transações já carregadas no modal
 let filteredTransactionHistory = []; // Armazena as transações filtradas para exportação
+let fullHistoryNextCursor = null; // Cursor da próxima página do histórico (null na última)
 let allPaymentReminders = [];
 let monthlyChart = null;
 let currentUserId = null;
@@ -79,7 +80,9 @@ function setupEventListeners() {
     
     document.getElementById('full-history-button')?.addEventListener('click', openFullHistoryModal);
     document.getElementById('close-history-modal')?.addEventListener('click', () => toggleModal('full-history-modal', false));
-    document.getElementById('apply-filters-button')?.addEventListener('click', fetchFullTransactionHistory);
+    document.getElementById('apply-filters-button')?.addEventListener('click', () => fetchFullTransactionHistory());
+    document.getElementById('filter-search')?.addEventListener('keydown', (e) => { if (e.key === 'Enter') fetchFullTransactionHistory(); });
+    document.getElementById('load-more-history-button')?.addEventListener('click', () => fetchFullTransactionHistory(true));
     document.getElementById('export-csv-button')?.addEventListener('click', exportTransactionsToCSV);
     document.getElementById('export-pdf-button')?.addEventListener('click', exportTransactionsToPDF);
     
@@ -92,6 +95,7 @@ function setupEventListeners() {
     document.getElementById('clear-payment-filters-button')?.addEventListener('click', clearPaymentRemindersFilters);
     
     document.getElementById('ai-record-button')?.addEventListener('click', toggleSpeechRecognition);
+    document.getElementById('chart-range-select')?.addEventListener('change', fetchMonthlyChartData);
 }
 
 function logout() {
@@ -164,8 +168,10 @@ async function fetchAllGoals() {
 
 async function fetchMonthlyChartData() {
     const groupId = localStorage.getItem('activeGroupId');
+    // O seletor de período só existe no dashboard premium; o gratuito mantém os 3 meses padrão
+    const months = document.getElementById('chart-range-select')?.value || 3;
     try {
-        const response = await fetch(`${API_URL}/api/groups/${groupId}/chart_data`, {
+        const response = await fetch(`${API_URL}/api/groups/${groupId}/chart_data?months=${months}`, {
             headers: { 'Authorization': `Bearer ${token}` }
         });
         if (!response.ok) {
@@ -234,25 +240,38 @@ async function fetchPaymentReminders() {
     }
 }
 
-async function fetchFullTransactionHistory(applyFilters = false) {
-    const groupId = localStorage.getItem('activeGroupId');
-    const tableBody = document.getElementById('full-history-table-body');
-    if (!tableBody) return;
-    tableBody.innerHTML = '<tr><td colspan="4" class="text-center p-4">Carregando histórico...</td></tr>';
-
+// Filtros do modal de histórico, partilhados pela listagem e pela exportação
+function getHistoryFilterParams() {
     const startDateEl = document.getElementById('filter-start-date');
     const endDateEl = document.getElementById('filter-end-date');
     const typeEl = document.getElementById('filter-type');
+    const searchEl = document.getElementById('filter-search');
 
     const startDate = startDateEl ? startDateEl.value : '';
     const endDate = endDateEl ? endDateEl.value : '';
     const type = typeEl ? typeEl.value : '';
-
+    const search = searchEl ? searchEl.value.trim() : '';
 
     let queryParams = new URLSearchParams();
     if (startDate) queryParams.append('start_date', startDate);
     if (endDate) queryParams.append('end_date', endDate);
     if (type) queryParams.append('type', type);
+    // A pesquisa é feita pela API (com índice); termos de um só caractere são ignorados
+    if (search.length >= 2) queryParams.append('q', search);
+    return queryParams;
+}
+
+async function fetchFullTransactionHistory(loadMore = false) {
+    const groupId = localStorage.getItem('activeGroupId');
+    const tableBody = document.getElementById('full-history-table-body');
+    if (!tableBody) return;
+    if (loadMore && !fullHistoryNextCursor) return;
+    if (!loadMore) {
+        tableBody.innerHTML = '<tr><td colspan="4" class="text-center p-4">Carregando histórico...</td></tr>';
+    }
+
+    const queryParams = getHistoryFilterParams();
+    if (loadMore) queryParams.append('cursor', fullHistoryNextCursor);
 
     try {
         const response = await fetch(`${API_URL}/api/transactions/group/${groupId}/full_history?${queryParams.toString()}`, {
@@ -261,9 +280,13 @@ async function fetchFullTransactionHistory(applyFilters = false) {
         if (!response.ok) {
             throw new Error('Não foi possível carregar o histórico completo de transações.');
         }
-        fullTransactionHistory = await response.json();
+        const page = await response.json();
+        // A API devolve uma página de cada vez; as seguintes são acrescentadas às já carregadas
+        fullTransactionHistory = loadMore ? fullTransactionHistory.concat(page.items) : page.items;
+        fullHistoryNextCursor = page.next_cursor;
         filteredTransactionHistory = fullTransactionHistory;
         renderFullTransactionHistory(fullTransactionHistory);
+        document.getElementById('load-more-history-button')?.classList.toggle('hidden', !fullHistoryNextCursor);
     } catch (error) {
         tableBody.innerHTML = `<tr><td colspan="4" class="text-center p-4 text-red-400">${error.message}</td></tr>`;
     }
@@ -997,16 +1020,16 @@ async function saveAIResults() {
     }
 
     try {
-        for (const tx of transactionsToSave) {
-            const response = await fetch(`${API_URL}/api/transactions/group/${groupId}`, {
-                method: 'POST',
-                headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
-                body: JSON.stringify(tx)
-            });
-            if (!response.ok) {
-                const errorData = await response.json();
-                throw new Error(`Erro ao salvar transação "${tx.descricao}": ${errorData.detail || response.statusText}`);
-            }
+        // Todas as transações são gravadas num único pedido (e numa única transação no banco)
+        const response = await fetch(`${API_URL}/api/transactions/group/${groupId}/bulk`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
+            body: JSON.stringify({ transacoes: transactionsToSave })
+        });
+        if (!response.ok) {
+            const errorData = await response.json();
+            const detail = typeof errorData.detail === 'string' ? errorData.detail : response.statusText;
+            throw new Error(`Erro ao salvar transações: ${detail}`);
         }
         toggleModal('ai-results-modal', false);
         await showCustomAlert('Sucesso', `${transactionsToSave.length} transação(ões) salva(s) com sucesso!`);
@@ -1273,38 +1296,42 @@ function openFullHistoryModal() {
     document.getElementById('filter-start-date').value = '';
     document.getElementById('filter-end-date').value = '';
     document.getElementById('filter-type').value = '';
+    const searchEl = document.getElementById('filter-search');
+    if (searchEl) searchEl.value = '';
     fetchFullTransactionHistory();
     toggleModal('full-history-modal', true);
 }
 
-function exportTransactionsToCSV() {
+async function exportTransactionsToCSV() {
     if (filteredTransactionHistory.length === 0) {
         showCustomAlert('Atenção', 'Não há transações para exportar.');
         return;
     }
 
-    let csvContent = "data:text/csv;charset=utf-8,%EF%BB%BF";
-    csvContent += "Data,Tipo,Descricao,Valor,Responsavel\n";
-
-    filteredTransactionHistory.forEach(tx => {
-        const row = [
-            new Date(tx.data_transacao).toLocaleDateString('pt-BR'),
-            tx.tipo,
-            `"${tx.descricao.replace(/"/g, '""')}"`,
-            tx.valor.toFixed(2).replace('.', ','),
-            tx.responsavel_nome
-        ].join(',');
-        csvContent += row + "\n";
-    });
-
-    const encodedUri = encodeURI(csvContent);
-    const link = document.createElement("a");
-    link.setAttribute("href", encodedUri);
-    link.setAttribute("download", "transacoes_clarify.csv");
-    document.body.appendChild(link);
-    link.click();
-    document.body.removeChild(link);
-    showCustomAlert('Sucesso', 'Histórico exportado para CSV!');
+    // O servidor gera o CSV completo (todas as páginas) com os filtros atuais
+    const groupId = localStorage.getItem('activeGroupId');
+    const queryParams = getHistoryFilterParams();
+    queryParams.append('format', 'csv');
+    try {
+        const response = await fetch(`${API_URL}/api/transactions/group/${groupId}/export?${queryParams.toString()}`, {
+            headers: { 'Authorization': `Bearer ${token}` }
+        });
+        if (!response.ok) {
+            throw new Error('Não foi possível exportar o histórico.');
+        }
+        const blob = await response.blob();
+        const url = URL.createObjectURL(blob);
+        const link = document.createElement("a");
+        link.setAttribute("href", url);
+        link.setAttribute("download", "transacoes_clarify.csv");
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
+        URL.revokeObjectURL(url);
+        showCustomAlert('Sucesso', 'Histórico exportado para CSV!');
+    } catch (error) {
+        showCustomAlert('Erro', error.message);
+    }
 }
 
 function exportTransactionsToPDF() {
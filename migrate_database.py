@@ -0,0 +1,70 @@
+import sys
+from sqlalchemy import text
+
+# Adiciona a pasta raiz do projeto ao path do Python.
+# Isto permite que o script encontre e importe os módulos da pasta 'app'.
+sys.path.append('.')
+
+from app.database import engine
+from app.models import Base
+
+# Alterações de schema que o 'create_all' não aplica em tabelas já existentes.
+# Todos os comandos são idempotentes e podem ser executados várias vezes.
+MIGRATIONS = [
+    # Agregações do dashboard por grupo e período
+    "CREATE INDEX IF NOT EXISTS ix_movimentacoes_grupo_data ON movimentacoes (grupo_id, data_transacao)",
+    # Versão do grupo usada como chave do cache de respostas e do ETag
+    "ALTER TABLE grupos ADD COLUMN IF NOT EXISTS versao INTEGER NOT NULL DEFAULT 0",
+    # Paginação do histórico de movimentações filtrado por tipo
+    "CREATE INDEX IF NOT EXISTS ix_movimentacoes_grupo_tipo_data ON movimentacoes (grupo_id, tipo, data_transacao, id)",
+    # Deteção de linhas repetidas na importação de extratos
+    "ALTER TABLE movimentacoes ADD COLUMN IF NOT EXISTS hash_importacao VARCHAR(64)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_movimentacoes_grupo_hash_importacao ON movimentacoes (grupo_id, hash_importacao)",
+    # Pesquisa na descrição das movimentações (ver services/search_service.py): por palavras
+    # (tsvector em português) e por trecho (trigramas, usados pelo ILIKE '%termo%')
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_movimentacoes_descricao_fts ON movimentacoes USING gin (to_tsvector('portuguese', coalesce(descricao, '')))",
+    "CREATE INDEX IF NOT EXISTS ix_movimentacoes_descricao_trgm ON movimentacoes USING gin (descricao gin_trgm_ops)",
+    # Compactação do registo de usos da IA (as tabelas 'ai_quotas' e 'ai_usage_diario' são novas)
+    "CREATE INDEX IF NOT EXISTS ix_ai_usage_timestamp ON ai_usage (timestamp)",
+    # Preenche os contadores com os usos das últimas 24h registados antes da sua criação
+    "INSERT INTO ai_quotas (grupo_id, janela_inicio, usos) SELECT grupo_id, min(timestamp), count(*) FROM ai_usage WHERE timestamp >= now() - interval '1 day' GROUP BY grupo_id ON CONFLICT (grupo_id) DO NOTHING",
+    # Período de espera entre medalhas do mesmo tipo na verificação mensal de conquistas
+    "CREATE INDEX IF NOT EXISTS ix_conquistas_grupo_tipo_data ON conquistas (grupo_id, tipo_medalha, data_conquista)",
+    # Listagem de usuários dos colaboradores: paginação por data de cadastro e pesquisa pelo
+    # início do e-mail ou do nome (text_pattern_ops permite LIKE 'prefixo%' com qualquer collation)
+    "CREATE INDEX IF NOT EXISTS ix_usuarios_criado_em_id ON usuarios (criado_em, id)",
+    "CREATE INDEX IF NOT EXISTS ix_usuarios_email_prefixo ON usuarios (lower(email) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_usuarios_nome_prefixo ON usuarios (lower(nome) text_pattern_ops)",
+    # Preenche 'resumos_mensais' (ver services/rollup_service.py) para os grupos que ainda não
+    # têm linhas, com os meses em UTC como no resto do serviço. O lock bloqueia as escritas
+    # no resumo até ao fim da migração, para nenhuma movimentação ser somada duas vezes
+    "LOCK TABLE resumos_mensais IN SHARE ROW EXCLUSIVE MODE",
+    "INSERT INTO resumos_mensais (grupo_id, ano_mes, responsavel_id, tipo, total, quantidade) SELECT grupo_id, date_trunc('month', timezone('UTC', data_transacao))::date, responsavel_id, tipo, sum(valor), count(*) FROM movimentacoes WHERE grupo_id NOT IN (SELECT grupo_id FROM resumos_mensais) GROUP BY 1, 2, 3, 4 ON CONFLICT DO NOTHING",
+]
+
+def create_new_tables():
+    """Cria as tabelas novas dos modelos (tabelas existentes não são alteradas)."""
+    print("A criar tabelas novas...")
+    Base.metadata.create_all(bind=engine)
+    print("✅ Tabelas verificadas.")
+
+def apply_migrations():
+    """Aplica, em ordem e numa única transação, os comandos de MIGRATIONS."""
+    print("A aplicar migrações...")
+    with engine.begin() as connection:
+        for comando in MIGRATIONS:
+            print(f"  -> {comando}")
+            connection.execute(text(comando))
+    print("✅ Migrações aplicadas com sucesso.")
+
+if __name__ == "__main__":
+    print("--------------------------------------------------")
+    print("     SCRIPT DE MIGRAÇÃO DA BASE DE DADOS CLARIFY  ")
+    print("--------------------------------------------------")
+    try:
+        create_new_tables()
+        apply_migrations()
+    except Exception as e:
+        print(f"❌ Ocorreu um erro ao migrar a base de dados: {e}")
+        sys.exit(1)
@@ -0,0 +1,59 @@
+import os
+import sys
+import argparse
+from sqlalchemy.orm import Session
+
+# Adiciona o diretório raiz ao path para permitir a importação dos módulos da aplicação
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from app import database
+from app import models
+from app.services import ledger_service, rollup_service, cache_service
+
+def verify(db: Session) -> int:
+    """Compara os saldos materializados com o histórico e imprime as divergências."""
+    divergencias = ledger_service.verify_balances(db)
+    for d in divergencias:
+        print(f"[DIVERGÊNCIA] Grupo {d['grupo_id']} - {d['coluna']}: materializado={d['materializado']} esperado={d['esperado']}")
+
+    divergencias_resumo = rollup_service.verify_monthly_rollup(db)
+    for d in divergencias_resumo:
+        grupo_id, ano_mes, responsavel_id, tipo = d['chave']
+        print(f"[DIVERGÊNCIA] Resumo {grupo_id} {ano_mes} {responsavel_id} {tipo}: materializado={d['materializado']} esperado={d['esperado']}")
+    divergencias += divergencias_resumo
+    if divergencias:
+        print(f"\n[ERRO] {len(divergencias)} divergência(s) encontrada(s).")
+    else:
+        print("\n[SUCESSO] Todos os saldos materializados conferem com o histórico.")
+    return len(divergencias)
+
+def rebuild(db: Session, grupo_id=None):
+    """Recalcula os saldos e os resumos mensais a partir do histórico de movimentações."""
+    total = ledger_service.rebuild_balances(db, grupo_id)
+    linhas = rollup_service.rebuild_monthly_rollup(db, grupo_id)
+    # Invalida as respostas em cache dos grupos reconstruídos
+    if grupo_id:
+        cache_service.bump_group_version(db, grupo_id)
+    else:
+        cache_service.bump_group_versions(db, [gid for (gid,) in db.query(models.Grupo.id)])
+    db.commit()
+    print(f"[SUCESSO] Saldos reconstruídos para {total} grupo(s).")
+    print(f"[SUCESSO] Resumos mensais reconstruídos ({linhas} linha(s)).")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstrói ou verifica os saldos e resumos mensais materializados dos grupos.")
+    parser.add_argument("--verify", action="store_true", help="Apenas verifica, sem alterar nada.")
+    parser.add_argument("--grupo", help="Reconstrói apenas o grupo indicado (ID).")
+    args = parser.parse_args()
+
+    db: Session = next(database.get_db())
+    try:
+        if args.verify:
+            sys.exit(1 if verify(db) else 0)
+        rebuild(db, args.grupo)
+    except Exception as e:
+        print(f"\n[ERRO FATAL] Ocorreu um erro inesperado: {e}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
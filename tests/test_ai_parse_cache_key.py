@@ -0,0 +1,30 @@
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "test")
+
+import pytest
+
+from app.services.ai_service import _chave, normalize_text
+
+def _chave_do_texto(texto: str) -> str:
+    return _chave(normalize_text(texto))
+
+@pytest.mark.parametrize("a, b", [
+    ("gastei 30% do salario", "gastei 30 do salario"),
+    ("US$ 30 no uber", "R$ 30 no uber"),
+    ("gastei -30", "gastei 30"),
+    ("paguei 1/2 do aluguel", "paguei 12 do aluguel"),
+    ("gastei 30 € no café", "gastei 30 no café"),
+    ("comprei 2+1 por 60", "comprei 21 por 60"),
+])
+def test_textos_com_valores_diferentes_tem_chaves_diferentes(a, b):
+    assert _chave_do_texto(a) != _chave_do_texto(b)
+
+@pytest.mark.parametrize("a, b", [
+    ("Gastei R$ 30,00 no Uber", "gastei 30 reais no uber"),
+    ("gastei 30% do salário", "Gastei 30 % do salario"),
+    ("recebi 1.500", "recebi 1500,00"),
+])
+def test_textos_equivalentes_partilham_a_chave(a, b):
+    assert _chave_do_texto(a) == _chave_do_texto(b)
@@ -0,0 +1,69 @@
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "test")
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app import database, models, schemas
+from app.config import settings
+from app.routers.groups import add_funds_to_goal
+from app.security import UserPrincipal
+from app.services import ledger_service
+
+@pytest.fixture
+def meta_premium():
+    """Grupo premium com saldo para concluir uma meta de R$ 10.000, apagado no fim."""
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    usuario = models.Usuario(nome="Teste", email=f"{uuid.uuid4()}@teste.com", senha="x")
+    grupo = models.Grupo(nome="Teste")
+    db.add_all([usuario, grupo])
+    db.flush()
+    db.add(models.GrupoMembro(usuario_id=usuario.id, grupo_id=grupo.id, papel="dono"))
+    db.add(models.Assinatura(grupo_id=grupo.id, data_fim=datetime.now(timezone.utc) + timedelta(days=30)))
+    meta = models.Meta(grupo_id=grupo.id, titulo="Reserva", valor_meta=Decimal("10000.00"), valor_atual=Decimal("0.00"))
+    db.add(meta)
+    ganho = models.Movimentacao(grupo_id=grupo.id, responsavel_id=usuario.id, tipo="ganho", valor=Decimal("20000.00"), descricao="salário")
+    ledger_service.lock_group_balance(db, grupo.id)
+    ledger_service.record_transaction(db, ganho)
+    db.add(ganho)
+    db.commit()
+    principal = UserPrincipal(id=usuario.id, nome=usuario.nome, email=usuario.email, grupo_ativo_id=grupo.id)
+    try:
+        yield db, grupo.id, meta.id, principal
+    finally:
+        db.rollback()
+        for modelo in (models.Conquista, models.EventoDominio, models.Movimentacao, models.Meta,
+                       models.Assinatura, models.SaldoGrupo, models.ResumoMensal, models.GrupoMembro):
+            db.query(modelo).filter(modelo.grupo_id == grupo.id).delete()
+        db.query(models.Grupo).filter(models.Grupo.id == grupo.id).delete()
+        db.query(models.Usuario).filter(models.Usuario.id == usuario.id).delete()
+        db.commit()
+        db.close()
+
+def _aportar(db, meta_id, principal, valor):
+    tarefas = BackgroundTasks()
+    add_funds_to_goal(meta_id, schemas.GoalAddFunds(valor=Decimal(valor)), tarefas, db, principal)
+    # Corre as tarefas na mesma thread: o SQLite em memória é uma base por conexão
+    for tarefa in tarefas.tasks:
+        tarefa.func(*tarefa.args, **tarefa.kwargs)
+    return tarefas
+
+def test_meta_concluida_sem_agendador_atribui_medalha(meta_premium, monkeypatch):
+    db, grupo_id, meta_id, principal = meta_premium
+    monkeypatch.setattr(settings, "SCHEDULER_ENABLED", False)
+
+    # Aporte que não conclui a meta: nenhum evento, nada a consumir
+    assert not _aportar(db, meta_id, principal, "4000.00").tasks
+    assert db.query(models.EventoDominio).filter(models.EventoDominio.grupo_id == grupo_id).count() == 0
+
+    assert _aportar(db, meta_id, principal, "6000.00").tasks
+    medalhas = db.query(models.Conquista.tipo_medalha).filter(models.Conquista.grupo_id == grupo_id).all()
+    assert medalhas == [(models.TipoMedalhaEnum.ouro,)]
+    assert db.query(models.EventoDominio).filter(models.EventoDominio.grupo_id == grupo_id).count() == 0
@@ -0,0 +1,62 @@
+import os
+
+# Sem DATABASE_URL usa um SQLite em memória; com um Postgres exercita o date_trunc em UTC
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "test")
+
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app import database, models
+from app.services import ledger_service, rollup_service
+
+@pytest.fixture
+def grupo():
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    usuario = models.Usuario(nome="Teste", email=f"{uuid.uuid4()}@teste.com", senha="x")
+    grupo = models.Grupo(nome="Teste")
+    db.add_all([usuario, grupo])
+    db.commit()
+    try:
+        yield db, grupo.id, usuario.id
+    finally:
+        db.rollback()
+        for modelo in (models.ResumoMensal, models.SaldoGrupo, models.Movimentacao):
+            db.query(modelo).filter(modelo.grupo_id == grupo.id).delete()
+        db.query(models.Grupo).filter(models.Grupo.id == grupo.id).delete()
+        db.query(models.Usuario).filter(models.Usuario.id == usuario.id).delete()
+        db.commit()
+        db.close()
+
+def _resumo(db, grupo_id):
+    return sorted(
+        (str(ano_mes), total) for ano_mes, total in
+        db.query(models.ResumoMensal.ano_mes, models.ResumoMensal.total).filter(models.ResumoMensal.grupo_id == grupo_id)
+    )
+
+@pytest.mark.parametrize("data_transacao", [
+    None,
+    date(2026, 10, 1),
+    # 30/09 às 22h em Brasília é 01/10 em UTC
+    datetime(2026, 9, 30, 22, 0, tzinfo=timezone(timedelta(hours=-3))),
+    datetime(2026, 9, 30, 23, 59),
+])
+def test_resumo_incremental_igual_a_reconstrucao(grupo, data_transacao):
+    db, grupo_id, usuario_id = grupo
+    mov = models.Movimentacao(
+        grupo_id=grupo_id, responsavel_id=usuario_id, tipo="gasto", valor=Decimal("10.00"),
+        descricao="mercado", data_transacao=data_transacao
+    )
+    ledger_service.record_transaction(db, mov)
+    db.add(mov)
+    db.commit()
+
+    incremental = _resumo(db, grupo_id)
+    rollup_service.rebuild_monthly_rollup(db, grupo_id)
+    db.commit()
+    assert incremental == _resumo(db, grupo_id)
+    assert incremental[0][0][:7] == rollup_service.month_start(data_transacao).strftime("%Y-%m")
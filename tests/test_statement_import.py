@@ -0,0 +1,27 @@
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "test")
+
+from decimal import Decimal
+
+import pytest
+
+from app.services.statement_import_service import _parse_valor
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("1.234", Decimal("1234")),
+    ("1.234,56", Decimal("1234.56")),
+    ("1,234.56", Decimal("1234.56")),
+    ("-30,00", Decimal("-30.00")),
+    ("R$ 10", Decimal("10")),
+    ("-45.90", Decimal("-45.90")),
+    ("1.000.000", Decimal("1000000")),
+])
+def test_parse_valor(texto, esperado):
+    assert _parse_valor(texto) == esperado
+
+@pytest.mark.parametrize("texto", ["", "abc", "R$"])
+def test_parse_valor_invalido(texto):
+    with pytest.raises(ValueError):
+        _parse_valor(texto)
@@ -0,0 +1,86 @@
+import os
+
+# Sem DATABASE_URL usa um SQLite em memória; com um Postgres exercita o ts_rank_cd
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "test")
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app import database, models
+from app.routers.transactions import get_full_transaction_history
+
+@pytest.fixture
+def grupo():
+    """Grupo com movimentações de descrição igual (mesma relevância), apagado no fim."""
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    usuario = models.Usuario(nome="Teste", email=f"{uuid.uuid4()}@teste.com", senha="x")
+    grupo = models.Grupo(nome="Teste")
+    db.add_all([usuario, grupo])
+    db.flush()
+    inicio = datetime(2026, 9, 1, 12, 0, tzinfo=timezone.utc)
+    for i in range(7):
+        db.add(models.Movimentacao(
+            grupo_id=grupo.id, responsavel_id=usuario.id, tipo="gasto", valor=Decimal("10.00"),
+            # Pares com a mesma data, para haver empates também na data
+            descricao="mercado", data_transacao=inicio + timedelta(days=i // 2)
+        ))
+    db.commit()
+    try:
+        yield db, grupo.id
+    finally:
+        db.query(models.Movimentacao).filter(models.Movimentacao.grupo_id == grupo.id).delete()
+        db.delete(grupo)
+        db.delete(usuario)
+        db.commit()
+        db.close()
+
+def _pagina(db, group_id, cursor):
+    return get_full_transaction_history(
+        group_id=group_id, start_date=None, end_date=None, transaction_type=None,
+        q="mercado", limit=2, cursor=cursor, db=db
+    )
+
+def test_pesquisa_pagina_resultados_com_relevancia_empatada(grupo):
+    db, group_id = grupo
+    vistos, cursor, paginas = [], None, 0
+    while True:
+        pagina = _pagina(db, group_id, cursor)
+        vistos += [item["id"] for item in pagina["items"]]
+        paginas += 1
+        cursor = pagina["next_cursor"]
+        if cursor is None:
+            break
+        assert paginas < 10, "o cursor não avança"
+
+    total = db.query(models.Movimentacao).filter(models.Movimentacao.grupo_id == group_id).count()
+    assert len(vistos) == len(set(vistos)) == total
+    assert paginas == 4
+
+def test_historico_pagina_datas_do_server_default(grupo):
+    db, group_id = grupo
+    usuario_id = db.query(models.Movimentacao.responsavel_id).filter(models.Movimentacao.grupo_id == group_id).first()[0]
+    # Sem data_transacao: vale o server_default, gravado no mesmo segundo
+    db.add_all([
+        models.Movimentacao(grupo_id=group_id, responsavel_id=usuario_id, tipo="gasto", valor=Decimal("1.00"), descricao="padaria")
+        for _ in range(5)
+    ])
+    db.commit()
+
+    vistos, cursor = [], None
+    for _ in range(10):
+        pagina = get_full_transaction_history(
+            group_id=group_id, start_date=None, end_date=None, transaction_type=None,
+            q=None, limit=2, cursor=cursor, db=db
+        )
+        vistos += [item["id"] for item in pagina["items"]]
+        cursor = pagina["next_cursor"]
+        if cursor is None:
+            break
+
+    assert cursor is None, "o cursor não avança"
+    assert len(vistos) == len(set(vistos)) == 12